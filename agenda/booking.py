@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from agenda.models import Agenda
+
+# Name of the Postgres exclusion constraint added in agenda/migrations/0002
+NO_OVERLAP_CONSTRAINT = 'agenda_no_overlap'
+# First key of the two-key advisory lock, so agenda locks never collide with other lock users
+AGENDA_LOCK_NAMESPACE = 4210
+# Upper bound on how long a single appointment can last. Lets the agenda window
+# filter (agenda/views.py) put a lower bound on start_time as well, so the
+# (hairdresser, start_time) index is range-scanned instead of walking the
+# hairdresser's whole history.
+MAX_APPOINTMENT_SPAN = timedelta(days=1)
+
+
+class SlotUnavailable(Exception):
+    """
+    Raised when the hairdresser already has an appointment overlapping the requested slot.
+    """
+
+
+class InvalidAppointmentSpan(ValueError):
+    """
+    Raised when an appointment ends before it starts or lasts longer than MAX_APPOINTMENT_SPAN.
+    """
+
+
+def lock_hairdresser_schedule(hairdresser_id):
+    """
+    Serialises bookings for one hairdresser across every worker until the
+    surrounding transaction ends. Must be called inside transaction.atomic().
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [AGENDA_LOCK_NAMESPACE, hairdresser_id])
+
+
+def book_agenda(hairdresser, service, start_time, end_time):
+    """
+    Creates the Agenda row for a booking, raising SlotUnavailable if it overlaps
+    an existing appointment of the same hairdresser.
+
+    Must be called inside transaction.atomic() so the lock is held until the
+    caller's related rows (e.g., the Reserve) are committed too. The overlap
+    check runs under a per-hairdresser advisory lock, and on Postgres the
+    agenda_no_overlap exclusion constraint rejects anything that slips past it.
+    Raises InvalidAppointmentSpan for an empty, negative or over-long slot.
+    """
+    if end_time <= start_time:
+        raise InvalidAppointmentSpan('end_time must be after start_time')
+    if end_time - start_time > MAX_APPOINTMENT_SPAN:
+        raise InvalidAppointmentSpan(
+            f'An appointment cannot last longer than {MAX_APPOINTMENT_SPAN.days} day(s)'
+        )
+
+    lock_hairdresser_schedule(hairdresser.id)
+
+    if Agenda.objects.filter(
+        hairdresser=hairdresser,
+        start_time__lt=end_time,
+        end_time__gt=start_time
+    ).exists():
+        raise SlotUnavailable()
+
+    try:
+        with transaction.atomic():
+            return Agenda.objects.create(
+                start_time=start_time,
+                end_time=end_time,
+                hairdresser=hairdresser,
+                service=service
+            )
+    except IntegrityError as error:
+        if NO_OVERLAP_CONSTRAINT in str(error):
+            raise SlotUnavailable() from error
+        raise
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Postgres only: other backends (e.g., SQLite for local runs) rely on the
+# overlap check in agenda.booking alone.
+
+OVERLAPPING_ROWS_SQL = """
+    SELECT a.id, b.id
+    FROM agenda_agenda a
+    JOIN agenda_agenda b
+      ON a.hairdresser_id = b.hairdresser_id
+     AND a.id < b.id
+     AND a.start_time < b.end_time
+     AND b.start_time < a.end_time
+    LIMIT 20
+"""
+
+
+def add_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(OVERLAPPING_ROWS_SQL)
+        overlapping = cursor.fetchall()
+    if overlapping:
+        raise RuntimeError(
+            'Cannot add agenda_no_overlap: resolve these double-booked agenda pairs first: '
+            + ', '.join(f'{first}/{second}' for first, second in overlapping)
+        )
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    schema_editor.execute(
+        "ALTER TABLE agenda_agenda ADD CONSTRAINT agenda_no_overlap "
+        "EXCLUDE USING gist (hairdresser_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&)"
+    )
+
+
+def remove_no_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE agenda_agenda DROP CONSTRAINT IF EXISTS agenda_no_overlap')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_no_overlap_constraint, remove_no_overlap_constraint),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0002_agenda_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agenda',
+            index=models.Index(fields=['hairdresser', 'start_time'], name='agenda_hairdresser_start_idx'),
+        ),
+    ]
@@ -7,4 +7,9 @@ class Agenda(models.Model):
     start_time = models.DateTimeField(default=timezone.now, null=False, blank=False, unique=False)
     end_time = models.DateTimeField(default=timezone.now, null=False, blank=False, unique=False)
     hairdresser = models.ForeignKey(Hairdresser, on_delete=models.DO_NOTHING,null=False, blank=False)
-    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING,null=False, blank=False)
\ No newline at end of file
+    service = models.ForeignKey(Service, on_delete=models.DO_NOTHING,null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['hairdresser', 'start_time'], name='agenda_hairdresser_start_idx'),
+        ]
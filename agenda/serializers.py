@@ -4,6 +4,7 @@ from users.serializers import HairdresserSerializer
 from service.serializers import ServiceSerializer
 from users.models import User, Customer
 from service.models import Service
+from django.core.exceptions import ObjectDoesNotExist
 
 class SimpleUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -31,21 +32,13 @@ class AgendaSerializer(serializers.ModelSerializer):
 
     def get_customer(self, obj: Agenda):
         """
-        Looks for a customer in the pre-fetched data passed through the context.
-        This avoids hitting the database for every single agenda item.
+        Serializes the customer of the Reserve linked to this agenda item.
+        Views should select_related('reserve__customer__user') to keep this query-free.
         """
-        # Create a unique key for the current agenda item
-        lookup_key = (obj.service_id, obj.start_time)
-        
-        # Get the reserve_map we created in the view from the context
-        reserve_map = self.context.get('reserve_map', {})
-        
-        # Find the matching reserve in our map
-        matching_reserve = reserve_map.get(lookup_key)
+        try:
+            reserve = obj.reserve
+        except ObjectDoesNotExist:
+            # Agenda rows created directly (not through a Reserve) have no customer
+            return None
 
-        if matching_reserve:
-            # If we found a match, serialize its customer
-            return SimpleCustomerSerializer(matching_reserve.customer).data
-        
-        # Return null if no corresponding reserve was found
-        return None
\ No newline at end of file
+        return SimpleCustomerSerializer(reserve.customer).data
@@ -6,9 +6,13 @@ import json
 from datetime import datetime, timedelta
 from django.utils import timezone
 
-from users.models import User, Hairdresser
+from users.models import User, Hairdresser, Customer
+from reserve.models import Reserve
 from service.models import Service
 from agenda.models import Agenda
+from agenda.booking import MAX_APPOINTMENT_SPAN, book_agenda, SlotUnavailable
+from reserve.slot_engine import LOCAL_TIMEZONE
+from django.db import transaction
 
 
 class AgendaTestCase(TestCase):
@@ -181,6 +185,66 @@ class CreateAgendaTest(AgendaTestCase):
         # After fixing, it should return HTTP 201
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
+    def test_create_agenda_overlap_conflict(self):
+        """Test an overlapping appointment is rejected with a 409"""
+        agenda_data = {
+            'start_time': (self.agenda_start_time + timedelta(minutes=30)).isoformat(),
+            'hairdresser': self.hairdresser.id,
+            'service': self.service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(agenda_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['error'], 'This time slot overlaps with an existing appointment')
+        self.assertEqual(Agenda.objects.count(), 1)
+
+    def test_create_agenda_longer_than_max_span(self):
+        """Test a block longer than MAX_APPOINTMENT_SPAN, or ending before it starts, is rejected with a 400"""
+        start_time = self.agenda_end_time + timedelta(hours=1)
+        for end_time in [start_time + MAX_APPOINTMENT_SPAN + timedelta(minutes=1), start_time]:
+            response = self.client.post(
+                self.create_url,
+                data=json.dumps({
+                    'start_time': start_time.isoformat(),
+                    'end_time': end_time.isoformat(),
+                    'hairdresser': self.hairdresser.id,
+                    'service': self.service.id
+                }),
+                content_type='application/json'
+            )
+
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Agenda.objects.count(), 1)
+
+
+class BookAgendaTest(AgendaTestCase):
+    def test_book_agenda_success(self):
+        """Test a free slot is booked for the hairdresser"""
+        with transaction.atomic():
+            agenda = book_agenda(self.hairdresser, self.service, self.agenda_end_time, self.agenda_end_time + timedelta(hours=1))
+
+        self.assertEqual(agenda.hairdresser, self.hairdresser)
+        self.assertEqual(Agenda.objects.count(), 2)
+
+    def test_book_agenda_overlap(self):
+        """Test booking an overlapping slot raises SlotUnavailable"""
+        with self.assertRaises(SlotUnavailable):
+            with transaction.atomic():
+                book_agenda(self.hairdresser, self.service, self.agenda_start_time, self.agenda_end_time)
+
+        self.assertEqual(Agenda.objects.count(), 1)
+
+    def test_book_agenda_other_hairdresser(self):
+        """Test the same slot is still free for another hairdresser"""
+        with transaction.atomic():
+            book_agenda(self.hairdresser2, self.service, self.agenda_start_time, self.agenda_end_time)
+
+        self.assertEqual(Agenda.objects.filter(hairdresser=self.hairdresser2).count(), 1)
 
 class ListAgendaTest(AgendaTestCase):
     def test_list_all_agendas(self):
@@ -188,7 +252,10 @@ class ListAgendaTest(AgendaTestCase):
         response = self.client.get(self.list_url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.json()['data']), 1)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))['data']
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], self.agenda.id)
         
     def test_list_hairdresser_agendas(self):
         """Test listing agendas for a specific hairdresser"""
@@ -208,6 +275,94 @@ class ListAgendaTest(AgendaTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()['data']), 1)
         
+    def test_list_hairdresser_agendas_with_customer(self):
+        """Test the linked reserve's customer is returned with a single join"""
+        customer_user = User.objects.create(
+            email="customer@example.com",
+            password="customer123",
+            first_name="Test",
+            last_name="Customer",
+            phone="+5592984501111",
+            neighborhood="Downtown",
+            city="Manaus",
+            state="AM",
+            address="Customer Street",
+            postal_code="69050750",
+            role="customer"
+        )
+        customer = Customer.objects.create(user=customer_user, cpf="12345678901")
+        Reserve.objects.create(
+            start_time=self.agenda_start_time,
+            customer=customer,
+            service=self.service,
+            agenda=self.agenda
+        )
+        Agenda.objects.create(
+            start_time=self.agenda_end_time,
+            end_time=self.agenda_end_time + timedelta(hours=1),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        list_hairdresser_url = reverse('list_agenda', args=[self.hairdresser.id])
+        with self.assertNumQueries(2):
+            response = self.client.get(list_hairdresser_url)
+
+        data = sorted(response.json()['data'], key=lambda item: item['start_time'])
+        self.assertEqual(data[0]['customer'], {'id': customer.id, 'user': {'first_name': 'Test', 'last_name': 'Customer'}})
+        self.assertIsNone(data[1]['customer'])
+
+    def test_list_hairdresser_agendas_window(self):
+        """Test the from/to window only returns the appointments overlapping it"""
+        Agenda.objects.create(
+            start_time=self.agenda_start_time + timedelta(days=7),
+            end_time=self.agenda_end_time + timedelta(days=7),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+        Agenda.objects.create(
+            start_time=self.agenda_start_time - timedelta(days=30),
+            end_time=self.agenda_end_time - timedelta(days=30),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        list_hairdresser_url = reverse('list_agenda', args=[self.hairdresser.id])
+        response = self.client.get(list_hairdresser_url, {
+            'from': (self.agenda_start_time + timedelta(minutes=30)).isoformat(),
+            'to': (self.agenda_start_time + timedelta(days=2)).isoformat()
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.json()['data']], [self.agenda.id])
+
+    def test_list_hairdresser_agendas_window_by_date(self):
+        """Test a plain 'to' date includes the whole day"""
+        local_day = timezone.localtime(self.agenda_start_time, LOCAL_TIMEZONE).date()
+        list_hairdresser_url = reverse('list_agenda', args=[self.hairdresser.id])
+
+        response = self.client.get(list_hairdresser_url, {
+            'from': local_day.isoformat(),
+            'to': local_day.isoformat()
+        })
+        self.assertEqual(len(response.json()['data']), 1)
+
+        response = self.client.get(list_hairdresser_url, {
+            'to': (local_day - timedelta(days=1)).isoformat()
+        })
+        self.assertEqual(len(response.json()['data']), 0)
+
+    def test_list_hairdresser_agendas_invalid_window(self):
+        """Test malformed or inverted windows are rejected"""
+        list_hairdresser_url = reverse('list_agenda', args=[self.hairdresser.id])
+
+        response = self.client.get(list_hairdresser_url, {'from': 'tomorrow'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(list_hairdresser_url, {'from': '2025-05-10', 'to': '2025-05-09'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], "'to' must be after 'from'")
+
     def test_list_nonexistent_hairdresser_agendas(self):
         """Test listing agendas for a non-existent hairdresser"""
         list_hairdresser_url = reverse('list_agenda', args=[9999])  # Non-existent ID
@@ -4,11 +4,16 @@ from agenda.serializers import AgendaSerializer
 from users.models import User, Hairdresser
 from service.models import Service
 from rest_framework.views import APIView
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
 import json
 from datetime import timedelta, datetime
-from reserve.models import Reserve
-from django.db.models import Q
+from django.utils import timezone
+from django.db import transaction
+from agenda.booking import MAX_APPOINTMENT_SPAN, InvalidAppointmentSpan, book_agenda, SlotUnavailable
+from reserve.slot_engine import LOCAL_TIMEZONE, local_day_bounds
+from hairmatch.pagination import InvalidCursor, paginate, set_next_cursor, wants_page
 # Create your views here.
 
 class CreateAgenda(APIView):
@@ -40,62 +45,51 @@ class CreateAgenda(APIView):
             except ValueError:
                 return JsonResponse({'error': 'Invalid end_time format'}, status=400)
         
-        # Verificação completa de sobreposição:
-        # Verifica se existem agendamentos que se sobrepõem ao novo agendamento
-        overlapping_agendas = Agenda.objects.filter(
-            hairdresser=data['hairdresser'],
-            # O start_time do agendamento existente é antes do end_time do novo
-            start_time__lt=end_time,
-            # E o end_time do agendamento existente é depois do start_time do novo
-            end_time__gt=start_time
-        )
-        
-        if overlapping_agendas.exists():
+        # Verificação de sobreposição feita sob lock por cabeleireiro (e, no Postgres,
+        # garantida pela constraint agenda_no_overlap)
+        try:
+            with transaction.atomic():
+                book_agenda(hairdresser_instance, service_instance, start_time, end_time)
+        except SlotUnavailable:
             return JsonResponse({
                 'error': 'This time slot overlaps with an existing appointment'
-            }, status=400)
-        
-        # Agora é seguro criar o agendamento
-        Agenda.objects.create(
-            service=service_instance,
-            hairdresser=hairdresser_instance,
-            start_time=start_time,
-            end_time=end_time
-        )
+            }, status=409)
+        except InvalidAppointmentSpan as error:
+            return JsonResponse({'error': str(error)}, status=400)
 
         return JsonResponse({'message': 'Agenda register created successfully'}, status=201)
 
 class ListAgenda(APIView):
     def get(self, request, hairdresser_id=None):
+        try:
+            window_start, window_end = parse_agenda_window(
+                request.GET.get('from'), request.GET.get('to')
+            )
+        except ValueError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+
         if hairdresser_id:
             try:
                 hairdresser = Hairdresser.objects.get(id=hairdresser_id)
-                agenda_items = Agenda.objects.filter(hairdresser=hairdresser).select_related('service')
-                if not agenda_items.exists():
-                    return JsonResponse({'data': []}, status=200)
-                reserve_identifiers = set()
-                for item in agenda_items:
-                    reserve_identifiers.add((item.service_id, item.start_time))
-
-                q_objects = Q()
-                for service_id, start_time in reserve_identifiers:
-                    q_objects |= Q(service_id=service_id, start_time=start_time)
-                matching_reserves = Reserve.objects.filter(q_objects).select_related('customer__user')
-                reserve_map = {
-                    (reserve.service_id, reserve.start_time): reserve
-                    for reserve in matching_reserves
-                }
-                serializer_context = {'reserve_map': reserve_map}
-                serializer = AgendaSerializer(agenda_items, many=True, context=serializer_context)
-                
-                return JsonResponse({'data': serializer.data}, status=200)
-
             except Hairdresser.DoesNotExist:
                 return JsonResponse({'error': 'Hairdresser not found'}, status=404)
-            
-        agendas = Agenda.objects.all()
-        result = AgendaSerializer(agendas, many=True).data 
-        return JsonResponse({'data': result}, status=200)
+
+            # Pages run newest first, so the first one holds the upcoming appointments
+            ordering = ('-start_time', '-id') if wants_page(request) else ('start_time', 'id')
+            agenda_items = filter_agenda_window(
+                Agenda.objects.filter(hairdresser=hairdresser), window_start, window_end
+            ).select_related('service', 'reserve__customer__user').order_by(*ordering)
+            try:
+                agenda_items, next_cursor = paginate(request, agenda_items, paged_by_default=False)
+            except InvalidCursor as error:
+                return JsonResponse({'error': str(error)}, status=400)
+            serializer = AgendaSerializer(agenda_items, many=True)
+            return set_next_cursor(JsonResponse({'data': serializer.data}, status=200), request, next_cursor)
+
+        agendas = filter_agenda_window(Agenda.objects.all(), window_start, window_end).select_related(
+            'service', 'reserve__customer__user'
+        ).order_by('id')
+        return StreamingHttpResponse(stream_agenda_dump(agendas), content_type='application/json')
     
 class UpdateAgenda(APIView):
     def put(self, request, agenda_id):
@@ -135,4 +129,71 @@ def calculate_end_time(start_time, duration_minutes):
     # Calculate end time by adding the duration in minutes
     end_time = start_time + timedelta(minutes=duration_minutes)
     
-    return end_time
\ No newline at end of file
+    return end_time
+
+
+# Rows fetched per round trip while streaming the unfiltered agenda dump
+AGENDA_STREAM_CHUNK_SIZE = 500
+
+
+def parse_agenda_bound(value, end_of_day=False):
+    """
+    Parses a 'from'/'to' query value, either an ISO datetime or a plain
+    YYYY-MM-DD date. Plain dates are read in the salon's timezone, and an
+    end bound given as a date covers that whole day.
+    """
+    day = parse_date(value)
+    if day is not None:
+        day_start, next_day_start = local_day_bounds(day)
+        return next_day_start if end_of_day else day_start
+
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=LOCAL_TIMEZONE)
+    return moment
+
+
+def parse_agenda_window(raw_from, raw_to):
+    """
+    Returns the (window_start, window_end) pair for the 'from'/'to' query
+    parameters; either side is None when it was not given.
+    """
+    try:
+        window_start = parse_agenda_bound(raw_from) if raw_from else None
+        window_end = parse_agenda_bound(raw_to, end_of_day=True) if raw_to else None
+    except ValueError:
+        raise ValueError("Invalid 'from'/'to' value. Use YYYY-MM-DD or an ISO datetime")
+
+    if window_start and window_end and window_end <= window_start:
+        raise ValueError("'to' must be after 'from'")
+    return window_start, window_end
+
+
+def filter_agenda_window(queryset, window_start, window_end):
+    """
+    Restricts an Agenda queryset to the appointments overlapping the window.
+    Relies on book_agenda() never storing one longer than MAX_APPOINTMENT_SPAN.
+    """
+    if window_end:
+        queryset = queryset.filter(start_time__lt=window_end)
+    if window_start:
+        queryset = queryset.filter(
+            start_time__gte=window_start - MAX_APPOINTMENT_SPAN,
+            end_time__gt=window_start
+        )
+    return queryset
+
+
+def stream_agenda_dump(agendas):
+    """
+    Yields the {"data": [...]} payload one serialized row at a time, so the
+    full table is never held in memory at once.
+    """
+    yield '{"data": ['
+    for position, agenda in enumerate(agendas.iterator(chunk_size=AGENDA_STREAM_CHUNK_SIZE)):
+        if position:
+            yield ', '
+        yield json.dumps(AgendaSerializer(agenda).data, cls=DjangoJSONEncoder)
+    yield ']}'
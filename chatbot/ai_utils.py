@@ -75,7 +75,7 @@ class AiUtils():
         """
         try:
             from preferences.models import Preferences 
-            from django.db.models import Q, Count 
+            from django.db.models import Q, Count, F
             
             if not preferences_list:
                 return UserFullInfoSerializer(
@@ -91,7 +91,9 @@ class AiUtils():
             if not matching_preferences.exists():
                 print("No matching preferences found, returning top-rated hairdressers")
                 return UserFullInfoSerializer(
-                    User.objects.filter(role='hairdresser').order_by('-rating')[:limit], 
+                    User.objects.filter(role='hairdresser').order_by(
+                        F('hairdresser__rating_mean').desc(nulls_last=True), '-rating'
+                    )[:limit], 
                     many=True
                 ).data
             
@@ -100,7 +102,9 @@ class AiUtils():
                 preferences__in=matching_preferences
             ).annotate(
                 preference_match_count=Count('preferences', filter=Q(preferences__in=matching_preferences))
-            ).order_by('-preference_match_count', '-rating')[:limit]
+            ).order_by(
+                '-preference_match_count', F('hairdresser__rating_mean').desc(nulls_last=True), '-rating'
+            )[:limit]
             
             return UserFullInfoSerializer(matching_hairdressers, many=True).data
             
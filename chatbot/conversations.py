@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Conversation
+
+# Where the WhatsApp flow keeps each phone number's conversation between
+# webhook calls, so any worker can answer the next message.
+#
+# settings.CHATBOT_CONVERSATION_BACKEND picks the store:
+#   'database'  Conversation rows; reads ignore rows idle for longer than
+#               CHATBOT_CONVERSATION_TTL_SECONDS, and
+#               `manage.py purge_conversations` deletes them
+#   'cache'     one entry per number in CHATBOT_CONVERSATION_CACHE, written
+#               with the TTL as timeout, so the cache evicts idle ones itself
+#
+# Both hand the view a Conversation instance (unsaved for the cache) and save
+# it back after each message. The Gemini chat is kept as plain role/text pairs,
+# trimmed to the last CHATBOT_HISTORY_MAX_MESSAGES, and replayed into a new chat
+# session per message.
+
+CACHE_KEY_PREFIX = 'chatbot:conversation:'
+
+
+class DatabaseConversationBackend:
+    def load(self, phone):
+        cutoff = timezone.now() - timedelta(seconds=settings.CHATBOT_CONVERSATION_TTL_SECONDS)
+        conversation = Conversation.objects.filter(phone=phone, updated_at__gte=cutoff).first()
+        return conversation or Conversation(phone=phone)
+
+    def save(self, conversation):
+        Conversation.objects.update_or_create(
+            phone=conversation.phone,
+            defaults={'state': conversation.state, 'data': conversation.data, 'history': conversation.history},
+        )
+
+    def delete(self, phone):
+        Conversation.objects.filter(phone=phone).delete()
+
+    def purge_expired(self):
+        cutoff = timezone.now() - timedelta(seconds=settings.CHATBOT_CONVERSATION_TTL_SECONDS)
+        deleted, _ = Conversation.objects.filter(updated_at__lt=cutoff).delete()
+        return deleted
+
+
+class CacheConversationBackend:
+    @property
+    def cache(self):
+        return caches[settings.CHATBOT_CONVERSATION_CACHE]
+
+    def load(self, phone):
+        stored = self.cache.get(CACHE_KEY_PREFIX + phone)
+        if stored is None:
+            return Conversation(phone=phone)
+        return Conversation(phone=phone, **stored)
+
+    def save(self, conversation):
+        stored = {'state': conversation.state, 'data': conversation.data, 'history': conversation.history}
+        self.cache.set(CACHE_KEY_PREFIX + conversation.phone, stored, settings.CHATBOT_CONVERSATION_TTL_SECONDS)
+
+    def delete(self, phone):
+        self.cache.delete(CACHE_KEY_PREFIX + phone)
+
+    def purge_expired(self):
+        # The cache expires entries on its own
+        return 0
+
+
+CONVERSATION_BACKENDS = {
+    'database': DatabaseConversationBackend,
+    'cache': CacheConversationBackend,
+}
+
+
+def get_conversation_store():
+    return CONVERSATION_BACKENDS[settings.CHATBOT_CONVERSATION_BACKEND]()
+
+
+def chat_history(conversation):
+    """
+    Returns the stored chat as the history of a new Gemini chat session.
+    """
+    return [{'role': message['role'], 'parts': [message['text']]} for message in conversation.history]
+
+
+def store_chat_history(conversation, contents):
+    """
+    Stores a Gemini chat history as compact role/text pairs, keeping the most
+    recent CHATBOT_HISTORY_MAX_MESSAGES.
+    """
+    messages = [
+        {'role': content.role, 'text': ''.join(part.text for part in content.parts if getattr(part, 'text', None))}
+        for content in contents
+    ]
+    limit = settings.CHATBOT_HISTORY_MAX_MESSAGES
+    if len(messages) > limit:
+        messages = messages[-limit:]
+        # A Gemini history has to open with a user turn
+        while messages and messages[0]['role'] != 'user':
+            messages.pop(0)
+    conversation.history = messages
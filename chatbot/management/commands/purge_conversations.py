@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.conversations import get_conversation_store
+
+
+class Command(BaseCommand):
+    """
+    Deletes chatbot conversations idle for longer than
+    CHATBOT_CONVERSATION_TTL_SECONDS. Meant to run periodically (e.g. cron)
+    with the database backend; the cache backend expires them by itself.
+    """
+
+    help = "Deletes idle chatbot conversations"
+
+    def handle(self, *args, **options):
+        deleted = get_conversation_store().purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idle conversations."))
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=32, unique=True)),
+                ('state', models.CharField(default='start', max_length=50)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('history', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='conversation_updated_at_idx')],
+            },
+        ),
+    ]
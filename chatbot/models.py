@@ -1,3 +1,21 @@
 from django.db import models
 
-# Create your models here.
+
+class Conversation(models.Model):
+    """
+    WhatsApp conversation state of one phone number, kept by
+    chatbot/conversations.py.
+    """
+    phone = models.CharField(max_length=32, unique=True)
+    state = models.CharField(max_length=50, default='start')
+    # Choices made along the flow (hairdresser ids, service ids, date, ...)
+    data = models.JSONField(default=dict, blank=True)
+    # Preference chat with the model, as [{'role': ..., 'text': ...}]
+    history = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Serves the idle-conversation purge
+            models.Index(fields=['updated_at'], name='conversation_updated_at_idx'),
+        ]
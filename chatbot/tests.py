@@ -186,15 +186,21 @@ class AiUtilsTest(TestCase):
 # chatbot/tests/test_views.py
 
 import json
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch, MagicMock
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
 from django.urls import reverse
 from django.conf import settings
 
 from users.models import User, Hairdresser, Customer
 from preferences.models import Preferences
 from service.models import Service
-from chatbot.views import user_states, user_chats, user_preferences, recommended_or_searched_hairdressers, chosen_hairdresser, show_services, chosen_service, chosen_date
+from chatbot.conversations import get_conversation_store, store_chat_history
+from chatbot.models import Conversation
 from chatbot.response_messages import ResponseMessage
 
 
@@ -302,16 +308,16 @@ class ChatbotViewTest(TestCase):
             }
         }
     
-    def tearDown(self):
-        """Clean up in-memory dictionaries after each test."""
-        user_states.clear()
-        user_chats.clear()
-        user_preferences.clear()
-        recommended_or_searched_hairdressers.clear()
-        chosen_hairdresser.clear()
-        show_services.clear()
-        chosen_service.clear()
-        chosen_date.clear()
+    def _conversation(self):
+        """Loads the sender's conversation from the configured store."""
+        return get_conversation_store().load(self.sender_number)
+
+    def _save_conversation(self, state, **data):
+        """Puts the sender's conversation in the given state."""
+        conversation = self._conversation()
+        conversation.state = state
+        conversation.data.update(data)
+        get_conversation_store().save(conversation)
 
     def _create_webhook_payload(self, message_text):
         """Helper to create a valid JSON payload for the POST request."""
@@ -329,7 +335,7 @@ class ChatbotViewTest(TestCase):
         mock_send_message.assert_called_once()
         sent_message = mock_send_message.call_args[0][1]
         self.assertIn(f"Olá {self.customer_user.first_name}", sent_message)
-        self.assertEqual(user_states.get(self.sender_number), 'main_menu')
+        self.assertEqual(self._conversation().state, 'main_menu')
 
     @patch('chatbot.views.AiUtils.send_whatsapp_message')
     def test_start_state_new_user(self, mock_send_message):
@@ -342,27 +348,22 @@ class ChatbotViewTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
         mock_send_message.assert_called_with(self.sender_number, "Olá! Bem-vindo(a) ao Hairmatch. Para começarmos, qual é o seu nome?")
-        self.assertEqual(user_states.get(self.sender_number), 'waiting_name')
+        self.assertEqual(self._conversation().state, 'waiting_name')
         
     @patch('chatbot.views.AiUtils.send_whatsapp_message')
-    @patch('chatbot.views.AiUtils.create_gemini_model_for_preference_collection')
-    def test_main_menu_state_collect_preferences(self, mock_create_model, mock_send_message):
+    def test_main_menu_state_collect_preferences(self, mock_send_message):
         """Test user selecting option 1 (recommendation) from the main menu."""
-        # Mock the model and chat session creation
-        mock_model = MagicMock()
-        mock_chat_session = MagicMock()
-        mock_create_model.return_value = mock_model
-        mock_model.start_chat.return_value = mock_chat_session
-        
-        user_states[self.sender_number] = 'main_menu'
+        self._save_conversation('main_menu')
         payload = self._create_webhook_payload("1")
 
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
 
         self.assertEqual(response.status_code, 200)
         mock_send_message.assert_called_with(self.sender_number, ResponseMessage.SERVICE_TYPE_SEARCH)
-        self.assertEqual(user_states.get(self.sender_number), 'collecting_preferences')
-        self.assertIn(self.sender_number, user_chats) # Chat session should be created
+        conversation = self._conversation()
+        self.assertEqual(conversation.state, 'collecting_preferences')
+        self.assertEqual(conversation.data['preferences'], []) # Chat should be started
+        self.assertEqual(conversation.history, [])
 
     @patch('chatbot.views.AiUtils.send_whatsapp_message')
     @patch('chatbot.views.get_available_slots')
@@ -371,14 +372,13 @@ class ChatbotViewTest(TestCase):
     def test_full_booking_flow(self, mock_get_availability, mock_create_reserve, mock_get_slots, mock_send_message):
         """Test a full, successful booking flow from service selection to confirmation."""
         # --- State 1: Select a hairdresser ---
-        user_states[self.sender_number] = 'hairdresser_service_selection'
-        recommended_or_searched_hairdressers[self.sender_number] = [self.hairdresser1.id, self.hairdresser2.id]
+        self._save_conversation('hairdresser_service_selection', hairdresser_ids=[self.hairdresser1.id, self.hairdresser2.id])
         payload = self._create_webhook_payload("1") # Choosing hairdresser1
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
         
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(user_states[self.sender_number], 'service_booking_selection')
-        self.assertEqual(chosen_hairdresser[self.sender_number], self.hairdresser1.id)
+        self.assertEqual(self._conversation().state, 'service_booking_selection')
+        self.assertEqual(self._conversation().data['hairdresser_id'], self.hairdresser1.id)
         mock_send_message.assert_called()
         self.assertIn("Serviços de Joana Silva", mock_send_message.call_args[0][1])
 
@@ -390,8 +390,8 @@ class ChatbotViewTest(TestCase):
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(user_states[self.sender_number], 'waiting_for_date')
-        self.assertEqual(chosen_service[self.sender_number], self.service2.id)
+        self.assertEqual(self._conversation().state, 'waiting_for_date')
+        self.assertEqual(self._conversation().data['service_id'], self.service2.id)
         self.assertIn("Para qual data você gostaria de agendar?", mock_send_message.call_args[0][1])
 
         # --- State 3: Provide a date ---
@@ -400,8 +400,8 @@ class ChatbotViewTest(TestCase):
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
 
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(user_states[self.sender_number], 'confirm_booking')
-        self.assertIn(self.sender_number, chosen_date)
+        self.assertEqual(self._conversation().state, 'confirm_booking')
+        self.assertIn('date', self._conversation().data)
         self.assertIn("Horários disponíveis para", mock_send_message.call_args[0][1])
         
         # --- State 4: Confirm time and booking ---
@@ -411,20 +411,104 @@ class ChatbotViewTest(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertIn("✅ *Agendamento Confirmado!* ✅", mock_send_message.call_args[0][1])
-        self.assertNotIn(self.sender_number, user_states) # State should be cleared
+        conversation = self._conversation()
+        self.assertEqual(conversation.state, 'start') # State should be cleared
+        self.assertNotIn('service_id', conversation.data)
         
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    @patch('chatbot.views.get_available_slots')
+    @patch('chatbot.views.find_earliest_slots')
+    def test_waiting_for_date_suggests_next_slots(self, mock_find_earliest, mock_get_slots, mock_send_message):
+        """Test that a full day offers the next free slots found in a single search."""
+        self._save_conversation('waiting_for_date', hairdresser_id=self.hairdresser1.id, service_id=self.service2.id)
+        mock_get_slots.return_value = {'available_slots': []}
+        mock_find_earliest.return_value = [{'date': '2030-01-08', 'time': '09:00'}]
+
+        payload = self._create_webhook_payload("07/01/2030")
+        response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        mock_find_earliest.assert_called_once()
+        self.assertIn("*08/01/2030* às *09:00*", mock_send_message.call_args[0][1])
+        self.assertEqual(self._conversation().state, 'waiting_for_date')
+
     @patch('chatbot.views.AiUtils.send_whatsapp_message')
     def test_stop_command(self, mock_send_message):
         """Test that the 'Parar' command stops the chat and clears the state."""
-        user_states[self.sender_number] = 'collecting_preferences'
-        user_chats[self.sender_number] = "dummy_chat"
+        self._save_conversation('collecting_preferences', preferences=[])
         payload = self._create_webhook_payload(ResponseMessage.CHAT_STOP)
         
         response = self.client.post(self.evolution_api_url, data=payload, content_type='application/json')
 
         self.assertEqual(response.status_code, 200)
         mock_send_message.assert_called_with(self.sender_number, ResponseMessage.CHAT_STOPPED)
-        self.assertNotIn(self.sender_number, user_states)
-        self.assertNotIn(self.sender_number, user_chats)
+        self.assertFalse(Conversation.objects.filter(phone=self.sender_number).exists())
+        self.assertEqual(self._conversation().state, 'start')
 
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    @patch('chatbot.views.AiUtils.create_gemini_model_for_preference_collection')
+    def test_preference_chat_is_replayed_from_the_store(self, mock_create_model, mock_send_message):
+        """Test that the preference chat survives between messages as role/text pairs."""
+        self._save_conversation('collecting_preferences', preferences=[])
+        mock_chat_session = mock_create_model.return_value.start_chat.return_value
+        mock_chat_session.send_message.return_value = MagicMock(text="Que tipo de corte?")
+        mock_chat_session.history = [
+            MagicMock(role='user', parts=[MagicMock(text="Quero cortar")]),
+            MagicMock(role='model', parts=[MagicMock(text="Que tipo de corte?")]),
+        ]
+
+        self.client.post(self.evolution_api_url, data=self._create_webhook_payload("Quero cortar"), content_type='application/json')
+        self.assertEqual(self._conversation().history, [
+            {'role': 'user', 'text': "Quero cortar"},
+            {'role': 'model', 'text': "Que tipo de corte?"},
+        ])
+
+        self.client.post(self.evolution_api_url, data=self._create_webhook_payload("Curto"), content_type='application/json')
+        mock_create_model.return_value.start_chat.assert_called_with(history=[
+            {'role': 'user', 'parts': ["Quero cortar"]},
+            {'role': 'model', 'parts': ["Que tipo de corte?"]},
+        ])
+
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    def test_idle_conversations_expire(self, mock_send_message):
+        """Test that a conversation idle past the TTL starts over and can be purged."""
+        self._save_conversation('waiting_for_date', hairdresser_id=self.hairdresser1.id)
+        Conversation.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        with override_settings(CHATBOT_CONVERSATION_TTL_SECONDS=3600):
+            self.assertEqual(self._conversation().state, 'start')
+            out = StringIO()
+            call_command('purge_conversations', stdout=out)
+        self.assertIn('Deleted 1 idle conversations.', out.getvalue())
+        self.assertFalse(Conversation.objects.exists())
+
+    @override_settings(
+        CHATBOT_CONVERSATION_BACKEND='cache',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    @patch('chatbot.views.AiUtils.send_whatsapp_message')
+    def test_cache_backend(self, mock_send_message):
+        """Test the flow with conversations kept in the cache instead of the database."""
+        self.addCleanup(cache.clear)
+        self.client.post(self.evolution_api_url, data=self._create_webhook_payload("Olá"), content_type='application/json')
+
+        self.assertEqual(self._conversation().state, 'main_menu')
+        self.assertFalse(Conversation.objects.exists())
+
+        self.client.post(self.evolution_api_url, data=self._create_webhook_payload(ResponseMessage.CHAT_STOP), content_type='application/json')
+        self.assertEqual(self._conversation().state, 'start')
 
+
+class ConversationStoreTest(TestCase):
+    @override_settings(CHATBOT_HISTORY_MAX_MESSAGES=3)
+    def test_history_keeps_the_latest_messages_from_a_user_turn(self):
+        conversation = Conversation(phone='5511987654321')
+        contents = [
+            MagicMock(role=role, parts=[MagicMock(text=f"{role} {index}")])
+            for index, role in enumerate(['user', 'model'] * 3)
+        ]
+        store_chat_history(conversation, contents)
+        self.assertEqual(conversation.history, [
+            {'role': 'user', 'text': "user 4"},
+            {'role': 'model', 'text': "model 5"},
+        ])
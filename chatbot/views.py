@@ -3,7 +3,7 @@ import requests
 import json
 import os
 import google.generativeai as genai
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.db.models import Q
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
@@ -15,25 +15,16 @@ from users.models import User, Hairdresser, Customer
 from users.serializers import UserFullInfoSerializer
 from service.models import Service
 from reserve.models import Reserve
-from reserve.views import get_available_slots, create_new_reserve
+from reserve.views import get_available_slots, create_new_reserve, find_earliest_slots
 from availability.views import get_hairdresser_availability
 from .ai_utils import AiUtils
+from .conversations import chat_history, get_conversation_store, store_chat_history
 from .response_messages import ResponseMessage
 from .templates import Templates
 
 GEMINI_API_KEY =  settings.GEMINI_API_KEY 
 genai.configure(api_key=GEMINI_API_KEY)
 
-# TODO fazer models
-user_states = {}
-user_chats = {}
-user_preferences = {}
-recommended_or_searched_hairdressers = {}
-chosen_hairdresser = {}
-show_services= {}
-chosen_service = {}
-chosen_date = {}
-
 class EvolutionApi(APIView):
     def post(self, request):
         try:
@@ -47,25 +38,27 @@ class EvolutionApi(APIView):
                 if not incoming_text:
                     return JsonResponse({"status":"ok", "message":"No text in message"}, status=200)
 
-                current_state = user_states.get(sender_number,'start')
+                store = get_conversation_store()
+                conversation = store.load(sender_number)
+                current_state = conversation.state
                 response_message = "Desculpe, não entendi. Poderia repetir?" 
                 incoming_text = incoming_text.strip()
 
                 if incoming_text.lower() == ResponseMessage.CHAT_STOP.lower():
                     response_message = ResponseMessage.CHAT_STOPPED
-                    user_states.pop(sender_number, None)
-                    user_chats.pop(sender_number, None)
-                    user_preferences.pop(sender_number,None)
+                    store.delete(sender_number)
                     AiUtils.send_whatsapp_message(sender_number, response_message)
                     return JsonResponse({"status": "ok"}, status=200)
 
                 if incoming_text.lower() in ['recomendar', 'recomendação', 'sugerir', 'indicar']:
-                    if sender_number in user_chats and sender_number in user_preferences:
-                        chat_session = user_chats[sender_number]
+                    if 'preferences' in conversation.data:
+                        chat_session = AiUtils.create_gemini_model_for_preference_collection().start_chat(
+                            history=chat_history(conversation)
+                        )
                         preferences = AiUtils.extract_preferences_from_conversation(chat_session.history)
             
                         if preferences:
-                            user_preferences[sender_number] = preferences
+                            conversation.data['preferences'] = preferences
                             matching_hairdressers = AiUtils.get_hairdressers_by_preferences(preferences, limit=5)
                             if matching_hairdressers:
                                 recommendation_model = AiUtils.create_gemini_model_for_recommendation(matching_hairdressers)
@@ -75,7 +68,7 @@ class EvolutionApi(APIView):
                                     f"Minhas preferências incluem: {', '.join(preferences)}" 
                                 )  
                                 formatted_answer,names, ids = AiUtils.format_hairdresser(recommendation_response.text)
-                                recommended_or_searched_hairdressers[sender_number] = ids
+                                conversation.data['hairdresser_ids'] = ids
                                 response_message = f"Com base no que você me contou, encontrei alguns profissionais perfeitos para você:\n {formatted_answer}"
                                 for index in range(len(ids)):
                                     response_message += (
@@ -85,7 +78,7 @@ class EvolutionApi(APIView):
                                     f"\n\n*Digite {len(ids)+1}* para buscar profissionais novamente\n\n"
                                 ) 
 
-                                user_states[sender_number] = 'hairdresser_service_selection'
+                                conversation.state = 'hairdresser_service_selection'
                             else:
                                 response_message = ("Não encontrei cabeleireiros que correspondam exatamente às suas preferências. "
                                                   "Gostaria que eu amplie a busca ou prefere tentar com outras preferências?")
@@ -94,7 +87,7 @@ class EvolutionApi(APIView):
                                               "Pode me contar mais sobre o que você está procurando?")
                     else:
                         response_message = "Vamos começar nossa conversa primeiro. Que tipo de serviço você está procurando?"
-                        user_states[sender_number] = 'collecting_preferences'
+                        conversation.state = 'collecting_preferences'
 
                 elif current_state == 'start':
                     try:
@@ -104,10 +97,10 @@ class EvolutionApi(APIView):
                             f"Olá {user.first_name} {user.last_name}! Bem-vindo(a) de volta ao Hairmatch."
                             f"{ResponseMessage.HOW_CAN_I_HELP_YOU_TODAY}"
                         )
-                        user_states[sender_number] = 'main_menu'
+                        conversation.state = 'main_menu'
                     except User.DoesNotExist: 
                         response_message = f"Olá! Bem-vindo(a) ao Hairmatch. Para começarmos, qual é o seu nome?"
-                        user_states[sender_number] = 'waiting_name'
+                        conversation.state = 'waiting_name'
 
                 elif current_state == 'waiting_name':
                     user_name = incoming_text
@@ -117,30 +110,31 @@ class EvolutionApi(APIView):
                         f"{ResponseMessage.HOW_CAN_I_HELP_YOU_TODAY}" 
                     )
 
-                    user_states[sender_number] = 'main_menu'
+                    conversation.state = 'main_menu'
 
                 elif current_state == 'main_menu':
                     if incoming_text == '1':
-                        user_states[sender_number] = 'collecting_preferences'
-                        preference_model = AiUtils.create_gemini_model_for_preference_collection()
-                        chat_session = preference_model.start_chat(history=[])
-                        user_chats[sender_number] = chat_session
-                        user_preferences[sender_number] = []
+                        conversation.state = 'collecting_preferences'
+                        conversation.history = []
+                        conversation.data['preferences'] = []
                         response_message = ResponseMessage.SERVICE_TYPE_SEARCH
                     elif incoming_text == '2':
                         response_message = ResponseMessage.FIND_SPECIFIC_HAIRDRESSER
-                        user_states[sender_number] = 'find_specific_hairdresser'
+                        conversation.state = 'find_specific_hairdresser'
                     else:
                         response_message = ResponseMessage.INVALID_OPTION_MESSAGE
                 elif current_state == 'collecting_preferences':
-                    chat_session = user_chats.get(sender_number)
-                    if not chat_session:
+                    if 'preferences' not in conversation.data:
                         response_message = ResponseMessage.RECOMMENDATION_RESTART_CHAT
-                        user_states[sender_number] = 'main_menu'
+                        conversation.state = 'main_menu'
                     else:
                         try:
+                            chat_session = AiUtils.create_gemini_model_for_preference_collection().start_chat(
+                                history=chat_history(conversation)
+                            )
                             gemini_response = chat_session.send_message(incoming_text)
                             response_message = gemini_response.text
+                            store_chat_history(conversation, chat_session.history)
                             
                             if len(chat_session.history) > 3:  # After some conversation
                                 response_message = ResponseMessage.I_COLLECTED_ENOUGH_DATA_RECOMMEND
@@ -165,7 +159,7 @@ class EvolutionApi(APIView):
                             serialized_hairdressers = UserFullInfoSerializer(hairdressers, many=True).data 
                             response_message = "Encontrei estes profissionais:\n\n"
                             hairdresser_ids_for_next_state = [h['hairdresser']['id'] for h in serialized_hairdressers]
-                            recommended_or_searched_hairdressers[sender_number] = hairdresser_ids_for_next_state
+                            conversation.data['hairdresser_ids'] = hairdresser_ids_for_next_state
                             for h in serialized_hairdressers: 
                                 specialties_str = ", ".join(h['preferences']) 
                                 response_message += (
@@ -184,7 +178,7 @@ class EvolutionApi(APIView):
                                     f"\n\n*Digite {len(serialized_hairdressers)+1}* para buscar profissionais novamente\n\n"
                                 )
                                 
-                            user_states[sender_number] = 'hairdresser_service_selection' 
+                            conversation.state = 'hairdresser_service_selection' 
                         else:
                             response_message = f"Não encontrei nenhum cabeleireiro com o nome '{hairdresser_name}'. Gostaria de tentar outro nome ou receber recomendações baseadas em suas preferências?"
                     except Exception as e:
@@ -193,18 +187,18 @@ class EvolutionApi(APIView):
                 elif current_state == 'hairdresser_service_selection':
                     try:
                         choice = int(incoming_text) 
-                        hairdressers_ids = recommended_or_searched_hairdressers[sender_number]
+                        hairdressers_ids = conversation.data['hairdresser_ids']
                         if choice == len(hairdressers_ids)+1:
-                            user_states[sender_number] = 'collecting_preferences'
+                            conversation.state = 'collecting_preferences'
                             response_message = ResponseMessage.SERVICE_TYPE_SEARCH
                         elif hairdressers_ids and 0 < choice <= len(hairdressers_ids):
                             hairdresser_id = hairdressers_ids[choice-1]
                             try: 
                                 hairdresser = Hairdresser.objects.get(id=hairdresser_id)
-                                chosen_hairdresser[sender_number] = hairdresser_id
-                                services = Service.objects.filter(hairdresser=hairdresser)
-                                show_services[sender_number] = list(services)
-                                if services.exists():
+                                conversation.data['hairdresser_id'] = hairdresser_id
+                                services = list(Service.objects.filter(hairdresser=hairdresser).order_by('id'))
+                                conversation.data['service_ids'] = [service.id for service in services]
+                                if services:
                                     response_message = f"Serviços de {hairdresser.user.first_name} {hairdresser.user.last_name}:\n\n"
                                     for service in services: 
                                         response_message += (
@@ -219,13 +213,13 @@ class EvolutionApi(APIView):
                                     response_message += ( 
                                         f"*Digite {len(services)+1}* para buscar profissionais novamente\n\n"
                                     )
-                                    user_states[sender_number] = 'service_booking_selection'
+                                    conversation.state = 'service_booking_selection'
                                 else:
                                     response_message = "Este profissional ainda não cadastrou serviços."
-                                    user_states[sender_number] = 'main_menu'
+                                    conversation.state = 'main_menu'
                             except Hairdresser.DoesNotExist:
                                 response_message = "Profissional não encontrado."
-                                user_states[sender_number] = 'main_menu'
+                                conversation.state = 'main_menu'
                         else:
                             response_message = "Opção inválida. Por favor, digite o número correspondente ao profissional."
                     except ValueError:
@@ -234,33 +228,33 @@ class EvolutionApi(APIView):
                         print(
                             f"Error in hairdresser_service_selection: {e}")
                         response_message = "Ocorreu um erro ao selecionar o profissional. Tente novamente."
-                        user_states[sender_number] = 'main_menu'
+                        conversation.state = 'main_menu'
                 
                 elif current_state == 'service_booking_selection':
                     choice = int(incoming_text)
                     print(choice)
-                    services_list = show_services[sender_number] 
+                    services_list = conversation.data['service_ids']
                     if choice == len(services_list)+1:
-                        user_states[sender_number] = 'collecting_preferences'
+                        conversation.state = 'collecting_preferences'
                         response_message = ResponseMessage.SERVICE_TYPE_SEARCH
                     elif services_list and 0 < choice <= len(services_list):
-                        service = services_list[choice-1]
-                        chosen_service[sender_number] = service.id 
-                        hairdresser_id = chosen_hairdresser[sender_number]
+                        service = Service.objects.select_related('hairdresser__user').get(id=services_list[choice-1])
+                        conversation.data['service_id'] = service.id
+                        hairdresser_id = conversation.data['hairdresser_id']
 
                         if not hairdresser_id:
                             response_message = "Erro: não foi possível encontrar o profissional. Vamos começar de novo."
-                            user_states[sender_number] = 'main_menu'
+                            conversation.state = 'main_menu'
                         else:
                             availability_result = get_hairdresser_availability(hairdresser_id=hairdresser_id)
                             if 'error' in availability_result:
                                 response_message = "Não consegui consultar os dias de trabalho deste profissional."
-                                user_states[sender_number] = 'main_menu' 
+                                conversation.state = 'main_menu' 
                             else:
                                 availabilities = availability_result.get('availabilities', [])
                                 if not availabilities:
                                     response_message = "Este profissional ainda não configurou seus dias de trabalho e não pode ser agendado."
-                                    user_states[sender_number] = 'main_menu'
+                                    conversation.state = 'main_menu'
                                 else:
                                     response_message = f"Ótima escolha! O horário de funcionamento de {service.hairdresser.user.first_name} é:\n\n"
                                     for avail in availabilities:
@@ -272,16 +266,16 @@ class EvolutionApi(APIView):
                                     response_message += "\nPara qual data você gostaria de agendar?\n"
                                     response_message += "Diga *hoje*, *amanhã* ou use o formato *dd/mm/yyyy*."
 
-                                    user_states[sender_number] = 'waiting_for_date'
+                                    conversation.state = 'waiting_for_date'
                     else:
                         response_message = "Opção inválida. Por favor, digite o número de um dos serviços listados."               
                 
                 elif current_state == 'waiting_for_date':
                     date_str_formatted = AiUtils.parse_date_from_text(incoming_text)
                     if date_str_formatted:
-                        chosen_date[sender_number] = date_str_formatted
-                        hairdresser_id = chosen_hairdresser[sender_number]
-                        service_id = chosen_service[sender_number]
+                        conversation.data['date'] = date_str_formatted
+                        hairdresser_id = conversation.data['hairdresser_id']
+                        service_id = conversation.data['service_id']
                         if hairdresser_id and service_id:
                             result = get_available_slots(hairdresser_id,service_id,date_str_formatted)
                             if "error" in result:
@@ -292,20 +286,34 @@ class EvolutionApi(APIView):
                                     response_message = f"Horários disponíveis para {datetime.strptime(date_str_formatted, '%Y-%m-%d').strftime('%d/%m/%Y')}:\n\n"
                                     response_message += " ".join([f"*{slot}*\n" for slot in slots])
                                     response_message += "\n\nDigite o horário que deseja para confirmar."
-                                    user_states[sender_number] = 'confirm_booking'
+                                    conversation.state = 'confirm_booking'
                                 else: 
                                     response_message = f"Desculpe, não há horários disponíveis nesta data. Gostaria de tentar outra?"
+                                    selected_date = datetime.strptime(date_str_formatted, '%Y-%m-%d').date()
+                                    service_duration = Service.objects.get(id=service_id).duration
+                                    next_slots = find_earliest_slots(
+                                        hairdresser_id,
+                                        service_duration,
+                                        selected_date,
+                                        selected_date + timedelta(days=30),
+                                        limit=5
+                                    )
+                                    if next_slots:
+                                        response_message += "\n\nPróximos horários livres:\n"
+                                        for slot in next_slots:
+                                            slot_date = datetime.strptime(slot['date'], '%Y-%m-%d').strftime('%d/%m/%Y')
+                                            response_message += f"*{slot_date}* às *{slot['time']}*\n"
                         else:
                             response_message = "Ocorreu um erro. Vamos tentar novamente."
-                            user_states[sender_number] = 'main_menu'
+                            conversation.state = 'main_menu'
                     else:
                         response_message = "Formato de data inválido. Por favor, use *hoje*, *amanhã* ou *dd/mm/yyyy*."
                 
                 elif current_state == 'confirm_booking':
                     try:
-                        hairdresser_id = chosen_hairdresser[sender_number]
-                        service_id = chosen_service[sender_number]
-                        selected_date_str = chosen_date[sender_number]
+                        hairdresser_id = conversation.data['hairdresser_id']
+                        service_id = conversation.data['service_id']
+                        selected_date_str = conversation.data['date']
                         selected_time_str = incoming_text
 
                         user = User.objects.get(phone=sender_number)
@@ -335,11 +343,9 @@ class EvolutionApi(APIView):
                                 "Obrigado por usar o Hairmatch! O que mais posso fazer por você?"
                             )
                             # Cleanup state for the user
-                            user_states.pop(sender_number, None)
-                            chosen_hairdresser.pop(sender_number, None)
-                            show_services.pop(sender_number, None)
-                            chosen_service.pop(sender_number, None)
-                            chosen_date.pop(sender_number, None)
+                            conversation.state = 'start'
+                            for key in ('hairdresser_id', 'service_ids', 'service_id', 'date'):
+                                conversation.data.pop(key, None)
                         else:
                             # If booking failed (e.g., slot taken), inform the user
                             response_message = result.get('error', 'Ocorreu um erro desconhecido.')
@@ -355,7 +361,8 @@ class EvolutionApi(APIView):
                     except Exception as e:
                         print(f"Error in 'confirm_booking': {e}")
                         response_message = "Ocorreu um erro crítico ao confirmar seu agendamento. Tente novamente."
-                        user_states[sender_number] = 'main_menu' 
+                        conversation.state = 'main_menu' 
+                store.save(conversation)
                 AiUtils.send_whatsapp_message(sender_number,response_message)
         except json.JSONDecodeError:
             return JsonResponse({"status": "error", "message": "Invalid JSON"}, status=400)
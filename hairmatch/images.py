@@ -0,0 +1,209 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+# Derivatives of uploaded pictures (User.profile_picture, Review.picture and
+# Preferences.picture).
+#
+# After an upload commits, a worker thread (IMAGE_PROCESSING_WORKERS, or inline
+# when 0) opens the file with Pillow. If the file carries EXIF data, it is
+# rewritten upright and without that data, and the row is pointed at the clean
+# copy. Then a thumbnail and a card-sized image are written next to it in WebP
+# and JPEG, named after the original:
+#
+#   profile_pics/ana.jpg -> profile_pics/ana.thumb.webp, profile_pics/ana.card.jpg, ...
+#
+# Serializers expose the variant URLs once they exist (see variant_urls), so a
+# card downloads a few kilobytes instead of the phone photo. Files uploaded
+# before this pipeline are processed by `manage.py generate_image_variants`.
+
+logger = logging.getLogger(__name__)
+
+# name: (size, crop to exactly that size instead of fitting inside it)
+IMAGE_VARIANTS = {
+    'thumb': ((160, 160), True),
+    'card': ((640, 640), False),
+}
+VARIANT_FORMATS = [('jpg', 'JPEG'), ('webp', 'WEBP')]
+# Written last, so its presence means every variant of the image exists
+MARKER_VARIANT = ('thumb', 'webp')
+SANITIZED_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+
+# (app label, model, image field) of every picture that gets variants
+IMAGE_FIELDS = [
+    ('users', 'User', 'profile_picture'),
+    ('review', 'Review', 'picture'),
+    ('preferences', 'Preferences', 'picture'),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(name, variant, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.{extension}'
+
+
+def variant_urls(field_file):
+    """
+    Returns {'thumb_webp': url, ...} for a picture, {} while its variants are
+    still being generated, or None when there is no picture.
+    """
+    if not field_file:
+        return None
+    storage, name = field_file.storage, field_file.name
+    if not storage.exists(variant_name(name, *MARKER_VARIANT)):
+        return {}
+    return {
+        f'{variant}_{extension}': storage.url(variant_name(name, variant, extension))
+        for variant in IMAGE_VARIANTS for extension, _ in VARIANT_FORMATS
+    }
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Read-only serializer field with the variant URLs of an image field, made
+    absolute like DRF's own file URLs when the request is in the context.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        urls = variant_urls(value)
+        request = self.context.get('request')
+        if urls and request is not None:
+            urls = {key: request.build_absolute_uri(url) for key, url in urls.items()}
+        return urls
+
+
+def schedule_variants(instance, field_name):
+    """
+    Processes the instance's picture once the current transaction commits.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return
+    args = (instance._meta.label, instance.pk, field_name, field_file.name)
+    transaction.on_commit(lambda: submit(*args))
+
+
+def submit(model_label, pk, field_name, name):
+    if settings.IMAGE_PROCESSING_WORKERS <= 0:
+        process_picture(model_label, pk, field_name, name)
+        return
+    get_executor().submit(process_in_background, model_label, pk, field_name, name)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS, thread_name_prefix='image-variants'
+            )
+        return _executor
+
+
+def process_in_background(*args):
+    try:
+        process_picture(*args)
+    except Exception:
+        logger.exception('Could not generate image variants for %s', args)
+    finally:
+        # Pool threads are long-lived; don't leave their connection open
+        connection.close()
+
+
+def process_picture(model_label, pk, field_name, name):
+    """
+    Sanitizes one stored picture and writes its variants. Returns the name of
+    the processed file, or None if it could not be processed.
+    """
+    field = apps.get_model(model_label)._meta.get_field(field_name)
+    storage = field.storage
+    try:
+        with storage.open(name, 'rb') as stored:
+            image = Image.open(stored)
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as error:
+        logger.warning('Skipping image variants of %s: %s', name, error)
+        return None
+
+    has_metadata = bool(image.getexif()) or 'exif' in image.info
+    # Transposing drops the format, which the sanitized copy keeps
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    if has_metadata:
+        name = replace_with_sanitized(model_label, pk, field_name, name, image, image_format)
+        if name is None:
+            return None
+
+    write_variants(storage, name, image)
+    return name
+
+
+def replace_with_sanitized(model_label, pk, field_name, name, image, image_format):
+    """
+    Stores the upright, metadata-free copy of a picture and points the row at
+    it. Returns the new name, or None if the row moved on to another file.
+    """
+    model = apps.get_model(model_label)
+    storage = model._meta.get_field(field_name).storage
+
+    image_format = image_format if image_format in SANITIZED_FORMATS else 'JPEG'
+    buffer = BytesIO()
+    save_image(image, buffer, image_format, quality=90)
+    with transaction.atomic():
+        new_name = storage.save(name, ContentFile(buffer.getvalue()))
+
+        # Only swap if the row still shows the file we processed
+        updated = model.objects.filter(pk=pk, **{field_name: name}).update(**{field_name: new_name})
+        if not updated:
+            storage.delete(new_name)
+            return None
+        if new_name != name:
+            storage.delete(name)
+        return new_name
+
+
+def write_variants(storage, name, image):
+    pending = []
+    for variant, (size, crop) in IMAGE_VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+        for extension, image_format in VARIANT_FORMATS:
+            pending.append(((variant, extension), resized, image_format))
+
+    pending.sort(key=lambda item: item[0] == MARKER_VARIANT)
+    for (variant, extension), resized, image_format in pending:
+        write_file(storage, variant_name(name, variant, extension), resized, image_format)
+
+
+def write_file(storage, target, image, image_format):
+    buffer = BytesIO()
+    save_image(image, buffer, image_format, quality=80)
+    # Variants are named after their original and regenerated in place
+    storage.save_derived(target, ContentFile(buffer.getvalue()))
+
+
+def save_image(image, buffer, image_format, quality):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    options = {'optimize': True} if image_format == 'PNG' else {'quality': quality}
+    image.save(buffer, format=image_format, **options)
@@ -0,0 +1,165 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .storage import is_blob
+
+# Serves MEDIA_URL from MEDIA_ROOT in every environment (replacing
+# django.conf.urls.static, which only works with DEBUG on and sends no cache
+# headers). settings.MEDIA_SERVE_MODE picks who sends the bytes:
+#
+#   'django'           streamed from here, through the server's sendfile
+#                      (wsgi.file_wrapper) for whole files; answers
+#                      If-None-Match / If-Modified-Since with 304 and
+#                      single-range requests with 206
+#   'x-sendfile'       Apache/lighttpd send the file named in X-Sendfile
+#   'x-accel-redirect' nginx sends the file found under
+#                      MEDIA_ACCEL_REDIRECT_PREFIX (an `internal` location
+#                      aliased to MEDIA_ROOT)
+#
+# Blobs (hairmatch/storage.py) never change content, so they are cached for a
+# year and marked immutable. Other files, including the variants regenerated
+# under a blob's name, get MEDIA_CACHE_SECONDS and an ETag built from their
+# mtime and size.
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag, cache_control = cache_validators(path, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        for header, value in headers.items():
+            conditional[header] = value
+        return conditional
+
+    mode = settings.MEDIA_SERVE_MODE
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    elif mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(path)
+    else:
+        response = file_response(request, full_path, stat.st_size, content_type, etag, stat.st_mtime)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def cache_validators(path, stat):
+    """
+    Returns the (ETag, Cache-Control) pair of a media file.
+    """
+    if is_blob(path):
+        return f'"{os.path.basename(path)}"', IMMUTABLE_CACHE_CONTROL
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"', f'public, max-age={settings.MEDIA_CACHE_SECONDS}'
+
+
+def file_response(request, full_path, size, content_type, etag, mtime):
+    header = request.headers.get('Range')
+    if header and if_range_matches(request.headers.get('If-Range'), etag, mtime):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(full_path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(end - start + 1)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            return response
+
+    return FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+
+def if_range_matches(if_range, etag, mtime):
+    """
+    True when a Range may be honoured: no If-Range, or one naming the current
+    (strong) ETag or modification date.
+    """
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def parse_range(header, size):
+    """
+    Returns the inclusive (start, end) of a single-range Range header, or None
+    to send the whole file (multiple ranges, malformed headers). Raises
+    RangeNotSatisfiable when the range lies past the end of the file.
+    """
+    match = RANGE_HEADER.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # "bytes=-500": the last 500 bytes
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    end = int(end) if end else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def read_range(full_path, start, length):
+    with open(full_path, 'rb') as media_file:
+        media_file.seek(start)
+        while length > 0:
+            chunk = media_file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
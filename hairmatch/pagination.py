@@ -0,0 +1,147 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+# Keyset (cursor) pagination shared by the list endpoints.
+#
+# A page is read as "the next page_size rows after this key" in a fixed ordering
+# that ends with a unique column, so deep pages cost the same as the first one
+# (no OFFSET) and rows inserted meanwhile never shift or repeat a page. The key
+# of the last row travels to the client as an opaque base64 cursor.
+#
+# Response bodies keep their shape. The cursor of the next page, when there is
+# one, is sent in the X-Next-Cursor header together with a Link rel="next" URL;
+# clients pass it back as ?cursor=. ?page_size= picks the page size, capped at
+# PAGINATION_MAX_PAGE_SIZE.
+#
+# Endpoints that returned every row before they were paginated keep doing so
+# (paged_by_default=False) until a client asks for a page with ?page_size= or
+# ?cursor=, so clients that don't read X-Next-Cursor never lose rows.
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder cuts datetimes to milliseconds; a key must round-trip exactly
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    payload = json.dumps(list(values), cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def wants_page(request):
+    """
+    True when the request asks for a page rather than the whole list.
+    """
+    return 'cursor' in request.GET or 'page_size' in request.GET
+
+
+def page_params(request):
+    """
+    Returns (cursor values or None, page size) from the query string.
+    """
+    try:
+        page_size = int(request.GET.get('page_size', settings.PAGINATION_DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidCursor("'page_size' must be an integer")
+    page_size = max(1, min(page_size, settings.PAGINATION_MAX_PAGE_SIZE))
+
+    cursor = request.GET.get('cursor')
+    return (decode_cursor(cursor) if cursor else None), page_size
+
+
+def keyset_page(queryset, after, page_size, ordering=None):
+    """
+    Returns (rows, key of the last row or None when nothing follows). The
+    ordering defaults to the queryset's own and must end with a unique field.
+    """
+    ordering = tuple(ordering or queryset.query.order_by or ('id',))
+    queryset = queryset.order_by(*ordering)
+    if after and len(after) != len(ordering):
+        raise InvalidCursor('Invalid cursor')
+
+    try:
+        if after:
+            queryset = queryset.filter(after_key(ordering, after))
+        rows = list(queryset[:page_size + 1])
+    except (ValueError, TypeError, ValidationError):
+        raise InvalidCursor('Invalid cursor')
+
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, [row_value(rows[-1], field.lstrip('-')) for field in ordering]
+
+
+def after_key(ordering, values):
+    """
+    Builds the filter for "sorts after `values`": (a > x) or (a = x and b > y)...
+    """
+    condition = Q()
+    for position, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            step &= Q(**{previous.lstrip('-'): value})
+        condition |= step
+    return condition
+
+
+def row_value(row, path):
+    for attribute in path.split('__'):
+        row = getattr(row, attribute)
+    # Ordering by a foreign key orders by the related primary key
+    return row.pk if hasattr(row, '_meta') else row
+
+
+def paginate(request, queryset, ordering=None, paged_by_default=True):
+    """
+    Reads the page requested by ?cursor=/&page_size= from the queryset. Returns
+    (rows, next cursor values or None); raises InvalidCursor on bad parameters.
+    With paged_by_default=False, a request for neither gets every row.
+    """
+    if not paged_by_default and not wants_page(request):
+        return list(queryset.order_by(*(ordering or queryset.query.order_by or ('id',)))), None
+    after, page_size = page_params(request)
+    return keyset_page(queryset, after, page_size, ordering)
+
+
+def set_next_cursor(response, request, next_values):
+    """
+    Advertises the next page on the response, if there is one.
+    """
+    if next_values is None:
+        return response
+    cursor = encode_cursor(next_values)
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    response[NEXT_CURSOR_HEADER] = cursor
+    response['Link'] = f'<{request.build_absolute_uri(request.path)}?{query.urlencode()}>; rel="next"'
+    return response
@@ -36,6 +36,78 @@ EVOLUTION_API_URL=os.getenv('EVOLUTION_API_URL')
 EVOLUTION_API_KEY=os.getenv('EVOLUTION_API_KEY')
 EVOLUTION_INSTANCE_NAME=os.getenv('EVOLUTION_INSTANCE_NAME')
 
+# Per-process slot cache (reserve/slot_cache.py): max (hairdresser, date, duration)
+# entries and how many seconds one may be served before it is recomputed.
+SLOT_CACHE_SIZE = int(os.getenv('SLOT_CACHE_SIZE', '4096'))
+SLOT_CACHE_TTL = int(os.getenv('SLOT_CACHE_TTL', '60'))
+
+# Per-process cache of authenticated users (users/identity_cache.py): max
+# (user, token) entries and how many seconds one may be served.
+IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', '2048'))
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', '30'))
+
+# Password hashing (users/passwords.py): bcrypt cost factor, size of the hashing
+# thread pool, how many calls may wait for it and how long a caller waits (seconds).
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASHER_WORKERS = int(os.getenv('PASSWORD_HASHER_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASHER_MAX_PENDING = int(os.getenv('PASSWORD_HASHER_MAX_PENDING', '64'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+# Login throttling (users/throttling.py): token bucket size and refill rate per
+# client IP and per email, and how many buckets each process keeps.
+LOGIN_THROTTLE_IP_BURST = int(os.getenv('LOGIN_THROTTLE_IP_BURST', '20'))
+LOGIN_THROTTLE_IP_PER_MINUTE = float(os.getenv('LOGIN_THROTTLE_IP_PER_MINUTE', '10'))
+LOGIN_THROTTLE_EMAIL_BURST = int(os.getenv('LOGIN_THROTTLE_EMAIL_BURST', '5'))
+LOGIN_THROTTLE_EMAIL_PER_MINUTE = float(os.getenv('LOGIN_THROTTLE_EMAIL_PER_MINUTE', '2'))
+LOGIN_THROTTLE_MAX_KEYS = int(os.getenv('LOGIN_THROTTLE_MAX_KEYS', '100000'))
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+
+# In-memory search index (users/search_index.py): off by default. How often each
+# process rebuilds it to pick up other workers' writes (seconds).
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'False').lower() in ('true', '1')
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', '300'))
+
+# Search box suggestions (users/autocomplete.py): seconds before each process
+# rebuilds its prefix array, and the default and maximum suggestions per request.
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '300'))
+AUTOCOMPLETE_DEFAULT_LIMIT = int(os.getenv('AUTOCOMPLETE_DEFAULT_LIMIT', '8'))
+AUTOCOMPLETE_MAX_LIMIT = int(os.getenv('AUTOCOMPLETE_MAX_LIMIT', '20'))
+
+# Seconds before each process rebuilds the home page category rails
+# (users/home_feed.py) even if no local write marked them dirty.
+HOME_FEED_REFRESH_SECONDS = int(os.getenv('HOME_FEED_REFRESH_SECONDS', '300'))
+
+# "for_you" ranking of the home page (users/ranking.py): how many hairdressers
+# it returns, and seconds before each process rebuilds its preference postings.
+FOR_YOU_LIMIT = int(os.getenv('FOR_YOU_LIMIT', '20'))
+RANKING_REFRESH_SECONDS = int(os.getenv('RANKING_REFRESH_SECONDS', '300'))
+
+# Cursor pagination of list endpoints (hairmatch/pagination.py): rows per page
+# when ?page_size= is not given, and the largest page a client may ask for.
+PAGINATION_DEFAULT_PAGE_SIZE = int(os.getenv('PAGINATION_DEFAULT_PAGE_SIZE', '50'))
+PAGINATION_MAX_PAGE_SIZE = int(os.getenv('PAGINATION_MAX_PAGE_SIZE', '200'))
+
+# Threads per process generating picture variants (hairmatch/images.py); 0
+# generates them inline when the upload commits.
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', '2'))
+
+# Who sends media bytes (hairmatch/media.py): 'django', 'x-sendfile' or
+# 'x-accel-redirect'; the internal nginx location for the latter; and the
+# max-age of media whose name is not a content hash (seconds).
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_CACHE_SECONDS = int(os.getenv('MEDIA_CACHE_SECONDS', '3600'))
+
+# WhatsApp conversation store (chatbot/conversations.py): 'database' or
+# 'cache', the CACHES alias used by the latter (it must be shared, e.g. Redis,
+# for workers to see each other's conversations), seconds of inactivity before
+# a conversation is forgotten, and chat messages kept per conversation.
+CHATBOT_CONVERSATION_BACKEND = os.getenv('CHATBOT_CONVERSATION_BACKEND', 'database')
+CHATBOT_CONVERSATION_CACHE = os.getenv('CHATBOT_CONVERSATION_CACHE', 'default')
+CHATBOT_CONVERSATION_TTL_SECONDS = int(os.getenv('CHATBOT_CONVERSATION_TTL_SECONDS', '86400'))
+CHATBOT_HISTORY_MAX_MESSAGES = int(os.getenv('CHATBOT_HISTORY_MAX_MESSAGES', '20'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -64,6 +136,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.authentication.JWTAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -142,6 +215,12 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploads are stored once per distinct content (hairmatch/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'hairmatch.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -161,6 +240,8 @@ CORS_ALLOWED_ORIGINS = allowed_origins_list
 CSRF_TRUSTED_ORIGINS = allowed_origins_list
 
 CORS_ALLOW_CREDENTIALS=True
+# Lets the frontend read the next page cursor of paginated lists
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor', 'Link']
 AUTH_USER_MODEL = 'users.User'
 
 CORS_ALLOW_METHODS = [
@@ -0,0 +1,160 @@
+import glob
+import hashlib
+import os
+import re
+
+from django.apps import apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.db import connection, models, transaction
+
+# Default storage for uploaded media (settings.STORAGES). Each upload is stored
+# under the SHA-256 of its content, in the directory its field uploads to:
+#
+#   profile_pics/placeholder.jpg -> profile_pics/9f86d08...0a08.jpg
+#
+# Uploading the same bytes again (the same placeholder for every generated
+# hairdresser, a re-sent profile picture) reuses the stored blob, and since a
+# name always holds the same bytes, its URL can be cached forever.
+#
+# One blob can back many rows, so delete() only removes it once no FileField
+# of any model still refers to it. On Postgres, reusing a blob and deleting it
+# take a per-digest advisory lock, so a delete waits for an upload of the same
+# bytes until the row referring to it is committed. Names derived from a blob
+# (the variants in hairmatch/images.py, e.g. <digest>.thumb.webp) belong to
+# that blob alone: save_derived() writes them under the name given and
+# delete() removes them directly.
+#
+# Upload names come from clients, so save() hashes every file it is given,
+# even one already called <64 hex>.jpg; only the digest of the bytes names a blob.
+
+CONTENT_ADDRESSED_NAME = re.compile(r'^[0-9a-f]{64}(\.|$)')
+BLOB_NAME = re.compile(r'^[0-9a-f]{64}(\.[^.]*)?$')
+# First key of the two-key advisory lock, so blob locks never collide with other lock users
+BLOB_LOCK_NAMESPACE = 4211
+
+
+def is_content_addressed(name):
+    """
+    True for blob names and names derived from them, whose content never changes.
+    """
+    return bool(CONTENT_ADDRESSED_NAME.match(os.path.basename(name)))
+
+
+def is_blob(name):
+    """
+    True for the stored uploads themselves, as opposed to names derived from them.
+    """
+    return bool(BLOB_NAME.match(os.path.basename(name)))
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def addressed_name(name, digest):
+    directory, basename = os.path.split(name)
+    _, extension = os.path.splitext(basename)
+    return os.path.join(directory, digest + extension.lower())
+
+
+def lock_blob(name, shared=False):
+    """
+    Serialises deleting a blob against reusing it, across every worker, until
+    the surrounding transaction ends. Reusers take the lock shared.
+    """
+    if connection.vendor == 'postgresql':
+        # The second key is an int4: the first 32 bits of the digest, signed
+        key = int(os.path.basename(name)[:8], 16) - 2 ** 31
+        function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT {function}(%s, %s)', [BLOB_LOCK_NAMESPACE, key])
+
+
+def file_references(name):
+    """
+    Counts the rows whose file fields hold the given name.
+    """
+    count = 0
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                count += model._default_manager.filter(**{field.name: name}).count()
+    return count
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        """
+        Stores content under its digest, or reuses the blob already there. Call
+        it inside the transaction that writes the name to its row, so the blob
+        can't be deleted before that row is committed.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        name = addressed_name(name, content_digest(content))
+        lock_blob(name, shared=True)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_derived(self, name, content):
+        """
+        Writes a file derived from a stored upload (an image variant) in place,
+        replacing the previous version. Blob names are refused: their content is
+        only ever written by save(), from bytes that hash to the name.
+        """
+        if is_blob(name):
+            raise SuspiciousFileOperation(f'Refusing to overwrite the blob {name}')
+        validate_file_name(name, allow_relative_path=True)
+        return self._replace(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # Blobs are (re)written in place by _save()
+        if is_blob(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not is_blob(name):
+            return super()._save(name, content)
+        return self._replace(name, content)
+
+    def _replace(self, name, content):
+        # Write beside the target and rename over it, so concurrent writers of
+        # one blob, or a regenerated variant, never expose a partial file
+        directory, basename = os.path.split(name)
+        temporary = super()._save(os.path.join(directory, f'.{basename}.tmp'), content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def delete(self, name):
+        """
+        Deletes a file once no row refers to it; a blob goes with the files
+        derived from it. Call it after the row has moved off the name.
+        """
+        if name and is_content_addressed(name) and not is_blob(name):
+            # Derived names are never stored on a row
+            return super().delete(name)
+
+        with transaction.atomic():
+            if name and is_blob(name):
+                lock_blob(name)
+            if name and file_references(name) > 0:
+                return
+            super().delete(name)
+            if name and is_blob(name):
+                root, _ = os.path.splitext(self.path(name))
+                for derived in glob.glob(glob.escape(root) + '.*.*'):
+                    try:
+                        os.remove(derived)
+                    except FileNotFoundError:
+                        pass
@@ -1,11 +1,26 @@
 # Create your tests here.
 # hairmatch/ai_clients/tests/test_gemini_client.py
+from io import BytesIO, StringIO
+import os
+import shutil
+import tempfile
 from unittest.mock import patch, MagicMock
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase, override_settings
+from PIL import Image
 from django.http import JsonResponse
 
 from users.models import Hairdresser, User
 from preferences.models import Preferences
+from preferences.serializers import PreferencesSerializer
+from hairmatch.images import variant_name
+from hairmatch.storage import is_content_addressed
+from hairmatch.media import IMMUTABLE_CACHE_CONTROL
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from hairmatch.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
 from hairmatch.ai_clients.gemini_client import (
     setup_environment,
     load_hairdresser_data,
@@ -146,3 +161,290 @@ class GeminiClientTest(TestCase):
         response = hairdresser_profile_ai_completion({'preferences': []})
         self.assertEqual(response.status_code, 500)
 
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        for name in ['Cachos', 'Barbearia', 'Cachos', 'Tranças', 'Barbearia']:
+            Preferences.objects.create(name=name)
+
+    def _read_all(self, ordering, page_size):
+        rows, after = [], None
+        while True:
+            page, after = keyset_page(Preferences.objects.all(), after, page_size, ordering)
+            rows.extend(page)
+            if after is None:
+                return rows
+            after = decode_cursor(encode_cursor(after))
+
+    def test_pages_cover_the_ordering_once(self):
+        for ordering in [('id',), ('name', 'id'), ('-name', 'id'), ('-name', '-id')]:
+            expected = list(Preferences.objects.order_by(*ordering))
+            for page_size in (1, 2, 5):
+                self.assertEqual(self._read_all(ordering, page_size), expected, (ordering, page_size))
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(['Tranças', 3])), ['Tranças', 3])
+
+    def test_invalid_cursors(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('%%%')
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(encode_cursor([1])[:-1] + '{')
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Preferences.objects.all(), [1, 2], 2, ('id',))
+        with self.assertRaises(InvalidCursor):
+            keyset_page(Preferences.objects.all(), ['abc'], 2, ('id',))
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _photo(self, orientation=None):
+        # 300x200 JPEG; orientation 6 means "rotate 90 degrees to display"
+        image = Image.new('RGB', (300, 200), 'red')
+        options = {}
+        if orientation:
+            exif = Image.Exif()
+            exif[0x0112] = orientation
+            exif[0x010F] = 'PhoneMaker'
+            options['exif'] = exif.tobytes()
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', **options)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _open(self, field_file):
+        with field_file.storage.open(field_file.name) as stored:
+            image = Image.open(stored)
+            image.load()
+        return image
+
+    def test_upload_is_sanitized_and_gets_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            preference = Preferences.objects.create(name='Cachos', picture=self._photo(orientation=6))
+        preference.refresh_from_db()
+
+        original = self._open(preference.picture)
+        self.assertEqual(original.size, (200, 300))
+        self.assertFalse(original.getexif())
+
+        variants = PreferencesSerializer(preference).data['picture_variants']
+        self.assertEqual(set(variants), {'thumb_jpg', 'thumb_webp', 'card_jpg', 'card_webp'})
+        storage = preference.picture.storage
+        with storage.open(variant_name(preference.picture.name, 'thumb', 'webp')) as stored:
+            thumb = Image.open(stored)
+            self.assertEqual((thumb.format, thumb.size), ('WEBP', (160, 160)))
+        with storage.open(variant_name(preference.picture.name, 'card', 'jpg')) as stored:
+            self.assertEqual(Image.open(stored).size, (200, 300))
+
+    def test_variants_are_empty_until_generated(self):
+        preference = Preferences.objects.create(name='Cachos', picture=self._photo())
+        self.assertEqual(PreferencesSerializer(preference).data['picture_variants'], {})
+        self.assertIsNone(PreferencesSerializer(Preferences.objects.create(name='Tranças')).data['picture_variants'])
+
+        out = StringIO()
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Processed 1 pictures, 0 already done, 0 failed.', out.getvalue())
+        self.assertEqual(len(PreferencesSerializer(preference).data['picture_variants']), 4)
+
+        call_command('generate_image_variants', stdout=out)
+        self.assertIn('Processed 0 pictures, 1 already done, 0 failed.', out.getvalue())
+
+    def test_unreadable_upload_is_skipped(self):
+        upload = SimpleUploadedFile('photo.jpg', b'not an image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            preference = Preferences.objects.create(name='Cachos', picture=upload)
+        self.assertEqual(PreferencesSerializer(preference).data['picture_variants'], {})
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    def _upload(self, content=b'same bytes', name='Photo.JPG'):
+        return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+    def _stored_files(self):
+        return sorted(default_storage.listdir('preferences_pictures')[1])
+
+    def test_identical_uploads_share_one_blob(self):
+        first = Preferences.objects.create(name='Cachos', picture=self._upload())
+        second = Preferences.objects.create(name='Tranças', picture=self._upload(name='other.jpg'))
+        third = Preferences.objects.create(name='Barbearia', picture=self._upload(b'other bytes'))
+
+        self.assertEqual(first.picture.name, second.picture.name)
+        self.assertNotEqual(first.picture.name, third.picture.name)
+        self.assertTrue(is_content_addressed(first.picture.name))
+        self.assertTrue(first.picture.name.endswith('.jpg'))
+        self.assertEqual(len(self._stored_files()), 2)
+        with default_storage.open(second.picture.name) as stored:
+            self.assertEqual(stored.read(), b'same bytes')
+
+    def test_delete_waits_for_the_last_reference(self):
+        first = Preferences.objects.create(name='Cachos', picture=self._upload())
+        second = Preferences.objects.create(name='Tranças', picture=self._upload())
+        name = first.picture.name
+        derived = variant_name(name, 'thumb', 'webp')
+        default_storage.save_derived(derived, ContentFile(b'thumb'))
+
+        Preferences.objects.filter(pk=first.pk).update(picture='')
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+
+        second.delete()
+        default_storage.delete(name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(derived))
+
+    def test_derived_names_are_rewritten_in_place(self):
+        name = variant_name(Preferences.objects.create(name='Cachos', picture=self._upload()).picture.name, 'card', 'jpg')
+        self.assertEqual(default_storage.save_derived(name, ContentFile(b'v1')), name)
+        self.assertEqual(default_storage.save_derived(name, ContentFile(b'v2')), name)
+        with default_storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'v2')
+
+    def test_upload_named_after_a_digest_is_hashed(self):
+        original = Preferences.objects.create(name='Cachos', picture=self._upload(b'original')).picture.name
+        upload = self._upload(b'attacker bytes', name=os.path.basename(original))
+        other = Preferences.objects.create(name='Tranças', picture=upload).picture.name
+
+        self.assertNotEqual(other, original)
+        with default_storage.open(original) as stored:
+            self.assertEqual(stored.read(), b'original')
+        with default_storage.open(other) as stored:
+            self.assertEqual(stored.read(), b'attacker bytes')
+        with self.assertRaises(SuspiciousFileOperation):
+            default_storage.save_derived(original, ContentFile(b'attacker bytes'))
+
+    def test_derived_names_skip_reference_counting(self):
+        name = Preferences.objects.create(name='Cachos', picture=self._upload()).picture.name
+        derived = variant_name(name, 'thumb', 'webp')
+        with self.assertNumQueries(0):
+            default_storage.save_derived(derived, ContentFile(b'thumb'))
+            default_storage.delete(derived)
+        self.assertFalse(default_storage.exists(derived))
+        self.assertTrue(default_storage.exists(name))
+
+    @patch('hairmatch.storage.connection')
+    def test_reuse_and_delete_take_the_blob_lock_on_postgres(self, connection):
+        connection.vendor = 'postgresql'
+        cursor = connection.cursor.return_value.__enter__.return_value
+        name = default_storage.save('preferences_pictures/photo.jpg', ContentFile(b'same bytes'))
+        default_storage.save('preferences_pictures/again.jpg', ContentFile(b'same bytes'))
+        default_storage.delete(name)
+
+        functions = [call.args[0].split('(')[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(functions, ['SELECT pg_advisory_xact_lock_shared'] * 2 + ['SELECT pg_advisory_xact_lock'])
+        self.assertEqual({call.args[1][1] for call in cursor.execute.call_args_list}, {int(name.split('/')[1][:8], 16) - 2 ** 31})
+        self.assertFalse(default_storage.exists(name))
+
+    def test_deduplicate_media_merges_existing_copies(self):
+        plain = FileSystemStorage(location=self.media_root)
+        names = [plain.save('preferences_pictures/placeholder.jpg', ContentFile(b'placeholder')) for _ in range(2)]
+        self.assertNotEqual(names[0], names[1])
+        preferences = [Preferences.objects.create(name=f'P{i}', picture=name) for i, name in enumerate(names)]
+
+        out = StringIO()
+        call_command('deduplicate_media', stdout=out)
+        self.assertIn('Re-stored 2 files, 0 missing from storage.', out.getvalue())
+
+        stored_names = {Preferences.objects.get(pk=p.pk).picture.name for p in preferences}
+        self.assertEqual(len(stored_names), 1)
+        self.assertTrue(is_content_addressed(stored_names.pop()))
+        self.assertEqual(len(self._stored_files()), 1)
+
+
+@override_settings(MEDIA_SERVE_MODE='django', MEDIA_CACHE_SECONDS=60)
+class ServeMediaTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.content = bytes(range(256)) * 4
+        self.hashed = default_storage.save('profile_pics/photo.jpg', ContentFile(self.content))
+        self.plain = FileSystemStorage(location=self.media_root).save('legacy/photo.png', ContentFile(self.content))
+
+    def _get(self, name, **headers):
+        return self.client.get(f'/media/{name}', headers=headers)
+
+    def _body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_hashed_names_are_immutable(self):
+        response = self._get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._body(response), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        plain = self._get(self.plain)
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=60')
+        self.assertTrue(plain['ETag'].startswith('W/'))
+
+    def test_variants_are_revalidated(self):
+        variant = default_storage.save_derived(variant_name(self.hashed, 'thumb', 'webp'), ContentFile(b'thumb'))
+        response = self._get(variant)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+    def test_if_none_match_returns_304(self):
+        for name in (self.hashed, self.plain):
+            etag = self._get(name)['ETag']
+            response = self._get(name, if_none_match=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(response.content, b'')
+
+    def test_ranges(self):
+        response = self._get(self.hashed, range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self._body(response), self.content[10:20])
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+
+        self.assertEqual(self._body(self._get(self.hashed, range='bytes=-6')), self.content[-6:])
+        self.assertEqual(self._body(self._get(self.hashed, range='bytes=1020-')), self.content[1020:])
+        # Multiple ranges are answered with the whole file
+        self.assertEqual(self._get(self.hashed, range='bytes=0-1,4-5').status_code, 200)
+
+        unsatisfiable = self._get(self.hashed, range='bytes=5000-')
+        self.assertEqual(unsatisfiable.status_code, 416)
+        self.assertEqual(unsatisfiable['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range_mismatch_sends_the_whole_file(self):
+        etag = self._get(self.hashed)['ETag']
+        self.assertEqual(self._get(self.hashed, range='bytes=0-9', if_range=etag).status_code, 206)
+        self.assertEqual(self._get(self.hashed, range='bytes=0-9', if_range='"other"').status_code, 200)
+
+    def test_missing_and_escaping_paths_are_404(self):
+        self.assertEqual(self._get('profile_pics/missing.jpg').status_code, 404)
+        self.assertEqual(self._get('../settings.py').status_code, 404)
+        self.assertEqual(self._get('profile_pics').status_code, 404)
+        self.assertEqual(self.client.post(f'/media/{self.hashed}').status_code, 405)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_x_accel_redirect_hands_off_to_nginx(self):
+        response = self._get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.hashed}')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SERVE_MODE='x-sendfile')
+    def test_x_sendfile_hands_off_to_the_server(self):
+        response = self._get(self.hashed)
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, self.hashed))
+        self.assertEqual(response.content, b'')
@@ -1,10 +1,12 @@
 from rest_framework import serializers
+from hairmatch.images import ImageVariantsField
 from .models import Preferences
 
 class PreferencesSerializer(serializers.ModelSerializer):
+    picture_variants = ImageVariantsField(source='picture')
     class Meta:
         model = Preferences
-        fields = ['id', 'name', 'picture']
+        fields = ['id', 'name', 'picture', 'picture_variants']
 
 class PreferencesNameSerializer(serializers.ModelSerializer):
     class Meta:
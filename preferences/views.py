@@ -6,7 +6,9 @@ from users.models import User
 from users.serializers import UserNameSerializer
 from .serializers import PreferencesSerializer
 from django.http import JsonResponse
-import jwt, json
+import json
+from users.authentication import get_authenticated_user, token_error_response
+from hairmatch.pagination import paginate, set_next_cursor
 
 # Create your views here.
 class CreatePreferences(APIView):
@@ -24,17 +26,11 @@ class CreatePreferences(APIView):
         
 class AssignPreferenceToUser(APIView):
     def post(self, request, preference_id):
-        token = request.COOKIES.get('jwt')
-
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
-
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
+        error = token_error_response(request)
+        if error:
+            return error
         try:
-            user = User.objects.filter(id=payload['id']).first()
+            user = get_authenticated_user(request)
 
             if not user:
                 return JsonResponse({'error': 'User not found'}, status=404)
@@ -74,16 +70,11 @@ class AssignPreferenceToUserNoCookie(APIView):
         
 class UnnassignPreferenceFromUser(APIView):
     def post(self, request, preference_id):
-        token = request.COOKIES.get('jwt')
-
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
+        error = token_error_response(request)
+        if error:
+            return error
         try:
-            user = User.objects.filter(id=payload['id']).first()
+            user = get_authenticated_user(request)
 
             if not user:
                 return JsonResponse({'error': 'User not found'}, status=404)
@@ -113,9 +104,9 @@ class ListPreferences(APIView):
 class ListAllPreferences(APIView):
     def get(self, request):
         try:
-            preferences = Preferences.objects.all()
+            preferences, next_cursor = paginate(request, Preferences.objects.order_by('id'), paged_by_default=False)
             serializer = PreferencesSerializer(preferences, many=True)
-            return Response(serializer.data)
+            return set_next_cursor(Response(serializer.data), request, next_cursor)
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
@@ -125,9 +116,9 @@ class ListUsersPerPreference(APIView):
             preference = Preferences.objects.filter(id=preference_id).first()
             if not preference:
                 return JsonResponse({'error': 'Preference not found'}, status=404)
-            users = preference.users.all()
+            users, next_cursor = paginate(request, preference.users.order_by('id'), paged_by_default=False)
             serializer = UserNameSerializer(users, many=True)
-            return Response({'data':serializer.data},  status=200)
+            return set_next_cursor(Response({'data':serializer.data},  status=200), request, next_cursor)
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:09
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_end_time(apps, schema_editor):
+    Reserve = apps.get_model('reserve', 'Reserve')
+    reserves = Reserve.objects.filter(end_time__isnull=True, start_time__isnull=False).select_related('service')
+    batch = []
+    for reserve in reserves.iterator(chunk_size=1000):
+        reserve.end_time = reserve.start_time + timedelta(minutes=reserve.service.duration)
+        batch.append(reserve)
+        if len(batch) >= 1000:
+            Reserve.objects.bulk_update(batch, ['end_time'])
+            batch = []
+    if batch:
+        Reserve.objects.bulk_update(batch, ['end_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reserve', '0002_alter_reserve_start_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserve',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_end_time, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reserve',
+            index=models.Index(fields=['customer', 'start_time', 'end_time'], name='reserve_customer_time_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_reserves_to_agendas(apps, schema_editor):
+    # Reserves and their Agenda rows used to be matched on (service, start_time)
+    Reserve = apps.get_model('reserve', 'Reserve')
+    Agenda = apps.get_model('agenda', 'Agenda')
+
+    agenda_ids = {}
+    for agenda_id, service_id, start_time in Agenda.objects.order_by('id').values_list('id', 'service_id', 'start_time'):
+        agenda_ids.setdefault((service_id, start_time), []).append(agenda_id)
+
+    batch = []
+    for reserve in Reserve.objects.filter(agenda__isnull=True).order_by('id').iterator(chunk_size=1000):
+        candidates = agenda_ids.get((reserve.service_id, reserve.start_time))
+        if not candidates:
+            continue
+        reserve.agenda_id = candidates.pop(0)
+        batch.append(reserve)
+        if len(batch) >= 1000:
+            Reserve.objects.bulk_update(batch, ['agenda'])
+            batch = []
+    if batch:
+        Reserve.objects.bulk_update(batch, ['agenda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0002_agenda_no_overlap'),
+        ('reserve', '0003_reserve_end_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserve',
+            name='agenda',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reserve', to='agenda.agenda'),
+        ),
+        migrations.RunPython(link_reserves_to_agendas, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
 from django.utils import timezone
+from datetime import timedelta
 from review.models import Review
 from users.models import Customer
 from service.models import Service
+from agenda.models import Agenda
 
 # Create your models here.
 class Reserve(models.Model):
@@ -10,4 +12,17 @@ class Reserve(models.Model):
     review = models.OneToOneField(Review, on_delete=models.DO_NOTHING, null=True, blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, null=False, blank=False)
     service = models.ForeignKey(Service,on_delete=models.DO_NOTHING, null=False, blank=False)
-    #user = models.ForeignKey(User, related_name='reserves', null=False, blank=False)
\ No newline at end of file
+    end_time = models.DateTimeField(null=True, blank=True)
+    agenda = models.OneToOneField(Agenda, on_delete=models.SET_NULL, null=True, blank=True, related_name='reserve')
+    #user = models.ForeignKey(User, related_name='reserves', null=False, blank=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'start_time', 'end_time'], name='reserve_customer_time_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # end_time is derived from the service so customer clashes can be found with one range query
+        if self.end_time is None and self.start_time is not None:
+            self.end_time = self.start_time + timedelta(minutes=self.service.duration)
+        super().save(*args, **kwargs)
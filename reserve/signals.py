@@ -0,0 +1,83 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from agenda.models import Agenda
+from availability.models import Availability
+from reserve.slot_cache import slot_cache
+from reserve.slot_engine import WEEKDAYS, booking_days
+
+# Keeps reserve.slot_cache in sync with the rows slots are computed from.
+# Updates capture the previous values in pre_save, so moving a booking (or an
+# Availability row to another weekday) frees the old day as well as the new one.
+# Each invalidation runs again once the transaction commits, dropping anything
+# another request recomputed from the rows as they were before the commit.
+# QuerySet.update() bypasses signals; those writes are only picked up once the
+# cached entries expire.
+
+
+def agenda_days(agenda):
+    start_time, end_time = agenda.start_time, agenda.end_time
+    if timezone.is_naive(start_time):
+        start_time = timezone.make_aware(start_time)
+    if timezone.is_naive(end_time):
+        end_time = timezone.make_aware(end_time)
+    return booking_days(start_time, end_time)
+
+
+def availability_weekdays(weekday):
+    weekday = (weekday or '').lower()
+    return [WEEKDAYS.index(weekday)] if weekday in WEEKDAYS else []
+
+
+@receiver(pre_save, sender=Agenda)
+def remember_previous_agenda(sender, instance, **kwargs):
+    instance._previous_slot_span = None
+    if instance.pk:
+        instance._previous_slot_span = Agenda.objects.filter(pk=instance.pk).values_list(
+            'hairdresser_id', 'start_time', 'end_time'
+        ).first()
+
+
+@receiver(post_save, sender=Agenda)
+@receiver(post_delete, sender=Agenda)
+def invalidate_agenda_slots(sender, instance, **kwargs):
+    spans = [(instance.hairdresser_id, agenda_days(instance))]
+    previous = getattr(instance, '_previous_slot_span', None)
+    if previous:
+        hairdresser_id, start_time, end_time = previous
+        spans.append((hairdresser_id, booking_days(start_time, end_time)))
+
+    def invalidate():
+        for hairdresser_id, days in spans:
+            slot_cache.invalidate_days(hairdresser_id, days)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(pre_save, sender=Availability)
+def remember_previous_availability(sender, instance, **kwargs):
+    instance._previous_slot_weekday = None
+    if instance.pk:
+        instance._previous_slot_weekday = Availability.objects.filter(pk=instance.pk).values_list(
+            'hairdresser_id', 'weekday'
+        ).first()
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def invalidate_availability_slots(sender, instance, **kwargs):
+    spans = [(instance.hairdresser_id, availability_weekdays(instance.weekday))]
+    previous = getattr(instance, '_previous_slot_weekday', None)
+    if previous:
+        hairdresser_id, weekday = previous
+        spans.append((hairdresser_id, availability_weekdays(weekday)))
+
+    def invalidate():
+        for hairdresser_id, weekdays in spans:
+            slot_cache.invalidate_weekdays(hairdresser_id, weekdays)
+
+    invalidate()
+    transaction.on_commit(invalidate)
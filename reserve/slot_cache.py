@@ -0,0 +1,138 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+
+# Caches the feasible slot starts of one (hairdresser, date, service duration).
+# Entries hold the raw starts of the whole day, before the "not in the past"
+# filter, so they stay valid for the entire day and can be shared by every
+# caller. Writes to Agenda and Availability invalidate the affected days through
+# the signal handlers in reserve/signals.py; the TTL bounds how long another
+# worker process can serve a day changed elsewhere, and booking always re-checks
+# the overlap under the hairdresser lock, so a stale slot ends in a 409 at worst.
+
+
+class SlotCache:
+    """
+    Thread-safe LRU cache of slot start minutes keyed by (hairdresser_id, date, duration).
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # hairdresser_id -> keys cached for it, so invalidation never scans the whole cache
+        self._keys_by_hairdresser = {}
+        # hairdresser_id -> invalidation counter, see generation()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, hairdresser_id, date, duration):
+        """
+        Returns the cached start minutes, or None on a miss or an expired entry.
+        """
+        key = (hairdresser_id, date, duration)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, hairdresser_id):
+        """
+        Returns the hairdresser's invalidation counter. Read it before loading the
+        rows a value is computed from and hand it to set(), so a value computed
+        while a write was being invalidated is never stored.
+        """
+        with self._lock:
+            return self._generations.get(hairdresser_id, 0)
+
+    def set(self, hairdresser_id, date, duration, minutes, generation=None):
+        if self.max_size <= 0:
+            return
+        key = (hairdresser_id, date, duration)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(hairdresser_id, 0):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(minutes))
+            self._entries.move_to_end(key)
+            self._keys_by_hairdresser.setdefault(hairdresser_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def invalidate_days(self, hairdresser_id, dates):
+        """
+        Drops every cached duration of the given days for a hairdresser.
+        """
+        dates = set(dates)
+        with self._lock:
+            self._bump_generation(hairdresser_id)
+            keys = [key for key in self._keys_by_hairdresser.get(hairdresser_id, ()) if key[1] in dates]
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+
+    def invalidate_weekdays(self, hairdresser_id, weekdays):
+        """
+        Drops every cached day of a hairdresser falling on one of the weekdays
+        (date.weekday() indexes), used when an Availability row changes.
+        """
+        weekdays = set(weekdays)
+        with self._lock:
+            self._bump_generation(hairdresser_id)
+            keys = [
+                key for key in self._keys_by_hairdresser.get(hairdresser_id, ())
+                if key[1].weekday() in weekdays
+            ]
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_hairdresser.clear()
+            self._generations.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _bump_generation(self, hairdresser_id):
+        # Caller must hold the lock
+        self._generations[hairdresser_id] = self._generations.get(hairdresser_id, 0) + 1
+
+    def _discard(self, key):
+        # Caller must hold the lock
+        self._entries.pop(key, None)
+        keys = self._keys_by_hairdresser.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_hairdresser[key[0]]
+
+
+slot_cache = SlotCache(settings.SLOT_CACHE_SIZE, settings.SLOT_CACHE_TTL)
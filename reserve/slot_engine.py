@@ -0,0 +1,183 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+import math
+from zoneinfo import ZoneInfo
+
+from django.utils import timezone
+
+# A hairdresser-day is compiled into a plain Python int used as a bitmap:
+# bit ``i`` is set when minute ``i`` (counted from local midnight) is free.
+# Python ints are arbitrary precision, so a 1440-bit day fits in one object
+# and every bitwise operation touches the whole day at once.
+
+LOCAL_TIMEZONE = ZoneInfo('America/Manaus')
+MINUTES_PER_DAY = 24 * 60
+SLOT_STEP_MINUTES = 30
+# Indexed by date.weekday(). Availability.weekday is matched against these
+# case-insensitively everywhere, so rows stored as 'Monday' work too
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+
+def local_day_bounds(date):
+    """
+    Returns the aware datetimes delimiting a calendar day in the salon's timezone.
+    """
+    day_start = datetime.combine(date, time.min).replace(tzinfo=LOCAL_TIMEZONE)
+    return day_start, day_start + timedelta(days=1)
+
+
+def minute_of_day(value, day_start, round_up=False):
+    """
+    Converts a datetime (or a time of day) into a minute offset from day_start,
+    clamped to the [0, MINUTES_PER_DAY] range.
+    """
+    if isinstance(value, time):
+        minutes = value.hour * 60 + value.minute + value.second / 60
+    else:
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        minutes = (value - day_start).total_seconds() / 60
+
+    minutes = math.ceil(minutes) if round_up else math.floor(minutes)
+    return max(0, min(MINUTES_PER_DAY, minutes))
+
+
+def window_mask(start_minute, end_minute):
+    """
+    Returns a bitmap with the bits in [start_minute, end_minute) set.
+    """
+    if end_minute <= start_minute:
+        return 0
+    return ((1 << (end_minute - start_minute)) - 1) << start_minute
+
+
+def compile_day(date, start_time, end_time, bookings=(), break_start=None, break_end=None):
+    """
+    Compiles an Availability window, its optional break and the day's bookings
+    into a free-minute bitmap.
+
+    Args:
+        date: The calendar day being compiled.
+        start_time: Opening time (datetime.time) of the Availability row.
+        end_time: Closing time (datetime.time) of the Availability row.
+        bookings: Iterable of (start, end) aware datetimes already booked.
+        break_start: Optional start of the hairdresser's break.
+        break_end: Optional end of the hairdresser's break.
+
+    Returns:
+        An int whose set bits are the free minutes of the day.
+    """
+    day_start, _ = local_day_bounds(date)
+
+    free = window_mask(
+        minute_of_day(start_time, day_start),
+        minute_of_day(end_time, day_start, round_up=True),
+    )
+    if break_start and break_end:
+        free &= ~window_mask(
+            minute_of_day(break_start, day_start),
+            minute_of_day(break_end, day_start, round_up=True),
+        )
+    for booking_start, booking_end in bookings:
+        free &= ~window_mask(
+            minute_of_day(booking_start, day_start),
+            minute_of_day(booking_end, day_start, round_up=True),
+        )
+    return free
+
+
+def feasible_starts(free_mask, duration):
+    """
+    Returns a bitmap where bit i is set when minutes [i, i + duration) are all free.
+
+    Uses a doubling sliding-window AND, so the cost is O(log duration) big-int
+    operations regardless of how many bookings were compiled into the mask.
+    """
+    duration = int(duration)
+    if duration <= 0:
+        return free_mask
+
+    starts = free_mask
+    span = 1
+    while span < duration:
+        shift = min(span, duration - span)
+        starts &= starts >> shift
+        span += shift
+    return starts
+
+
+def grid_starts(starts_mask, first_minute, step=SLOT_STEP_MINUTES, not_before=0):
+    """
+    Picks the set bits of starts_mask that fall on the slot grid anchored at
+    first_minute, skipping anything earlier than not_before.
+    """
+    minute = first_minute
+    if not_before > minute:
+        minute += math.ceil((not_before - minute) / step) * step
+
+    result = []
+    remaining = starts_mask >> minute
+    while remaining:
+        if remaining & 1:
+            result.append(minute)
+        remaining >>= step
+        minute += step
+    return result
+
+
+def day_slot_minutes(date, start_time, end_time, bookings, service_duration,
+                     break_start=None, break_end=None, now_dt=None):
+    """
+    Returns every feasible start (in minutes from local midnight) for a service
+    on the given day. If now_dt is provided, starts earlier than it are dropped.
+    """
+    day_start, _ = local_day_bounds(date)
+    free = compile_day(date, start_time, end_time, bookings, break_start, break_end)
+    starts = feasible_starts(free, service_duration)
+    not_before = minute_of_day(now_dt, day_start, round_up=True) if now_dt else 0
+    return grid_starts(starts, minute_of_day(start_time, day_start), not_before=not_before)
+
+
+def window_slot_minutes(free_mask, service_duration, grid_anchor, window_start, window_end):
+    """
+    Returns the feasible starts between window_start and window_end (inclusive):
+    the requested window_start itself when it is free, followed by the grid slots
+    after it.
+    """
+    starts = feasible_starts(free_mask, service_duration) & window_mask(window_start, window_end + 1)
+    minutes = grid_starts(starts, grid_anchor, not_before=window_start)
+    if starts >> window_start & 1 and window_start not in minutes:
+        minutes.insert(0, window_start)
+    return minutes
+
+
+def format_minute(minute):
+    """
+    Formats a minute offset as the 'HH:MM' label used by the slots API.
+    """
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def booking_days(booking_start, booking_end):
+    """
+    Returns every local calendar day a booking touches.
+    """
+    day = timezone.localtime(booking_start, LOCAL_TIMEZONE).date()
+    last_day = timezone.localtime(booking_end, LOCAL_TIMEZONE).date()
+    days = []
+    while day <= last_day:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def group_bookings_by_day(bookings):
+    """
+    Buckets (start, end) booking pairs under every local calendar day they touch,
+    so a multi-day range can be loaded once and compiled day by day in memory.
+    """
+    by_day = defaultdict(list)
+    for booking_start, booking_end in bookings:
+        for day in booking_days(booking_start, booking_end):
+            by_day[day].append((booking_start, booking_end))
+    return by_day
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -11,11 +11,15 @@ from service.models import Service
 from reserve.models import Reserve
 from agenda.models import Agenda
 from availability.models import Availability
+from reserve.slot_engine import local_day_bounds, window_mask, feasible_starts, day_slot_minutes, format_minute
+from reserve.slot_cache import SlotCache, slot_cache
 
 
 class ReserveTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
+        # Test rollbacks do not fire signals, so entries could outlive their rows
+        slot_cache.clear()
         
         # URLs
         self.create_url = reverse('create_reserve')
@@ -129,6 +133,8 @@ class CreateReserveTest(ReserveTestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Reserve.objects.count(), 2)  # 1 from setup + 1 new
         self.assertEqual(Agenda.objects.count(), 2)   # 1 from setup + 1 new
+        new_reserve = Reserve.objects.get(start_time=new_start_time)
+        self.assertEqual(new_reserve.agenda.start_time, new_start_time)
         
     def test_create_reserve_overlap_error(self):
         """Test reserve creation with an overlapping start time"""
@@ -149,6 +155,47 @@ class CreateReserveTest(ReserveTestCase):
         self.assertEqual(response.json()['error'], 'The hairdresser is not available during this time slot.')
         self.assertEqual(Reserve.objects.count(), 1)  # No new reserve created
         
+    def test_create_reserve_customer_overlap_error(self):
+        """Test a customer cannot hold two overlapping reserves with different hairdressers"""
+        other_user = User.objects.create(
+            email="other@example.com",
+            password="hairdresser123",
+            first_name="Other",
+            last_name="Hairdresser",
+            phone="+5592984503333",
+            neighborhood="Downtown",
+            city="Manaus",
+            state="AM",
+            address="Other Street",
+            postal_code="69050750",
+            role="hairdresser"
+        )
+        other_hairdresser = Hairdresser.objects.create(user=other_user, cnpj="12345678901213")
+        other_service = Service.objects.create(
+            name="Beard", price=30.00, duration=30, hairdresser=other_hairdresser
+        )
+
+        reserve_data = {
+            'start_time': (self.reserve_start_time + timedelta(minutes=30)).isoformat(),
+            'customer': self.customer.id,
+            'hairdresser': other_hairdresser.id,
+            'service': other_service.id
+        }
+
+        response = self.client.post(
+            self.create_url,
+            data=json.dumps(reserve_data),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.json()['error'], 'Você já tem outra reserva agendada para o mesmo horário')
+        self.assertEqual(Reserve.objects.count(), 1)
+
+    def test_reserve_end_time_is_derived(self):
+        """Test end_time is filled from the service duration when not given"""
+        self.assertEqual(self.reserve.end_time, self.reserve_start_time + timedelta(minutes=self.service.duration))
+
     def test_create_reserve_invalid_customer(self):
         """Test reserve creation with non-existent customer"""
         new_start_time = self.reserve_start_time + timedelta(hours=2)
@@ -230,6 +277,23 @@ class ListReserveTest(ReserveTestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    @override_settings(PAGINATION_DEFAULT_PAGE_SIZE=1)
+    def test_list_user_reserves_pages_are_opt_in(self):
+        """Test that clients without a cursor get every reserve and pages start with the latest"""
+        past = Reserve.objects.create(
+            start_time=self.reserve_start_time - timedelta(days=30), customer=self.customer, service=self.service
+        )
+        list_user_url = reverse('list_reserve', args=[self.customer.id])
+
+        response = self.client.get(list_user_url)
+        self.assertEqual([reserve['id'] for reserve in response.json()['data']], [past.id, self.reserve.id])
+        self.assertNotIn('X-Next-Cursor', response)
+
+        response = self.client.get(list_user_url, {'page_size': 1})
+        self.assertEqual([reserve['id'] for reserve in response.json()['data']], [self.reserve.id])
+        response = self.client.get(list_user_url, {'page_size': 1, 'cursor': response['X-Next-Cursor']})
+        self.assertEqual([reserve['id'] for reserve in response.json()['data']], [past.id])
+
 
 class RemoveReserveTest(ReserveTestCase):
     def test_remove_reserve_success(self):
@@ -344,4 +408,402 @@ class ReserveSlotTest(ReserveTestCase):
         )
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.json()['available_slots'], [])
\ No newline at end of file
+        self.assertEqual(response.json()['available_slots'], [])
+
+    def test_reserve_slot_view_uses_engine(self):
+        """ReserveSlot returns grid slots around the hairdresser's bookings"""
+        today = timezone.now().date()
+        next_monday = today + timedelta(days=7 - today.weekday())
+        day_start, _ = local_day_bounds(next_monday)
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=15, minutes=45),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        response = self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=json.dumps({'date': next_monday.strftime('%Y-%m-%d'), 'service': self.service.id}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['available_slots'], ['16:00'])
+
+
+class SlotEngineTest(TestCase):
+    def setUp(self):
+        self.date = datetime(2025, 7, 7).date()  # A Monday
+        self.day_start, _ = local_day_bounds(self.date)
+        self.opening = timezone.datetime.strptime("09:00", "%H:%M").time()
+        self.closing = timezone.datetime.strptime("17:00", "%H:%M").time()
+        self.break_start = timezone.datetime.strptime("12:00", "%H:%M").time()
+        self.break_end = timezone.datetime.strptime("13:00", "%H:%M").time()
+
+    def at(self, hour, minute=0):
+        return self.day_start + timedelta(hours=hour, minutes=minute)
+
+    def test_feasible_starts_requires_whole_window_free(self):
+        """A start is feasible only if every minute of the service is free"""
+        free = window_mask(10, 20) | window_mask(25, 40)
+        starts = feasible_starts(free, 5)
+
+        self.assertEqual(starts, window_mask(10, 16) | window_mask(25, 36))
+
+    def test_empty_day_slots(self):
+        """Slots follow the 30 minute grid and the service must end before closing"""
+        slots = day_slot_minutes(
+            self.date, self.opening, self.closing, [], 60, self.break_start, self.break_end
+        )
+
+        self.assertEqual(
+            [format_minute(minute) for minute in slots],
+            ['09:00', '09:30', '10:00', '10:30', '11:00',
+             '13:00', '13:30', '14:00', '14:30', '15:00', '15:30', '16:00']
+        )
+
+    def test_bookings_keep_slots_on_grid(self):
+        """A booking ending off the grid must not shift the following slots"""
+        bookings = [(self.at(9, 10), self.at(10, 5))]
+        slots = day_slot_minutes(self.date, self.opening, self.closing, bookings, 60)
+
+        self.assertEqual(format_minute(slots[0]), '10:30')
+        self.assertTrue(all(minute % 30 == 0 for minute in slots))
+
+    def test_many_short_bookings(self):
+        """Every booked minute blocks any service overlapping it"""
+        bookings = [(self.at(hour, 0), self.at(hour, 15)) for hour in range(9, 17)]
+        slots = day_slot_minutes(self.date, self.opening, self.closing, bookings, 30)
+
+        self.assertEqual(
+            [format_minute(minute) for minute in slots],
+            ['09:30', '10:30', '11:30', '12:30', '13:30', '14:30', '15:30', '16:30']
+        )
+
+    def test_past_slots_are_skipped(self):
+        """Slots earlier than now_dt are filtered out"""
+        slots = day_slot_minutes(
+            self.date, self.opening, self.closing, [], 60, now_dt=self.at(14, 1)
+        )
+
+        self.assertEqual(format_minute(slots[0]), '14:30')
+
+
+class SlotCacheTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.next_monday = timezone.now().date() + timedelta(days=7 - timezone.now().date().weekday())
+        self.slot_data = json.dumps({'date': self.next_monday.strftime('%Y-%m-%d'), 'service': self.service.id})
+
+    def get_slots(self):
+        return self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=self.slot_data,
+            content_type='application/json'
+        ).json()['available_slots']
+
+    def test_repeated_lookup_is_served_from_cache(self):
+        """Test the second lookup of a day skips the Availability and Agenda queries"""
+        with self.assertNumQueries(4):
+            first = self.get_slots()
+        with self.assertNumQueries(2):
+            second = self.get_slots()
+
+        self.assertEqual(first, second)
+        self.assertEqual(slot_cache.stats()['hits'], 1)
+        self.assertEqual(slot_cache.stats()['misses'], 1)
+
+    def test_agenda_write_invalidates_day(self):
+        """Test booking a slot removes it from the next lookup"""
+        self.assertIn('09:00', self.get_slots())
+
+        day_start, _ = local_day_bounds(self.next_monday)
+        agenda = Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=10),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+        self.assertNotIn('09:00', self.get_slots())
+
+        agenda.delete()
+        self.assertIn('09:00', self.get_slots())
+
+    def test_agenda_write_keeps_other_days(self):
+        """Test a booking on another day leaves the cached day alone"""
+        self.get_slots()
+        day_start, _ = local_day_bounds(self.next_monday + timedelta(days=7))
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=10),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        self.assertEqual(slot_cache.stats()['size'], 1)
+        self.assertEqual(slot_cache.stats()['invalidations'], 0)
+
+    def test_availability_write_invalidates_weekday(self):
+        """Test changing the working hours is reflected on the next lookup"""
+        self.assertEqual(self.get_slots()[0], '09:00')
+
+        self.availability.start_time = timezone.datetime.strptime("14:00", "%H:%M").time()
+        self.availability.save()
+
+        self.assertEqual(self.get_slots()[0], '14:00')
+
+    def test_stale_generation_is_not_stored(self):
+        """Test a value computed across an invalidation is discarded"""
+        generation = slot_cache.generation(self.hairdresser.id)
+        slot_cache.invalidate_days(self.hairdresser.id, [self.next_monday])
+        slot_cache.set(self.hairdresser.id, self.next_monday, 60, [540], generation)
+
+        self.assertIsNone(slot_cache.get(self.hairdresser.id, self.next_monday, 60))
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted once the cache is full"""
+        cache = SlotCache(max_size=2, ttl=60)
+        cache.set(1, self.next_monday, 60, [540])
+        cache.set(2, self.next_monday, 60, [600])
+        cache.get(1, self.next_monday, 60)
+        cache.set(3, self.next_monday, 60, [660])
+
+        self.assertEqual(cache.get(1, self.next_monday, 60), (540,))
+        self.assertIsNone(cache.get(2, self.next_monday, 60))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_stats_endpoint(self):
+        """Test the cache counters are exposed"""
+        self.get_slots()
+        response = self.client.get(reverse('get_slot_cache_stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data']['misses'], 1)
+        self.assertEqual(response.json()['data']['size'], 1)
+
+
+class EarliestSlotsTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.earliest_url = lambda hairdresser_id: reverse('get_earliest_slots', args=[hairdresser_id])
+        today = timezone.now().date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+    def post_search(self, payload, hairdresser_id=None):
+        return self.client.post(
+            self.earliest_url(hairdresser_id or self.hairdresser.id),
+            data=json.dumps(payload),
+            content_type='application/json'
+        )
+
+    def test_earliest_slots_first_day(self):
+        """Test the first free slots are returned in chronological order"""
+        with self.assertNumQueries(4):
+            response = self.post_search({
+                'service': self.service.id,
+                'start_date': self.next_monday.strftime('%Y-%m-%d'),
+                'limit': 3
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['available_slots'], [
+            {'date': self.next_monday.strftime('%Y-%m-%d'), 'time': '09:00'},
+            {'date': self.next_monday.strftime('%Y-%m-%d'), 'time': '09:30'},
+            {'date': self.next_monday.strftime('%Y-%m-%d'), 'time': '10:00'},
+        ])
+
+    def test_earliest_slots_skip_full_days(self):
+        """Test a fully booked day is skipped in favour of the next working day"""
+        day_start, _ = local_day_bounds(self.next_monday)
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=17),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        response = self.post_search({
+            'service': self.service.id,
+            'start_date': self.next_monday.strftime('%Y-%m-%d'),
+            'end_date': (self.next_monday + timedelta(days=13)).strftime('%Y-%m-%d'),
+            'limit': 1
+        })
+
+        following_monday = self.next_monday + timedelta(days=7)
+        self.assertEqual(response.json()['available_slots'], [
+            {'date': following_monday.strftime('%Y-%m-%d'), 'time': '09:00'}
+        ])
+
+    def test_earliest_slots_invalid_range(self):
+        """Test a date range longer than the search window is rejected"""
+        response = self.post_search({
+            'service': self.service.id,
+            'start_date': self.next_monday.strftime('%Y-%m-%d'),
+            'end_date': (self.next_monday + timedelta(days=365)).strftime('%Y-%m-%d')
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_earliest_slots_invalid_hairdresser(self):
+        """Test searching slots for a non-existent hairdresser"""
+        response = self.post_search({'service': self.service.id}, hairdresser_id=9999)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()['error'], 'Hairdresser not found')
+
+
+class MonthAvailabilityTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.now().date()
+        # First Monday of the month after next, so every day in it is in the future
+        month_start = (today.replace(day=1) + timedelta(days=62)).replace(day=1)
+        self.month_start = month_start
+        self.first_monday = month_start + timedelta(days=(7 - month_start.weekday()) % 7)
+        self.month_url = reverse('get_month_availability', args=[self.hairdresser.id])
+
+    def test_month_statuses(self):
+        """Test each day of the month gets a free/partial/full/closed status"""
+        day_start, _ = local_day_bounds(self.first_monday)
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=17),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+        second_monday = self.first_monday + timedelta(days=7)
+        day_start, _ = local_day_bounds(second_monday)
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=9),
+            end_time=day_start + timedelta(hours=10),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.month_url, {
+                'service': self.service.id,
+                'month': self.month_start.strftime('%Y-%m')
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=60', response['Cache-Control'])
+        data = response.json()
+        days = data['days']
+        self.assertEqual(days[self.first_monday.day - 1], 'full')
+        self.assertEqual(days[second_monday.day - 1], 'partial')
+        self.assertEqual(days[second_monday.day + 6], 'free')
+        self.assertEqual(days[second_monday.day], 'closed')  # Tuesday, no availability
+        self.assertEqual(data['available_mask'] >> (self.first_monday.day - 1) & 1, 0)
+        self.assertEqual(data['available_mask'] >> (second_monday.day - 1) & 1, 1)
+
+    def test_month_invalid_format(self):
+        """Test an invalid month parameter is rejected"""
+        response = self.client.get(self.month_url, {'service': self.service.id, 'month': '2025/07'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'Invalid month format. Please use YYYY-MM.')
+
+    def test_month_invalid_service(self):
+        """Test a non-numeric service is reported as such, not as a bad month"""
+        response = self.client.get(self.month_url, {'service': 'corte', 'month': '2025-07'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'Invalid service. Please use a service id.')
+
+
+class AvailableHairdressersTest(ReserveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.available_url = reverse('get_available_hairdressers')
+        today = timezone.now().date()
+        self.next_monday = today + timedelta(days=7 - today.weekday())
+
+        self.other_user = User.objects.create(
+            email="other@example.com",
+            password="hairdresser123",
+            first_name="Other",
+            last_name="Hairdresser",
+            phone="+5592984503333",
+            neighborhood="Centro",
+            city="Manaus",
+            state="AM",
+            address="Other Street",
+            postal_code="69050750",
+            role="hairdresser"
+        )
+        self.other_hairdresser = Hairdresser.objects.create(user=self.other_user, cnpj="12345678901213")
+        Availability.objects.create(
+            hairdresser=self.other_hairdresser,
+            weekday="monday",
+            start_time=timezone.datetime.strptime("08:00", "%H:%M").time(),
+            end_time=timezone.datetime.strptime("18:00", "%H:%M").time()
+        )
+        self.coloring = Service.objects.create(
+            name="Coloração", price=120.00, duration=90, hairdresser=self.hairdresser
+        )
+        self.other_coloring = Service.objects.create(
+            name="Coloração Premium", price=180.00, duration=90, hairdresser=self.other_hairdresser
+        )
+
+    def test_only_free_hairdressers_are_returned(self):
+        """Test hairdressers booked during the window are left out"""
+        day_start, _ = local_day_bounds(self.next_monday)
+        Agenda.objects.create(
+            start_time=day_start + timedelta(hours=14),
+            end_time=day_start + timedelta(hours=15),
+            hairdresser=self.hairdresser,
+            service=self.service
+        )
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.available_url, {
+                'service': 'coloração',
+                'date': self.next_monday.strftime('%Y-%m-%d'),
+                'start': '14:00'
+            })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['hairdresser']['id'], self.other_hairdresser.id)
+        self.assertEqual(data[0]['available_slots'], ['14:00'])
+
+    def test_capitalized_weekday_matches(self):
+        """Test availability stored as 'Monday' is found like 'monday'"""
+        Availability.objects.update(weekday='Monday')
+        params = {'service': 'coloração', 'date': self.next_monday.strftime('%Y-%m-%d'), 'start': '09:00', 'end': '09:30'}
+
+        response = self.client.get(self.available_url, params)
+
+        self.assertEqual(len(response.json()['data']), 2)
+        response = self.client.post(
+            self.get_slots_url(self.hairdresser.id),
+            data=json.dumps({'date': params['date'], 'service': self.service.id}),
+            content_type='application/json'
+        )
+        self.assertIn('09:00', response.json()['available_slots'])
+
+    def test_location_filter(self):
+        """Test the city/neighborhood filters restrict the candidates"""
+        response = self.client.get(self.available_url, {
+            'service': 'coloração',
+            'date': self.next_monday.strftime('%Y-%m-%d'),
+            'start': '09:00',
+            'end': '10:00',
+            'neighborhood': 'Centro'
+        })
+
+        data = response.json()['data']
+        self.assertEqual([item['hairdresser']['id'] for item in data], [self.other_hairdresser.id])
+        self.assertEqual(data[0]['available_slots'], ['09:00', '09:30', '10:00'])
+
+    def test_missing_service_and_preference(self):
+        """Test a query without service or preference is rejected"""
+        response = self.client.get(self.available_url, {
+            'date': self.next_monday.strftime('%Y-%m-%d'),
+            'start': '14:00'
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
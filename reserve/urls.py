@@ -1,10 +1,14 @@
 from django.urls import path
-from .views import CreateReserve, ListReserve, UpdateReserve, RemoveReserve, ReserveSlot, ReserveById
+from .views import CreateReserve, ListReserve, UpdateReserve, RemoveReserve, ReserveSlot, ReserveById, EarliestSlots, MonthAvailability, AvailableHairdressers, SlotCacheStats
 
 urlpatterns = [
     path('<int:id>', ReserveById.as_view(), name='retrieve_reserve_by_id'),
     path('create', CreateReserve.as_view(), name='create_reserve'),
     path('slots/<int:hairdresser_id>', ReserveSlot.as_view(), name="get_slots"),
+    path('slots/<int:hairdresser_id>/earliest', EarliestSlots.as_view(), name="get_earliest_slots"),
+    path('slots/<int:hairdresser_id>/month', MonthAvailability.as_view(), name="get_month_availability"),
+    path('slots/hairdressers', AvailableHairdressers.as_view(), name="get_available_hairdressers"),
+    path('slots/cache/stats', SlotCacheStats.as_view(), name="get_slot_cache_stats"),
     path('list/<int:customer_id>', ListReserve.as_view(), name='list_reserve'),
     path('list', ListReserve.as_view(), name='list_reserve'),
     #path('update/<int:reserve_id>', UpdateReserve.as_view(), name='update_reserve'),
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta, datetime, date, timezone
 from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -10,15 +10,29 @@ from reserve.models import Reserve
 from reserve.serializers import ReserveSerializer, ReserveFullInfoSerializer
 from service.models import Service
 from agenda.models import Agenda
+from agenda.booking import book_agenda, SlotUnavailable
 from availability.models import Availability
 import calendar
 from django.db import transaction
 from rest_framework import status
 from django.utils.dateparse import parse_datetime
-from zoneinfo import ZoneInfo
+from django.utils.cache import patch_cache_control
+from django.db.models import Q
+from hairmatch.pagination import InvalidCursor, paginate, set_next_cursor, wants_page
+from reserve.slot_cache import slot_cache
+from reserve.slot_engine import (
+    LOCAL_TIMEZONE, WEEKDAYS, local_day_bounds, day_slot_minutes, format_minute, group_bookings_by_day,
+    compile_day, minute_of_day, window_slot_minutes
+)
+from users.serializers import HairdresserNameSerializer
+from service.serializers import ServiceSerializer
+
+DAY_CLOSED = 'closed'
+DAY_FREE = 'free'
+DAY_PARTIAL = 'partial'
+DAY_FULL = 'full'
 
 # Create your views here.
-LOCAL_TIMEZONE = ZoneInfo('America/Manaus')
 class ReserveById(APIView):
     def get(self, request, id=None):
     
@@ -76,35 +90,33 @@ class CreateReserve(APIView):
                 status=status.HTTP_409_CONFLICT
             )
 
-        customer_reservations = Reserve.objects.filter(customer=customer_instance).select_related('service')
-        for reservation in customer_reservations:
-            existing_start = reservation.start_time
+        customer_overlap = Reserve.objects.filter(
+            customer=customer_instance,
+            start_time__lt=end_time,
+            end_time__gt=start_time
+        ).exists()
 
-            if timezone.is_naive(existing_start):
-                existing_start = timezone.make_aware(existing_start)
-            
-            existing_end = calculate_end_time(existing_start, reservation.service.duration)
-            
-            if existing_start < end_time and start_time < existing_end:
-                 return JsonResponse(
-                     {'error': 'Você já tem outra reserva agendada para o mesmo horário'},
-                     status=status.HTTP_409_CONFLICT
-                 )
+        if customer_overlap:
+            return JsonResponse(
+                {'error': 'Você já tem outra reserva agendada para o mesmo horário'},
+                status=status.HTTP_409_CONFLICT
+            )
 
         try:
             with transaction.atomic():
+                agenda = book_agenda(hairdresser_instance, service_instance, start_time, end_time)
                 Reserve.objects.create(
                     start_time=start_time,
+                    end_time=end_time,
+                    agenda=agenda,
                     customer=customer_instance,
                     service=service_instance,
                 )
-                
-                Agenda.objects.create(
-                    start_time=start_time,
-                    end_time=end_time,
-                    hairdresser=hairdresser_instance,
-                    service=service_instance
-                )
+        except SlotUnavailable:
+            return JsonResponse(
+                {'error': 'The hairdresser is not available during this time slot.'},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             return JsonResponse(
                 {'error': f'An error occurred while saving the reservation: {e}'},
@@ -121,13 +133,23 @@ class ListReserve(APIView):
             except customer.DoesNotExist:
                 return JsonResponse({'error': 'Customer not found'}, status=404)
             
-            reserves = Reserve.objects.filter(customer=customer_id).order_by('start_time')
+            # Pages run newest first, so the first one holds the upcoming reservations
+            ordering = ('-start_time', '-id') if wants_page(request) else ('start_time', 'id')
+            try:
+                reserves, next_cursor = paginate(
+                    request, Reserve.objects.filter(customer=customer_id).order_by(*ordering), paged_by_default=False
+                )
+            except InvalidCursor as error:
+                return JsonResponse({'error': str(error)}, status=400)
             result = ReserveFullInfoSerializer(reserves, many=True).data
-            return JsonResponse({'data': result}, status=200)
-            
-        reserves = Reserve.objects.all()
+            return set_next_cursor(JsonResponse({'data': result}, status=200), request, next_cursor)
+
+        try:
+            reserves, next_cursor = paginate(request, Reserve.objects.order_by('id'), paged_by_default=False)
+        except InvalidCursor as error:
+            return JsonResponse({'error': str(error)}, status=400)
         result = ReserveSerializer(reserves, many=True).data 
-        return JsonResponse({'data': result}, status=200)   
+        return set_next_cursor(JsonResponse({'data': result}, status=200), request, next_cursor)
 
 class UpdateReserve(APIView):
     def put(self, request, reserve_id):
@@ -164,41 +186,118 @@ class ReserveSlot(APIView):
         except Service.DoesNotExist:
             return JsonResponse({'error': 'Service not found'}, status=404)
 
-        weekday_name = calendar.day_name[selected_date.weekday()]
-        availability = Availability.objects.filter(
-            hairdresser=hairdresser,
-            weekday=weekday_name.lower()
-        ).first()
+        slot_minutes = cached_day_slot_minutes(hairdresser.id, selected_date, service.duration)
+        available_slots = [format_minute(minute) for minute in slot_minutes]
 
-        if not availability:
-            return JsonResponse({'available_slots': []})
+        return JsonResponse({'available_slots': available_slots})
+    
+class EarliestSlots(APIView):
+    MAX_SEARCH_DAYS = 60
+    MAX_LIMIT = 50
 
-        now = timezone.now()
-        is_today = (selected_date == now.date())
+    def post(self, request, hairdresser_id):
+        try:
+            data = json.loads(request.body)
+            service_id = data['service']
+            today = timezone.localtime(timezone.now(), LOCAL_TIMEZONE).date()
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else today
+            end_date = (
+                datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date')
+                else start_date + timedelta(days=30)
+            )
+            limit = int(data.get('limit', 5))
+        except (json.JSONDecodeError, KeyError):
+            return JsonResponse({'error': 'Invalid payload. "service" is required.'}, status=400)
+        except (ValueError, TypeError):
+            return JsonResponse({'error': 'Invalid date format or limit. Please use YYYY-MM-DD.'}, status=400)
 
-        start_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.min.time()))
-        end_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.max.time()))
+        if end_date < start_date or (end_date - start_date).days > self.MAX_SEARCH_DAYS:
+            return JsonResponse({'error': f'The date range must span at most {self.MAX_SEARCH_DAYS} days.'}, status=400)
+        if not 0 < limit <= self.MAX_LIMIT:
+            return JsonResponse({'error': f'limit must be between 1 and {self.MAX_LIMIT}.'}, status=400)
 
-        bookings = Agenda.objects.filter(
-            hairdresser=hairdresser,
-            start_time__lt=end_of_day,
-            end_time__gt=start_of_day
-        ).order_by('start_time')
+        try:
+            hairdresser = Hairdresser.objects.get(id=hairdresser_id)
+            service = Service.objects.get(id=service_id)
+        except Hairdresser.DoesNotExist:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=404)
+        except Service.DoesNotExist:
+            return JsonResponse({'error': 'Service not found'}, status=404)
 
-        available_slots = generate_time_slots(
-            selected_date,
-            availability.start_time,
-            availability.end_time,
-            bookings,
-            service.duration,
-            availability.break_start,
-            availability.break_end,
+        available_slots = find_earliest_slots(hairdresser.id, service.duration, start_date, end_date, limit)
+        return JsonResponse({'available_slots': available_slots})
+
+class MonthAvailability(APIView):
+    CACHE_SECONDS = 60
 
-            now_dt=now if is_today else None
+    def get(self, request, hairdresser_id):
+        if 'service' not in request.GET or 'month' not in request.GET:
+            return JsonResponse({'error': 'Invalid query. "service" and "month" are required.'}, status=400)
+        try:
+            service_id = int(request.GET['service'])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid service. Please use a service id.'}, status=400)
+        try:
+            month_start = datetime.strptime(request.GET['month'], '%Y-%m').date()
+        except ValueError:
+            return JsonResponse({'error': 'Invalid month format. Please use YYYY-MM.'}, status=400)
+
+        try:
+            hairdresser = Hairdresser.objects.get(id=hairdresser_id)
+            service = Service.objects.get(id=service_id)
+        except Hairdresser.DoesNotExist:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=404)
+        except Service.DoesNotExist:
+            return JsonResponse({'error': 'Service not found'}, status=404)
+
+        statuses = month_availability(hairdresser.id, service.duration, month_start.year, month_start.month)
+        available_mask = 0
+        for day_index, day_status in enumerate(statuses):
+            if day_status in (DAY_FREE, DAY_PARTIAL):
+                available_mask |= 1 << day_index
+
+        response = JsonResponse({
+            'month': month_start.strftime('%Y-%m'),
+            'days': statuses,
+            'available_mask': available_mask
+        })
+        patch_cache_control(response, public=True, max_age=self.CACHE_SECONDS)
+        return response
+
+class AvailableHairdressers(APIView):
+    def get(self, request):
+        service_name = request.GET.get('service', '').strip()
+        preference_name = request.GET.get('preference', '').strip()
+        if not service_name and not preference_name:
+            return JsonResponse({'error': 'Invalid query. "service" or "preference" is required.'}, status=400)
+
+        try:
+            selected_date = datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+            window_start = datetime.strptime(request.GET['start'], '%H:%M').time()
+            window_end = datetime.strptime(request.GET.get('end', request.GET['start']), '%H:%M').time()
+        except KeyError:
+            return JsonResponse({'error': 'Invalid query. "date" and "start" are required.'}, status=400)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date or time format. Please use YYYY-MM-DD and HH:MM.'}, status=400)
+
+        if window_end < window_start:
+            return JsonResponse({'error': '"end" must not be earlier than "start".'}, status=400)
+
+        results = find_free_hairdressers(
+            selected_date,
+            window_start,
+            window_end,
+            service_name=service_name,
+            preference_name=preference_name,
+            city=request.GET.get('city'),
+            neighborhood=request.GET.get('neighborhood')
         )
+        return JsonResponse({'data': results}, status=200)
+
+class SlotCacheStats(APIView):
+    def get(self, request):
+        return JsonResponse({'data': slot_cache.stats()}, status=200)
 
-        return JsonResponse({'available_slots': available_slots})
-    
 def calculate_end_time(start_dt: datetime, duration_minutes: int) -> datetime:
     """
     Calculates the end time by adding a duration in minutes to a start datetime.
@@ -228,55 +327,22 @@ def generate_time_slots(date, start_time, end_time, bookings, service_duration,
     """
     Generate available time slots for a given date and availability.
     If now_dt is provided, it will filter out slots that are in the past.
-    """
-    slots = []
-    
-    naive_start_dt = datetime.combine(date, start_time)
-    naive_end_dt = datetime.combine(date, end_time)
 
-    current_dt = naive_start_dt.replace(tzinfo=LOCAL_TIMEZONE)
-    end_dt = naive_end_dt.replace(tzinfo=LOCAL_TIMEZONE)
-    
-    # The last possible start time must account for the service's duration
-    service_delta = timedelta(minutes=service_duration)
-    end_dt -= timedelta(minutes=service_duration)
-    
-    slot_duration = timedelta(minutes=30) 
-    last_possible_start_dt = end_dt - service_delta
+    The day is compiled into a minute-resolution bitmap by the slot engine, so
+    the cost no longer grows with bookings x candidate slots.
+    """
     blocked_periods = [(b.start_time, b.end_time) for b in bookings]
-    if break_start and break_end: 
-        naive_break_start = datetime.combine(date, break_start)
-        naive_break_end = datetime.combine(date, break_end)
-        break_start_dt = naive_break_start.replace(tzinfo=LOCAL_TIMEZONE)
-        break_end_dt = naive_break_end.replace(tzinfo=LOCAL_TIMEZONE)
-        blocked_periods.append((break_start_dt, break_end_dt))
-
-    blocked_periods.sort(key=lambda x: x[0])
-
-    while current_dt <= last_possible_start_dt:
-        # Skip slots in the past for today's date
-        if now_dt and current_dt < now_dt:
-            current_dt += slot_duration
-            continue
-
-        slot_end_dt = current_dt + service_delta
- 
-        is_blocked = False
-        for blocked_start, blocked_end in blocked_periods: 
-            # Check for overlap 
-            if current_dt < blocked_end and slot_end_dt > blocked_start:
-                # This slot is blocked.
-                is_blocked = True
-                # CRITICAL: Jump the clock to the end of the current blockage.
-                # This ensures we don't check any more slots within this blocked period.
-                current_dt = blocked_end
-                break 
-
-        if not is_blocked:
-            slots.append(current_dt.strftime('%H:%M'))
-            current_dt += slot_duration
-    
-    return slots
+    slot_minutes = day_slot_minutes(
+        date,
+        start_time,
+        end_time,
+        blocked_periods,
+        service_duration,
+        break_start,
+        break_end,
+        now_dt=now_dt
+    )
+    return [format_minute(minute) for minute in slot_minutes]
 
 def get_available_slots(hairdresser_id, service_id, date_str):
     try:
@@ -290,35 +356,8 @@ def get_available_slots(hairdresser_id, service_id, date_str):
     except ValueError:
         return {'error': 'Invalid date format', 'status': 400}
 
-    weekday_name = calendar.day_name[selected_date.weekday()]
-
-    availability = Availability.objects.filter(
-        hairdresser=hairdresser,
-        weekday=weekday_name.lower()
-    ).first()
-
-    if not availability:
-        return {'available_slots': []}
-
-    start_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.min.time()))
-    end_of_day = timezone.make_aware(datetime.combine(selected_date, datetime.max.time()))
-
-    bookings = Agenda.objects.filter(
-        hairdresser=hairdresser,
-        start_time__lt=end_of_day,
-        end_time__gt=start_of_day
-    ).order_by('start_time')
-
-    # Generate time slots
-    available_slots = generate_time_slots(
-        selected_date,
-        availability.start_time,
-        availability.end_time,
-        bookings,
-        service.duration,
-        availability.break_start,
-        availability.break_end
-    )
+    slot_minutes = cached_day_slot_minutes(hairdresser.id, selected_date, service.duration)
+    available_slots = [format_minute(minute) for minute in slot_minutes]
 
     return {'available_slots' : available_slots}
 
@@ -338,19 +377,19 @@ def create_new_reserve(customer_id, service_id, hairdresser_id, start_time_dt):
         ).exists():
             return {'error': 'Desculpe, este horário foi agendado por outra pessoa. Por favor, escolha outro.'}
         
-        reserve = Reserve.objects.create(
-            start_time=start_time_dt,
-            customer=customer_instance,
-            service=service_instance
-        )
-        Agenda.objects.create(
-            start_time=start_time_dt,
-            end_time=end_time_dt,
-            hairdresser=hairdresser_instance,
-            service=service_instance
-        )
+        with transaction.atomic():
+            agenda = book_agenda(hairdresser_instance, service_instance, start_time_dt, end_time_dt)
+            reserve = Reserve.objects.create(
+                start_time=start_time_dt,
+                end_time=end_time_dt,
+                agenda=agenda,
+                customer=customer_instance,
+                service=service_instance
+            )
             
         return {'success': True, 'reserve': reserve}
+    except SlotUnavailable:
+        return {'error': 'Desculpe, este horário foi agendado por outra pessoa. Por favor, escolha outro.'}
     except Customer.DoesNotExist:
         return {'error': 'Customer not found'}
     except Service.DoesNotExist:
@@ -360,4 +399,240 @@ def create_new_reserve(customer_id, service_id, hairdresser_id, start_time_dt):
     except Exception as e:
         # Catch any other unexpected errors
         print(f"An unexpected error occurred in create_new_reserve: {e}")
-        return {'error': 'Ocorreu um erro inesperado ao tentar criar a reserva.'}
\ No newline at end of file
+        return {'error': 'Ocorreu um erro inesperado ao tentar criar a reserva.'}
+
+def compute_day_slot_minutes(day, availability, bookings, service_duration):
+    """
+    Returns every feasible start of the day, ignoring the current time, for the
+    day's Availability row (None when the hairdresser does not work that day).
+    """
+    if not availability:
+        return []
+    return day_slot_minutes(
+        day,
+        availability.start_time,
+        availability.end_time,
+        bookings,
+        service_duration,
+        availability.break_start,
+        availability.break_end
+    )
+
+def drop_past_minutes(slot_minutes, day, now=None):
+    """
+    Drops the starts that are already over when the day is today.
+    """
+    now = now or timezone.now()
+    if day != timezone.localtime(now, LOCAL_TIMEZONE).date():
+        return list(slot_minutes)
+    day_start, _ = local_day_bounds(day)
+    not_before = minute_of_day(now, day_start, round_up=True)
+    return [minute for minute in slot_minutes if minute >= not_before]
+
+def cached_day_slot_minutes(hairdresser_id, selected_date, service_duration, now=None):
+    """
+    Returns the free starts (minutes from local midnight) of a service on one day,
+    served from reserve.slot_cache when the day is cached and loaded with two
+    queries (Availability and the day's Agenda rows) when it is not.
+    """
+    slot_minutes = slot_cache.get(hairdresser_id, selected_date, service_duration)
+    if slot_minutes is None:
+        generation = slot_cache.generation(hairdresser_id)
+        availability = Availability.objects.filter(
+            hairdresser_id=hairdresser_id,
+            weekday__iexact=WEEKDAYS[selected_date.weekday()]
+        ).order_by('id').first()
+
+        bookings = []
+        if availability:
+            start_of_day, end_of_day = local_day_bounds(selected_date)
+            bookings = Agenda.objects.filter(
+                hairdresser_id=hairdresser_id,
+                start_time__lt=end_of_day,
+                end_time__gt=start_of_day
+            ).values_list('start_time', 'end_time')
+
+        slot_minutes = compute_day_slot_minutes(selected_date, availability, bookings, service_duration)
+        slot_cache.set(hairdresser_id, selected_date, service_duration, slot_minutes, generation)
+
+    return drop_past_minutes(slot_minutes, selected_date, now)
+
+def load_hairdresser_schedule(hairdresser_id, start_date, end_date):
+    """
+    Loads everything needed to compute slots for a hairdresser between start_date
+    and end_date (inclusive) in two queries: the weekly Availability rows and
+    every Agenda booking overlapping the range, bucketed by local day.
+    """
+    availability_by_weekday = {}
+    for availability in Availability.objects.filter(hairdresser_id=hairdresser_id).order_by('id'):
+        availability_by_weekday.setdefault(availability.weekday.lower(), availability)
+
+    range_start, _ = local_day_bounds(start_date)
+    _, range_end = local_day_bounds(end_date)
+    bookings = Agenda.objects.filter(
+        hairdresser_id=hairdresser_id,
+        start_time__lt=range_end,
+        end_time__gt=range_start
+    ).values_list('start_time', 'end_time')
+
+    return availability_by_weekday, group_bookings_by_day(bookings)
+
+def find_earliest_slots(hairdresser_id, service_duration, start_date, end_date, limit=5, now=None):
+    """
+    Returns up to `limit` free slots for a service, earliest first, searching
+    every day between start_date and end_date (inclusive).
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now, LOCAL_TIMEZONE).date()
+    start_date = max(start_date, today)
+    if start_date > end_date:
+        return []
+
+    # Days already in the slot cache are answered without touching the database;
+    # the schedule for the rest of the range is loaded once, on the first miss.
+    schedule = None
+    slots = []
+    day = start_date
+    while day <= end_date and len(slots) < limit:
+        slot_minutes = slot_cache.get(hairdresser_id, day, service_duration)
+        if slot_minutes is None:
+            if schedule is None:
+                generation = slot_cache.generation(hairdresser_id)
+                schedule = load_hairdresser_schedule(hairdresser_id, day, end_date)
+            availability_by_weekday, bookings_by_day = schedule
+            slot_minutes = compute_day_slot_minutes(
+                day,
+                availability_by_weekday.get(WEEKDAYS[day.weekday()]),
+                bookings_by_day.get(day, []),
+                service_duration
+            )
+            slot_cache.set(hairdresser_id, day, service_duration, slot_minutes, generation)
+
+        for minute in drop_past_minutes(slot_minutes, day, now)[:limit - len(slots)]:
+            slots.append({'date': day.strftime('%Y-%m-%d'), 'time': format_minute(minute)})
+        day += timedelta(days=1)
+
+    return slots
+
+def month_availability(hairdresser_id, service_duration, year, month, now=None):
+    """
+    Returns one status per day of the month: 'closed' when the hairdresser does not
+    work (or the day is over), 'full' when every slot is booked, 'partial' when
+    some slots are booked and 'free' when nothing is booked.
+    """
+    now = now or timezone.now()
+    today = timezone.localtime(now, LOCAL_TIMEZONE).date()
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+
+    availability_by_weekday, bookings_by_day = load_hairdresser_schedule(hairdresser_id, first_day, last_day)
+
+    statuses = []
+    day = first_day
+    while day <= last_day:
+        availability = availability_by_weekday.get(WEEKDAYS[day.weekday()])
+        if not availability or day < today:
+            statuses.append(DAY_CLOSED)
+            day += timedelta(days=1)
+            continue
+
+        bookings = bookings_by_day.get(day, [])
+        now_dt = now if day == today else None
+        open_slots = day_slot_minutes(
+            day, availability.start_time, availability.end_time, [], service_duration,
+            availability.break_start, availability.break_end, now_dt=now_dt
+        )
+        free_slots = open_slots if not bookings else day_slot_minutes(
+            day, availability.start_time, availability.end_time, bookings, service_duration,
+            availability.break_start, availability.break_end, now_dt=now_dt
+        )
+
+        if not open_slots:
+            statuses.append(DAY_CLOSED)
+        elif not free_slots:
+            statuses.append(DAY_FULL)
+        elif len(free_slots) < len(open_slots):
+            statuses.append(DAY_PARTIAL)
+        else:
+            statuses.append(DAY_FREE)
+        day += timedelta(days=1)
+
+    return statuses
+
+def find_free_hairdressers(selected_date, window_start, window_end, service_name=None,
+                           preference_name=None, city=None, neighborhood=None, now=None):
+    """
+    Returns the hairdressers offering a matching service with at least one feasible
+    start between window_start and window_end on selected_date.
+
+    Services, Availability rows and Agenda bookings for every candidate are fetched
+    in three queries and evaluated in memory, so the cost stays flat as the number
+    of hairdressers grows.
+    """
+    service_filter = Q()
+    if service_name:
+        service_filter |= Q(name__icontains=service_name)
+    if preference_name:
+        service_filter |= Q(preferences__name__iexact=preference_name) | Q(name__icontains=preference_name)
+
+    services = Service.objects.filter(service_filter).select_related('hairdresser__user')
+    if city:
+        services = services.filter(hairdresser__user__city__iexact=city)
+    if neighborhood:
+        services = services.filter(hairdresser__user__neighborhood__iexact=neighborhood)
+    services = list(services.distinct().order_by('hairdresser_id', 'id'))
+    if not services:
+        return []
+
+    hairdresser_ids = {service.hairdresser_id for service in services}
+    availability_by_hairdresser = {}
+    for availability in Availability.objects.filter(
+        hairdresser_id__in=hairdresser_ids,
+        weekday__iexact=WEEKDAYS[selected_date.weekday()]
+    ).order_by('id'):
+        availability_by_hairdresser.setdefault(availability.hairdresser_id, availability)
+
+    day_start, day_end = local_day_bounds(selected_date)
+    bookings_by_hairdresser = {}
+    for hairdresser_id, start_time, end_time in Agenda.objects.filter(
+        hairdresser_id__in=availability_by_hairdresser.keys(),
+        start_time__lt=day_end,
+        end_time__gt=day_start
+    ).values_list('hairdresser_id', 'start_time', 'end_time'):
+        bookings_by_hairdresser.setdefault(hairdresser_id, []).append((start_time, end_time))
+
+    now = now or timezone.now()
+    first_minute = minute_of_day(window_start, day_start)
+    if selected_date == timezone.localtime(now, LOCAL_TIMEZONE).date():
+        first_minute = max(first_minute, minute_of_day(now, day_start, round_up=True))
+    last_minute = minute_of_day(window_end, day_start)
+
+    results = []
+    for service in services:
+        availability = availability_by_hairdresser.get(service.hairdresser_id)
+        if not availability or first_minute > last_minute:
+            continue
+
+        free_mask = compile_day(
+            selected_date,
+            availability.start_time,
+            availability.end_time,
+            bookings_by_hairdresser.get(service.hairdresser_id, []),
+            availability.break_start,
+            availability.break_end
+        )
+        slot_minutes = window_slot_minutes(
+            free_mask,
+            service.duration,
+            minute_of_day(availability.start_time, day_start),
+            first_minute,
+            last_minute
+        )
+        if slot_minutes:
+            results.append({
+                'hairdresser': HairdresserNameSerializer(service.hairdresser).data,
+                'service': ServiceSerializer(service).data,
+                'available_slots': [format_minute(minute) for minute in slot_minutes]
+            })
+
+    return results
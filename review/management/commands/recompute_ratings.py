@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from review.ratings import recompute_ratings
+from users.models import Hairdresser
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the review aggregates stored on hairdressers from their reviews,
+    fixing any that drifted (e.g. reviews removed by a cascade).
+    """
+
+    help = "Recomputes hairdresser rating aggregates from their reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hairdresser', type=int, action='append', dest='hairdressers',
+            help="Only recompute this hairdresser id (may be repeated)"
+        )
+
+    def handle(self, *args, **options):
+        hairdressers = Hairdresser.objects.all()
+        if options['hairdressers']:
+            hairdressers = hairdressers.filter(id__in=options['hairdressers'])
+
+        repaired = recompute_ratings(hairdressers)
+        self.stdout.write(
+            self.style.SUCCESS(f"Recomputed ratings of {hairdressers.count()} hairdressers, {repaired} repaired.")
+        )
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['hairdresser', '-created_at', '-id'], name='review_hairdresser_feed_idx'),
+        ),
+    ]
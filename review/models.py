@@ -9,4 +9,10 @@ class Review(models.Model):
     picture = models.ImageField(upload_to='reviews/images/', blank=True, null=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reviews')
     hairdresser = models.ForeignKey(Hairdresser, on_delete=models.CASCADE, related_name='reviews')
+
+    class Meta:
+        indexes = [
+            # Serves the newest-first review feed of a hairdresser (ReviewFeed)
+            models.Index(fields=['hairdresser', '-created_at', '-id'], name='review_hairdresser_feed_idx'),
+        ]
     
\ No newline at end of file
@@ -0,0 +1,121 @@
+from django.db.models import Count, Q, Sum
+
+from users.models import Hairdresser
+from users.signals import invalidate_identity
+from .models import Review
+
+# Keeps the review aggregates stored on each hairdresser (count, sum, mean and
+# a 1-5 histogram) in step with its reviews, so listings can read and sort by
+# real ratings without aggregating Review per request.
+#
+# The review views call apply_rating_change() in the same transaction as the
+# review write; it locks the hairdresser row first, so concurrent reviews of
+# one hairdresser are applied one after the other. Deletes that bypass the
+# views (cascades, the admin) are repaired by `manage.py recompute_ratings`.
+#
+# The aggregates are written with update(), which sends no signal, so both
+# functions drop the hairdresser's cached identity themselves.
+
+HISTOGRAM_FIELDS = ['rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_mean', *HISTOGRAM_FIELDS]
+
+
+def rating_bucket(rating):
+    """
+    Returns the histogram field a rating is counted in: its nearest whole star,
+    clamped to 1-5.
+    """
+    return HISTOGRAM_FIELDS[min(5, max(1, int(rating + 0.5))) - 1]
+
+
+def apply_rating_change(hairdresser_id, added=(), removed=()):
+    """
+    Adds and removes review ratings from a hairdresser's aggregates. Must run
+    inside transaction.atomic().
+    """
+    hairdresser = Hairdresser.objects.select_for_update().only('user_id', *RATING_FIELDS).get(pk=hairdresser_id)
+    values = {field: getattr(hairdresser, field) for field in RATING_FIELDS}
+
+    for rating in added:
+        values['rating_count'] += 1
+        values['rating_sum'] += rating
+        values[rating_bucket(rating)] += 1
+    for rating in removed:
+        # Clamped: a review written outside the views was never counted, and
+        # removing it must not push a counter below zero
+        if values['rating_count'] > 0:
+            values['rating_count'] -= 1
+            values['rating_sum'] -= rating
+        bucket = rating_bucket(rating)
+        values[bucket] = max(0, values[bucket] - 1)
+
+    if values['rating_count'] > 0:
+        values['rating_mean'] = values['rating_sum'] / values['rating_count']
+    else:
+        # Drop float residue left by the additions and subtractions
+        values['rating_sum'] = 0
+        values['rating_mean'] = None
+
+    # update() rather than save(): the aggregates feed none of the hairdresser signals
+    Hairdresser.objects.filter(pk=hairdresser_id).update(**values)
+    invalidate_identity(hairdresser.user_id)
+    return values
+
+
+def recompute_ratings(hairdressers=None):
+    """
+    Recomputes the aggregates of the hairdressers from their reviews. Returns
+    the number of hairdressers whose stored aggregates were wrong.
+    """
+    hairdressers = Hairdresser.objects.all() if hairdressers is None else hairdressers
+    histogram = {
+        'rating_1': Count('id', filter=Q(rating__lt=1.5)),
+        'rating_2': Count('id', filter=Q(rating__gte=1.5, rating__lt=2.5)),
+        'rating_3': Count('id', filter=Q(rating__gte=2.5, rating__lt=3.5)),
+        'rating_4': Count('id', filter=Q(rating__gte=3.5, rating__lt=4.5)),
+        'rating_5': Count('id', filter=Q(rating__gte=4.5)),
+    }
+    totals = {
+        row.pop('hairdresser_id'): row
+        for row in Review.objects.filter(hairdresser__in=hairdressers).values('hairdresser_id').annotate(
+            rating_count=Count('id'), rating_sum=Sum('rating'), **histogram
+        ).order_by()
+    }
+
+    repaired = 0
+    for hairdresser in hairdressers.only('user_id', *RATING_FIELDS).iterator(chunk_size=500):
+        values = totals.get(hairdresser.pk, {})
+        values = {
+            'rating_count': values.get('rating_count', 0),
+            'rating_sum': values.get('rating_sum') or 0,
+            **{field: values.get(field, 0) for field in HISTOGRAM_FIELDS},
+        }
+        values['rating_mean'] = values['rating_sum'] / values['rating_count'] if values['rating_count'] else None
+
+        stored = {field: getattr(hairdresser, field) for field in RATING_FIELDS}
+        if not ratings_match(stored, values):
+            Hairdresser.objects.filter(pk=hairdresser.pk).update(**values)
+            invalidate_identity(hairdresser.user_id)
+            repaired += 1
+    return repaired
+
+
+def ratings_match(stored, expected):
+    for field in RATING_FIELDS:
+        if stored[field] is None or expected[field] is None:
+            if stored[field] != expected[field]:
+                return False
+        elif abs(stored[field] - expected[field]) > 1e-9:
+            return False
+    return True
+
+
+def rating_summary(hairdresser):
+    """
+    Returns the rating summary of a hairdresser from its stored aggregates.
+    """
+    return {
+        'count': hairdresser.rating_count,
+        'mean': round(hairdresser.rating_mean, 2) if hairdresser.rating_mean is not None else None,
+        'histogram': {str(stars): getattr(hairdresser, field) for stars, field in enumerate(HISTOGRAM_FIELDS, 1)},
+    }
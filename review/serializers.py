@@ -2,15 +2,18 @@ from rest_framework import serializers
 from .models import Review
 from users.models import User
 from users.serializers import CustomerNameSerializer
+from hairmatch.images import ImageVariantsField
 
 
 class ReviewSerializer(serializers.ModelSerializer):
     customer = CustomerNameSerializer(read_only=True)
+    picture_variants = ImageVariantsField(source='picture')
     class Meta:
         model = Review
         fields = '__all__'
 
 class ReviewLiteSerializer(serializers.ModelSerializer):
+    picture_variants = ImageVariantsField(source='picture')
     class Meta:
         model = Review
         fields = '__all__'
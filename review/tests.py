@@ -1,9 +1,13 @@
 from django.test import TestCase
 from django.urls import reverse
+from django.core.management import call_command
+from django.db import transaction
+from io import StringIO
 from rest_framework.test import APIClient
 from rest_framework import status
 from users.models import User, Customer, Hairdresser
 from .models import Review
+from .views import delete_review
 from reserve.models import Reserve
 from service.models import Service
 import jwt
@@ -502,4 +506,139 @@ class RemoveAdminDeleteReview(ReviewsTestCase):
         invalid_url = reverse('remove_review_admin', args=[9999])
         response = self.client.delete(invalid_url)
 
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class RatingAggregatesTest(ReviewsTestCase):
+    def _aggregates(self):
+        self.hairdresser.refresh_from_db()
+        return (
+            self.hairdresser.rating_count, self.hairdresser.rating_sum, self.hairdresser.rating_mean,
+            [getattr(self.hairdresser, f'rating_{stars}') for stars in range(1, 6)]
+        )
+
+    def _create_review(self, reserve, rating):
+        response = self.client.post(self.create_url, data={
+            'rating': rating, 'hairdresser': self.hairdresser.id, 'reserve': reserve.id
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Review.objects.get(reserve=reserve)
+
+    def test_review_views_maintain_aggregates(self):
+        """Test that creating, updating and removing reviews keeps the aggregates exact."""
+        self.login_as_customer()
+        first = self._create_review(self.reserve, 5)
+        second = self._create_review(self.reserve2, 2)
+        self.assertEqual(self._aggregates(), (2, 7, 3.5, [0, 1, 0, 0, 1]))
+
+        response = self.client.put(
+            reverse('update_review', args=[second.id]),
+            data=json.dumps({'rating': 4}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._aggregates(), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+        response = self.client.delete(reverse('remove_review', args=[first.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._aggregates(), (1, 4, 4, [0, 0, 0, 1, 0]))
+
+        response = self.client.delete(reverse('remove_review_admin', args=[second.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._aggregates(), (0, 0, None, [0, 0, 0, 0, 0]))
+
+    def test_delete_subtracts_the_stored_rating(self):
+        """Test that deleting a stale copy of a review subtracts the rating it has now."""
+        self.login_as_customer()
+        review = self._create_review(self.reserve, 5)
+        stale = Review.objects.get(id=review.id)
+        self.client.put(
+            reverse('update_review', args=[review.id]),
+            data=json.dumps({'rating': 2}),
+            content_type='application/json'
+        )
+
+        with transaction.atomic():
+            self.assertTrue(delete_review(stale))
+            self.assertFalse(delete_review(stale))
+        self.assertEqual(self._aggregates(), (0, 0, None, [0, 0, 0, 0, 0]))
+
+    def test_profile_edit_keeps_aggregates(self):
+        """Test that a hairdresser editing their profile doesn't write back the ratings of a cached identity."""
+        self.login_as_hairdresser()
+        self.client.get(reverse('user_info_auth'))
+        hairdresser_client, self.client = self.client, APIClient()
+        self.login_as_customer()
+        self._create_review(self.reserve, 5)
+        self._create_review(self.reserve2, 4)
+
+        response = hairdresser_client.put(
+            reverse('user_info_auth'),
+            data=json.dumps({'email': self.hairdresser_payload['email'], 'resume': 'Cachos e tranças'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._aggregates(), (2, 9, 4.5, [0, 0, 0, 1, 1]))
+
+    def test_recompute_ratings_command(self):
+        """Test that the repair command rebuilds aggregates of reviews written directly."""
+        Review.objects.create(rating=4.6, customer=self.customer, hairdresser=self.hairdresser)
+        Review.objects.create(rating=1.2, customer=self.customer, hairdresser=self.hairdresser)
+        self.assertEqual(self._aggregates()[0], 0)
+
+        output = StringIO()
+        call_command('recompute_ratings', stdout=output)
+
+        count, total, mean, histogram = self._aggregates()
+        self.assertEqual((count, histogram), (2, [1, 0, 0, 0, 1]))
+        self.assertAlmostEqual(total, 5.8)
+        self.assertAlmostEqual(mean, 2.9)
+        self.assertIn('1 repaired', output.getvalue())
+
+
+class ReviewFeedTest(ReviewsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login_as_customer()
+        for reserve, rating in [(self.reserve, 5), (self.reserve2, 3)]:
+            self.client.post(self.create_url, data={
+                'rating': rating, 'hairdresser': self.hairdresser.id, 'reserve': reserve.id
+            })
+        # A review written directly shares the newest timestamp, so the feed has a tie to break
+        newest = Review.objects.order_by('-created_at').first()
+        self.tied = Review.objects.create(rating=4, customer=self.customer2, hairdresser=self.hairdresser)
+        Review.objects.filter(id=self.tied.id).update(created_at=newest.created_at)
+        self.feed_url = reverse('review_feed', args=[self.hairdresser.id])
+
+    def test_feed_pages_newest_first(self):
+        """Test walking the feed one review per page, with the summary on the first page only."""
+        expected = list(Review.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen = []
+        params = {'page_size': 1}
+        while True:
+            with self.assertNumQueries(2):
+                response = self.client.get(self.feed_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            self.assertEqual('summary' in data, not seen)
+            seen.extend(review['id'] for review in data['data'])
+            if 'X-Next-Cursor' not in response:
+                break
+            params = {'page_size': 1, 'cursor': response['X-Next-Cursor']}
+
+        self.assertEqual(seen, expected)
+
+    def test_feed_summary(self):
+        """Test the rating summary comes from the stored aggregates."""
+        response = self.client.get(self.feed_url)
+
+        data = response.json()
+        self.assertEqual(data['summary'], {
+            'count': 2, 'mean': 4.0, 'histogram': {'1': 0, '2': 0, '3': 1, '4': 0, '5': 1}
+        })
+        self.assertEqual(data['data'][0]['customer']['user']['first_name'], self.customer2_user.first_name)
+
+    def test_feed_unknown_hairdresser(self):
+        """Test the feed of a hairdresser that doesn't exist."""
+        response = self.client.get(reverse('review_feed', args=[9999]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
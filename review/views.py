@@ -5,11 +5,14 @@ from .models import Review
 from reserve.models import Reserve
 from users.models import User, Customer, Hairdresser
 from .serializers import ReviewSerializer
+from .ratings import RATING_FIELDS, apply_rating_change, rating_summary
 import json
 from django.http import JsonResponse
 from rest_framework.parsers import MultiPartParser, FormParser
-import jwt, datetime
+import datetime
+from users.authentication import TOKEN_MISSING, get_authenticated_user, get_customer, token_error_response
 from django.db import transaction
+from hairmatch.pagination import InvalidCursor, paginate, set_next_cursor
 
 # 2 - Cookie-based views (usuário autenticado)
 class CreateReview(APIView):
@@ -18,17 +21,13 @@ class CreateReview(APIView):
 
     def post(self, request, *args, **kwargs):
         # 1. Authenticate the user via JWT cookie
-        token = request.COOKIES.get('jwt')
-        if not token:
+        if request.jwt_error == TOKEN_MISSING:
             return JsonResponse({'error': 'Unauthenticated'}, status=403)
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-            user = User.objects.filter(id=payload['id']).first()
-            customer = Customer.objects.filter(user=user).first()
-            if not customer:
-                return JsonResponse({'error': 'User is not a valid customer'}, status=403)
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+        if request.jwt_error:
             return JsonResponse({'error': 'Invalid token'}, status=403)
+        customer = get_customer(get_authenticated_user(request))
+        if not customer:
+            return JsonResponse({'error': 'User is not a valid customer'}, status=403)
 
         # 2. Extract data from the FormData
         reserve_id=request.data.get('reserve')
@@ -76,6 +75,7 @@ class CreateReview(APIView):
                 )
                 reserve.review = new_review
                 reserve.save()
+                apply_rating_change(new_review.hairdresser_id, added=[rating])
             
             return JsonResponse({'message': "Review registered successfully"}, status=201)
         except Exception as error:
@@ -85,32 +85,53 @@ class CreateReview(APIView):
 class ListReview(APIView):
     def get(self, request, hairdresser_id):
         try:
-            reviews = Review.objects.all().filter(hairdresser_id=hairdresser_id)
+            reviews, next_cursor = paginate(
+                request, Review.objects.filter(hairdresser_id=hairdresser_id).select_related('customer__user').order_by('id'),
+                paged_by_default=False
+            )
             serializer = ReviewSerializer(reviews, many=True)
-            return JsonResponse({'data': serializer.data}, status=200)
-           
+            return set_next_cursor(JsonResponse({'data': serializer.data}, status=200), request, next_cursor)
+
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
 
 
-class UpdateReview(APIView):
-    def put(self, request, id):
-        token = request.COOKIES.get('jwt')
-
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
+class ReviewFeed(APIView):
+    """
+    Newest-first reviews of a hairdresser, one joined query per page. The first
+    page also carries the hairdresser's rating summary.
+    """
+    def get(self, request, hairdresser_id):
+        hairdresser = Hairdresser.objects.only(*RATING_FIELDS).filter(id=hairdresser_id).first()
+        if not hairdresser:
+            return JsonResponse({'error': 'Hairdresser not found'}, status=404)
 
+        reviews = Review.objects.filter(hairdresser=hairdresser).select_related('customer__user')
         try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
+            reviews, next_cursor = paginate(request, reviews.order_by('-created_at', '-id'))
+        except InvalidCursor as error:
+            return JsonResponse({'error': str(error)}, status=400)
+
+        payload = {'data': ReviewSerializer(reviews, many=True).data}
+        if not request.GET.get('cursor'):
+            payload['summary'] = rating_summary(hairdresser)
+        return set_next_cursor(JsonResponse(payload, status=200), request, next_cursor)
+
+
+class UpdateReview(APIView):
+    def put(self, request, id):
+        error = token_error_response(request)
+        if error:
+            return error
 
         try:
             data = json.loads(request.body)
-            user = User.objects.filter(id=payload['id']).first()
+            user = get_authenticated_user(request)
             if not user:
                 return JsonResponse({'error': 'User not found'}, status=404)
-            customer = Customer.objects.filter(user=user).first()
+            customer = get_customer(user)
             if user.role != 'customer':
                 return JsonResponse({'error': 'User is not a customer'}, status=403)
 
@@ -119,10 +140,15 @@ class UpdateReview(APIView):
                 return JsonResponse({'error': 'Review not found'}, status=404)
             if 'rating' not in data:
                 return JsonResponse({'error': 'Missing required fields: rating'}, status=400)
-            review.rating = data['rating']
-            review.comment = data.get('comment', review.comment)
-            review.picture = data.get('picture', review.picture)
-            review.save()
+            rating = float(data['rating'])
+            with transaction.atomic():
+                # Lock the review so concurrent updates adjust the aggregates one at a time
+                previous_rating = Review.objects.select_for_update().values_list('rating', flat=True).get(id=review.id)
+                review.rating = rating
+                review.comment = data.get('comment', review.comment)
+                review.picture = data.get('picture', review.picture)
+                review.save()
+                apply_rating_change(review.hairdresser_id, added=[rating], removed=[previous_rating])
             serializer = ReviewSerializer(review)
             return JsonResponse({'message': "Review updated successfully"}, status=200)
         except Exception as e:
@@ -130,21 +156,15 @@ class UpdateReview(APIView):
     
 class RemoveReview(APIView):
     def delete(self, request, id): # Id da review
-        token = request.COOKIES.get('jwt')
-
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
+        error = token_error_response(request)
+        if error:
+            return error
 
         try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
-
-        try:
-            user = User.objects.filter(id=payload['id']).first()
+            user = get_authenticated_user(request)
             if not user:
                 return JsonResponse({'error': 'User not found'}, status=404)
-            customer = Customer.objects.filter(user=user).first()
+            customer = get_customer(user)
             if user.role != 'customer':
                 return JsonResponse({'error': 'User is not a customer'}, status=403)
 
@@ -154,12 +174,8 @@ class RemoveReview(APIView):
             
             try:
                 with transaction.atomic():
-                    reserve = Reserve.objects.filter(review=review).first()
-                    if reserve:
-                        reserve.review = None
-                        reserve.save()
-
-                    review.delete()
+                    if not delete_review(review):
+                        return JsonResponse({'error': 'Review not found'}, status=404)
             except Reserve.DoesNotExist:
                 return JsonResponse({'error': 'Related reserve not found'}, status=404)
             return JsonResponse({'message': "Review deleted successfully"}, status=200)
@@ -172,7 +188,31 @@ class RemoveReviewAdmin(APIView):
             review = Review.objects.filter(id=id).first()
             if not review:
                 return JsonResponse({'error': 'Review not found'}, status=404)
-            review.delete()
+            with transaction.atomic():
+                if not delete_review(review):
+                    return JsonResponse({'error': 'Review not found'}, status=404)
             return JsonResponse({'message': "Review deleted successfully"}, status=200)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
+
+
+def delete_review(review):
+    """
+    Deletes a review, detaching it from its reserve and taking its rating out of
+    the hairdresser's aggregates. Returns False if it was already deleted. Must
+    run inside transaction.atomic().
+    """
+    # Lock the review so two concurrent deletes can't both subtract its rating,
+    # and subtract the rating read under that lock, not the one loaded earlier
+    rating = Review.objects.select_for_update().values_list('rating', flat=True).filter(id=review.id).first()
+    if rating is None:
+        return False
+
+    reserve = Reserve.objects.filter(review=review).first()
+    if reserve:
+        reserve.review = None
+        reserve.save()
+
+    review.delete()
+    apply_rating_change(review.hairdresser_id, removed=[rating])
+    return True
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -203,6 +203,37 @@ class ListServiceTest(ServiceTestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(response.json()['error'], 'Service not found')
 
+    def test_list_services_by_cursor(self):
+        """Test paging through all services with the next page cursor"""
+        response = self.client.get(self.list_url, {'page_size': 1})
+        first_page = response.json()['data']
+        cursor = response['X-Next-Cursor']
+        self.assertIn('rel="next"', response['Link'])
+
+        response = self.client.get(self.list_url, {'page_size': 1, 'cursor': cursor})
+        second_page = response.json()['data']
+        self.assertNotIn('X-Next-Cursor', response)
+        self.assertEqual(
+            [service['id'] for service in first_page + second_page],
+            list(Service.objects.order_by('id').values_list('id', flat=True))
+        )
+
+    @override_settings(PAGINATION_DEFAULT_PAGE_SIZE=1)
+    def test_list_services_without_cursor_returns_all(self):
+        """Test that clients that don't page still get every service"""
+        response = self.client.get(self.list_url)
+
+        self.assertEqual(len(response.json()['data']), Service.objects.count())
+        self.assertGreater(Service.objects.count(), 1)
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_list_services_invalid_cursor(self):
+        """Test listing services with a tampered cursor"""
+        response = self.client.get(self.list_url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['error'], 'Invalid cursor')
+
 class ListServiceHairdresserTest(TestCase):
     def setUp(self):
         """
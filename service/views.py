@@ -5,6 +5,7 @@ from service.serializers import ServiceSerializer, ServiceWithHairdresserSeriali
 from rest_framework.views import APIView
 from django.http import JsonResponse
 from agenda.models import Agenda
+from hairmatch.pagination import InvalidCursor, paginate, set_next_cursor
 import json
 # Create your views here.
 
@@ -41,9 +42,12 @@ class ListService(APIView):
             result = ServiceSerializer(service).data
             return JsonResponse({'data': result}, status=200)
         
-        services = Service.objects.all()
+        try:
+            services, next_cursor = paginate(request, Service.objects.order_by('id'), paged_by_default=False)
+        except InvalidCursor as error:
+            return JsonResponse({'error': str(error)}, status=400)
         result = ServiceSerializer(services, many=True).data 
-        return JsonResponse({'data': result}, status=200)
+        return set_next_cursor(JsonResponse({'data': result}, status=200), request, next_cursor)
 
 class ListServiceHairdresser(APIView):
     def get(self, request, hairdresser_id):
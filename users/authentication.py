@@ -0,0 +1,107 @@
+import jwt
+from django.http import JsonResponse
+
+from .identity_cache import identity_cache
+from .models import User, Customer, Hairdresser
+
+# Every cookie-protected view authenticates through this module. The middleware
+# decodes the 'jwt' cookie once per request and attaches the outcome to it:
+#   request.jwt_payload - the decoded payload, or None
+#   request.jwt_error   - None, or one of the TOKEN_* reasons below
+# The user is only loaded when a view asks for it through get_authenticated_user,
+# in a single query joined with the Customer/Hairdresser profile, and is then
+# served from users.identity_cache for the same token.
+
+JWT_COOKIE = 'jwt'
+JWT_SECRET = 'secret'
+JWT_ALGORITHM = 'HS256'
+
+TOKEN_MISSING = 'missing'
+TOKEN_EXPIRED = 'expired'
+TOKEN_INVALID = 'invalid'
+
+
+def decode_token(token):
+    """
+    Returns a (payload, error) pair for a raw token; error is None when the
+    token is valid and carries a user id.
+    """
+    if not token:
+        return None, TOKEN_MISSING
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        return None, TOKEN_EXPIRED
+    except jwt.InvalidTokenError:
+        return None, TOKEN_INVALID
+    if 'id' not in payload:
+        return None, TOKEN_INVALID
+    return payload, None
+
+
+class JWTAuthenticationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.jwt_payload, request.jwt_error = decode_token(request.COOKIES.get(JWT_COOKIE))
+        return self.get_response(request)
+
+
+def get_authenticated_user(request):
+    """
+    Returns the User behind the request's token (with the customer and
+    hairdresser profiles already joined), or None when there is no valid token
+    or the user no longer exists. The result is memoized on the request.
+    """
+    request = getattr(request, '_request', request)
+    if not hasattr(request, '_authenticated_user'):
+        payload = getattr(request, 'jwt_payload', None)
+        request._authenticated_user = load_user(payload['id'], payload.get('iat')) if payload else None
+    return request._authenticated_user
+
+
+def load_user(user_id, issued_at):
+    """
+    Returns the user with both role profiles joined, from users.identity_cache
+    when this token was resolved recently.
+    """
+    user = identity_cache.get(user_id, issued_at)
+    if user is None:
+        generation = identity_cache.generation(user_id)
+        user = User.objects.select_related('customer', 'hairdresser').filter(id=user_id).first()
+        if user is not None:
+            identity_cache.set(user_id, issued_at, user, generation)
+    return user
+
+
+def get_customer(user):
+    """
+    Returns the user's Customer profile from the joined row, or None.
+    """
+    try:
+        return user.customer
+    except (AttributeError, Customer.DoesNotExist):
+        return None
+
+
+def get_hairdresser(user):
+    """
+    Returns the user's Hairdresser profile from the joined row, or None.
+    """
+    try:
+        return user.hairdresser
+    except (AttributeError, Hairdresser.DoesNotExist):
+        return None
+
+
+def token_error_response(request, missing_message='Invalid token', expired_message='Token expired', status=403):
+    """
+    Returns the error response for a request without a valid token, or None
+    when the token is fine. Invalid tokens get the same answer as missing ones.
+    """
+    if request.jwt_error == TOKEN_EXPIRED:
+        return JsonResponse({'error': expired_message}, status=status)
+    if request.jwt_error:
+        return JsonResponse({'error': missing_message}, status=status)
+    return None
@@ -0,0 +1,99 @@
+from bisect import bisect_left
+
+from .refresh import Refresher
+from .search import fold_text
+
+# Typeahead suggestions for the search box, answered from a sorted array of
+# accent-folded keys with bisect. Every label is stored under its full text and
+# under each of its later words, so 'silva' suggests 'Maria Silva' and
+# 'maria si' does too. Hairdressers and preferences are suggested with their id;
+# neighborhoods and service names are plain search terms and carry no id.
+#
+# Each process builds the array on its first request. Committed writes to the
+# source models mark it dirty (see users/signals.py), and it is also considered
+# stale after AUTOCOMPLETE_REFRESH_SECONDS so other workers' writes show up.
+# Either way it is rebuilt in a background thread while the old array keeps
+# answering (users/refresh.py), so a keystroke never waits on the database after
+# the first build.
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        # (sorted keys, entry of each key), swapped as one object on rebuild
+        self._array = ([], [])
+        self._refresher = Refresher(self._rebuild, 'AUTOCOMPLETE_REFRESH_SECONDS')
+
+    def __len__(self):
+        return len(self._array[0])
+
+    @property
+    def dirty(self):
+        return self._refresher.dirty
+
+    def suggest(self, prefix, limit):
+        """
+        Returns up to `limit` {'id', 'label', 'type'} dicts whose label has a
+        word starting with the prefix.
+        """
+        prefix = ' '.join(fold_text(prefix).split())
+        if not prefix:
+            return []
+
+        self._refresher.ensure_fresh()
+        keys, entries = self._array
+        suggestions = []
+        seen = set()
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix) and len(suggestions) < limit:
+            entry = entries[position]
+            if entry not in seen:
+                seen.add(entry)
+                suggestion_type, suggestion_id, label = entry
+                suggestions.append({'id': suggestion_id, 'label': label, 'type': suggestion_type})
+            position += 1
+        return suggestions
+
+    def build(self):
+        """
+        Reads every label from the database and swaps in a new array.
+        """
+        self._refresher.refresh()
+
+    def _rebuild(self):
+        from preferences.models import Preferences
+        from service.models import Service
+        from .models import Hairdresser
+
+        entries = set()
+        hairdressers = Hairdresser.objects.filter(user__is_active=True).values_list(
+            'id', 'user__first_name', 'user__last_name', 'user__neighborhood'
+        )
+        for hairdresser_id, first_name, last_name, neighborhood in hairdressers.iterator():
+            entries.add(('hairdresser', hairdresser_id, f'{first_name} {last_name}'.strip()))
+            entries.add(('neighborhood', None, neighborhood))
+        for preference_id, name in Preferences.objects.values_list('id', 'name').iterator():
+            entries.add(('preference', preference_id, name))
+        for name in Service.objects.values_list('name', flat=True).distinct().iterator():
+            entries.add(('service', None, name))
+
+        keyed = sorted(
+            (key, entry)
+            for entry in entries if entry[2]
+            for key in label_keys(entry[2])
+        )
+        self._array = ([key for key, _ in keyed], [entry for _, entry in keyed])
+
+    def invalidate(self):
+        self._refresher.invalidate()
+
+    def reset(self):
+        self._array = ([], [])
+        self._refresher.reset()
+
+
+def label_keys(label):
+    words = fold_text(label).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+autocomplete_index = AutocompleteIndex()
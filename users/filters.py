@@ -1,8 +1,6 @@
 import django_filters
-from django.db.models import Q
 from .models import Hairdresser
-import operator
-from functools import reduce
+from .search import search_hairdressers
 
 class HairdresserFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(
@@ -17,30 +15,10 @@ class HairdresserFilter(django_filters.FilterSet):
     def universal_search(self, queryset, name, value):
         if not value.strip():
             return queryset
-        search_terms = value.split()
-        
-        search_fields = [
-            'user__first_name',
-            'user__last_name',
-            'user__city',
-            'user__address',
-            'user__neighborhood',
-            'resume',
-            'user__preferences__name'
-        ]
 
-        # Build a query using Q objects for each search term
-        # This creates a series of OR conditions for each term across all fields,
-        # and then ANDs the results for each term together.
+        # Every term must appear (accent- and case-insensitively) in at least one
+        # of the name, city, address, neighborhood, resume or preference fields.
         # For example, searching "John Manaus" will find hairdressers where
         # ("John" is in any field) AND ("Manaus" is in any field).
-        query = reduce(operator.and_,
-            (
-                reduce(operator.or_, 
-                    (Q(**{f'{field}__icontains': term}) for field in search_fields)
-                )
-                for term in search_terms
-            )
-        )
-        
-        return queryset.filter(query).distinct()
\ No newline at end of file
+        # See users/search.py for the indexed document this runs against.
+        return search_hairdressers(value, queryset)
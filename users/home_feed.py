@@ -0,0 +1,92 @@
+import threading
+
+from django.db.models import F
+
+from .refresh import Refresher
+
+# The category rails of the customer home page ("hairdressers_by_preferences")
+# are the same for every visitor, so each process keeps them as a serialized
+# snapshot instead of querying them on every page load.
+#
+# Each snapshot carries a version, bumped on every rebuild. Committed writes to
+# users, hairdressers and preferences mark the snapshot dirty (users/signals.py),
+# and it also goes stale after HOME_FEED_REFRESH_SECONDS so other workers'
+# writes show up. A dirty or stale snapshot is rebuilt in a background thread
+# while the current one keeps being served; only the very first request of a
+# process builds it inline (users/refresh.py).
+
+HOME_FEED_CATEGORIES = [
+    ('Coloração', 'coloracao'),
+    ('Cachos', 'cachos'),
+    ('Barbearia', 'barbearia'),
+    ('Tranças', 'trancas'),
+]
+HOME_FEED_RAIL_SIZE = 10
+
+
+def build_category_rails():
+    """
+    Returns {category key: serialized hairdressers} for the home page rails,
+    best rated first.
+    """
+    from preferences.models import Preferences
+    from .models import Hairdresser
+    from .serializers import HairdresserSerializer
+
+    names = [name for name, _ in HOME_FEED_CATEGORIES]
+    preferences = {preference.name: preference for preference in Preferences.objects.filter(name__in=names)}
+
+    rails = {}
+    for name, key in HOME_FEED_CATEGORIES:
+        preference = preferences.get(name)
+        if preference is None:
+            rails[key] = []
+            continue
+        hairdressers = Hairdresser.objects.filter(
+            user__role='hairdresser',
+            user__preferences=preference
+        ).select_related('user').order_by(F('rating_mean').desc(nulls_last=True), 'id')[:HOME_FEED_RAIL_SIZE]
+        rails[key] = HairdresserSerializer(hairdressers, many=True).data
+    return rails
+
+
+class HomeFeed:
+    def __init__(self):
+        self.version = 0
+        self._rails = None
+        self._lock = threading.Lock()
+        self._refresher = Refresher(self._rebuild, 'HOME_FEED_REFRESH_SECONDS')
+
+    @property
+    def dirty(self):
+        return self._refresher.dirty
+
+    def rails(self):
+        """
+        Returns (version, rails) of the current snapshot.
+        """
+        self._refresher.ensure_fresh()
+        with self._lock:
+            return self.version, self._rails
+
+    def build(self):
+        self._refresher.refresh()
+        with self._lock:
+            return self.version, self._rails
+
+    def invalidate(self):
+        self._refresher.invalidate()
+
+    def reset(self):
+        with self._lock:
+            self._rails = None
+        self._refresher.reset()
+
+    def _rebuild(self):
+        rails = build_category_rails()
+        with self._lock:
+            self.version += 1
+            self._rails = rails
+
+
+home_feed = HomeFeed()
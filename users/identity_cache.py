@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+# Caches the User (with its Customer/Hairdresser profile joined in) resolved for
+# a token, keyed by (user id, token iat), so repeated calls with the same token
+# skip the identity query. Writes to the user or its profile invalidate every
+# entry of that user through the handlers in users/signals.py; the TTL bounds
+# how long another worker process can serve an identity changed elsewhere.
+# Callers always get their own copy, so mutating it never leaks into the cache.
+
+
+class IdentityCache:
+    """
+    Thread-safe LRU cache of authenticated users with a per-entry TTL.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # user_id -> keys cached for it (one per token iat)
+        self._keys_by_user = {}
+        # user_id -> invalidation counter, see generation()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, issued_at):
+        key = (user_id, issued_at)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            user = entry[1]
+        return copy.deepcopy(user)
+
+    def generation(self, user_id):
+        """
+        Returns the user's invalidation counter. Read it before querying the user
+        and hand it to set(), so a row loaded while it was being changed is never stored.
+        """
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def set(self, user_id, issued_at, user, generation=None):
+        if self.max_size <= 0:
+            return
+        key = (user_id, issued_at)
+        user = copy.deepcopy(user)
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id, 0):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(key)
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._generations.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def _discard(self, key):
+        # Caller must hold the lock
+        self._entries.pop(key, None)
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+
+identity_cache = IdentityCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL)
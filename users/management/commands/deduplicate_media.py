@@ -0,0 +1,52 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from hairmatch.images import IMAGE_VARIANTS, VARIANT_FORMATS, variant_name
+from hairmatch.storage import ContentAddressedStorage, is_content_addressed
+
+
+class Command(BaseCommand):
+    """
+    Moves media stored before the content-addressed storage onto it: each file
+    is re-saved under its digest, its rows are repointed, and the old copy is
+    removed once nothing refers to it. Duplicate copies collapse into one blob.
+    """
+
+    help = "Re-stores uploaded media under content hashes, merging duplicates"
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not hairmatch.storage.ContentAddressedStorage.")
+        moved = missing = 0
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if not isinstance(field, models.FileField):
+                    continue
+                names = (
+                    model._default_manager.exclude(**{field.name: ''})
+                    .exclude(**{f'{field.name}__isnull': True})
+                    .values_list(field.name, flat=True).distinct()
+                )
+                for name in list(names):
+                    if is_content_addressed(name):
+                        continue
+                    if not default_storage.exists(name):
+                        missing += 1
+                        continue
+                    with transaction.atomic():
+                        with default_storage.open(name, 'rb') as stored:
+                            new_name = default_storage.save(name, stored)
+                        model._default_manager.filter(**{field.name: name}).update(**{field.name: new_name})
+                    # Skipped while another field still holds the old name
+                    default_storage.delete(name)
+                    if not default_storage.exists(name):
+                        for variant in IMAGE_VARIANTS:
+                            for extension, _ in VARIANT_FORMATS:
+                                default_storage.delete(variant_name(name, variant, extension))
+                    moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Re-stored {moved} files, {missing} missing from storage."))
+        if moved:
+            self.stdout.write("Run generate_image_variants to create the variants of the re-stored pictures.")
@@ -0,0 +1,40 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from hairmatch.images import IMAGE_FIELDS, MARKER_VARIANT, process_picture, variant_name
+
+
+class Command(BaseCommand):
+    """
+    Generates the variants of pictures stored before the image pipeline existed
+    (or whose background processing failed), sanitizing them on the way.
+    """
+
+    help = "Generates thumbnails and WebP variants of stored pictures"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regenerate variants of pictures that already have them"
+        )
+
+    def handle(self, *args, **options):
+        processed = skipped = failed = 0
+        for app_label, model_name, field_name in IMAGE_FIELDS:
+            model = apps.get_model(app_label, model_name)
+            storage = model._meta.get_field(field_name).storage
+            rows = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list('pk', field_name)
+            )
+            for pk, name in rows.iterator():
+                if not options['force'] and storage.exists(variant_name(name, *MARKER_VARIANT)):
+                    skipped += 1
+                elif process_picture(model._meta.label, pk, field_name, name) is None:
+                    failed += 1
+                else:
+                    processed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} pictures, {skipped} already done, {failed} failed.")
+        )
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:30
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def fold_text(value):
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def backfill_search_documents(apps, schema_editor):
+    Hairdresser = apps.get_model('users', 'Hairdresser')
+    Preferences = apps.get_model('preferences', 'Preferences')
+
+    preference_names = {}
+    for user_id, name in Preferences.users.through.objects.values_list('user_id', 'preferences__name'):
+        preference_names.setdefault(user_id, []).append(name)
+
+    for hairdresser in Hairdresser.objects.select_related('user').iterator(chunk_size=500):
+        user = hairdresser.user
+        parts = [
+            user.first_name, user.last_name, user.city, user.address, user.neighborhood,
+            hairdresser.resume, *preference_names.get(user.id, [])
+        ]
+        document = '\n'.join(fold_text(part) for part in parts if part)
+        Hairdresser.objects.filter(pk=hairdresser.pk).update(search_document=document)
+
+
+# Postgres only: other backends search the plain column without indexes or ranking.
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        "ALTER TABLE users_hairdresser ADD COLUMN search_vector tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('portuguese'::regconfig, search_document)) STORED"
+    )
+    schema_editor.execute(
+        'CREATE INDEX users_hairdresser_search_vector_idx ON users_hairdresser USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX users_hairdresser_search_trgm_idx ON users_hairdresser USING gin (search_document gin_trgm_ops)'
+    )
+    # Matches the UPPER(name::text) LIKE UPPER(...) that name__icontains compiles to
+    schema_editor.execute(
+        'CREATE INDEX service_service_name_trgm_idx ON service_service USING gin ((UPPER(name::text)) gin_trgm_ops)'
+    )
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS service_service_name_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS users_hairdresser_search_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS users_hairdresser_search_vector_idx')
+    schema_editor.execute('ALTER TABLE users_hairdresser DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_profile_picture'),
+        ('preferences', '0003_preferences_services'),
+        ('service', '0002_service_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hairdresser',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:49
+
+from django.db import migrations, models
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Hairdresser = apps.get_model('users', 'Hairdresser')
+    Review = apps.get_model('review', 'Review')
+
+    aggregates = {}
+    for hairdresser_id, rating in Review.objects.values_list('hairdresser_id', 'rating').iterator():
+        values = aggregates.setdefault(hairdresser_id, {
+            'rating_count': 0, 'rating_sum': 0,
+            'rating_1': 0, 'rating_2': 0, 'rating_3': 0, 'rating_4': 0, 'rating_5': 0,
+        })
+        values['rating_count'] += 1
+        values['rating_sum'] += rating
+        values[f'rating_{min(5, max(1, int(rating + 0.5)))}'] += 1
+
+    for hairdresser_id, values in aggregates.items():
+        values['rating_mean'] = values['rating_sum'] / values['rating_count']
+        Hairdresser.objects.filter(pk=hairdresser_id).update(**values)
+
+
+# Matches the ORDER BY rating_mean DESC NULLS LAST, id of the rating sorted
+# listings. Postgres only: SQLite (local runs) cannot put NULLS LAST in an index.
+
+RATING_MEAN_INDEX = models.Index(
+    models.OrderBy(models.F('rating_mean'), descending=True, nulls_last=True), models.F('id'),
+    name='hairdresser_rating_mean_idx',
+)
+
+
+def add_rating_mean_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('users', 'Hairdresser'), RATING_MEAN_INDEX)
+
+
+def remove_rating_mean_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('users', 'Hairdresser'), RATING_MEAN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_hairdresser_search_document'),
+        ('review', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_mean',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hairdresser',
+            name='rating_sum',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='hairdresser',
+                    index=RATING_MEAN_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_rating_mean_index, remove_rating_mean_index),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -49,4 +49,21 @@ class Hairdresser(models.Model):
     cnpj = models.CharField(max_length=14, blank=False, null=False)
     experience_time = models.CharField(max_length=255, blank=True, null=True)
     experiences = models.CharField(max_length=255, blank=True, null=True)
-    products = models.CharField(max_length=255, blank=True, null=True)
\ No newline at end of file
+    products = models.CharField(max_length=255, blank=True, null=True)
+    # Accent-folded text searched by users.search, maintained by users/signals.py
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    # Review aggregates, maintained by review/ratings.py
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.FloatField(default=0, editable=False)
+    rating_mean = models.FloatField(blank=True, null=True, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(models.F('rating_mean').desc(nulls_last=True), 'id', name='hairdresser_rating_mean_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import threading
+
+import bcrypt
+from django.conf import settings
+
+# All bcrypt work runs on a small dedicated thread pool. bcrypt releases the GIL
+# while hashing, so at most PASSWORD_HASHER_WORKERS hashes burn CPU at once no
+# matter how many requests are logging in, and the web threads waiting on them
+# leave the rest of the CPU to fast requests. Once PASSWORD_HASHER_MAX_PENDING
+# calls are queued, new ones fail fast with PasswordHasherBusy instead of piling up.
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when the hashing pool is saturated or a hash did not finish in time.
+    """
+
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHER_WORKERS, thread_name_prefix='bcrypt')
+_capacity = threading.BoundedSemaphore(settings.PASSWORD_HASHER_WORKERS + settings.PASSWORD_HASHER_MAX_PENDING)
+
+
+def _run(function, *args):
+    if not _capacity.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _executor.submit(function, *args)
+    except BaseException:
+        _capacity.release()
+        raise
+    future.add_done_callback(lambda _: _capacity.release())
+
+    try:
+        return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT)
+    except TimeoutError as error:
+        raise PasswordHasherBusy() from error
+
+
+def _hash(raw_password, rounds):
+    return bcrypt.hashpw(raw_password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(raw_password, hashed_password):
+    try:
+        return bcrypt.checkpw(raw_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        # Not a bcrypt hash (e.g., a row created by hand)
+        return False
+
+
+def hash_password(raw_password):
+    """
+    Hashes a password with the configured BCRYPT_ROUNDS cost factor.
+    """
+    return _run(_hash, raw_password, settings.BCRYPT_ROUNDS)
+
+
+def check_password(raw_password, hashed_password):
+    return _run(_check, raw_password, hashed_password)
+
+
+def hash_rounds(hashed_password):
+    """
+    Returns the cost factor stored in a bcrypt hash ('$2b$12$...'), or None.
+    """
+    try:
+        return int(hashed_password.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed_password):
+    return hash_rounds(hashed_password) != settings.BCRYPT_ROUNDS
+
+
+def verify_and_upgrade(user, raw_password):
+    """
+    Checks a login attempt against the user's hash. When it matches and the hash
+    was made with a different cost factor, the password is rehashed and saved,
+    so changing BCRYPT_ROUNDS migrates users as they log in.
+    """
+    if not check_password(raw_password, user.password):
+        return False
+
+    if needs_rehash(user.password):
+        user.password = hash_password(raw_password)
+        # update() sends no post_save: the search, feed and ranking handlers
+        # don't depend on the password and must not rebuild on every login
+        type(user).objects.filter(pk=user.pk).update(password=user.password)
+    return True
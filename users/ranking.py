@@ -0,0 +1,170 @@
+import heapq
+import math
+import threading
+
+from .refresh import Refresher
+from .search import fold_text
+
+# Ranks the hairdressers of a customer's "for_you" feed.
+#
+# Each process keeps the hairdresser x preference incidence as sparse postings
+# (preference id -> hairdresser ids) next to a small profile per hairdresser
+# (rating, city, neighborhood). Ranking only walks the postings of the
+# customer's own preferences, so its cost follows the number of matching
+# hairdressers rather than the size of the table, and only the top
+# FOR_YOU_LIMIT rows are then read from the database and serialized.
+#
+# A hairdresser's score mixes three parts, each in [0, 1]:
+#   overlap:  shared preferences, each weighted by how rare it is among
+#             hairdressers (1 + log(hairdressers / hairdressers with it)),
+#             over the customer's total weight
+#   rating:   mean review rating / 5, or the user's rating before any review
+#   locality: 1 in the customer's neighborhood, 0.5 in the same city
+#
+# Committed preference assignments and profile changes re-read the affected
+# hairdressers (users/signals.py). The whole structure is also rebuilt in the
+# background every RANKING_REFRESH_SECONDS to pick up other workers' writes
+# (users/refresh.py).
+
+OVERLAP_WEIGHT = 0.6
+RATING_WEIGHT = 0.25
+LOCALITY_WEIGHT = 0.15
+MAX_RATING = 5
+
+
+class PreferenceRanking:
+    def __init__(self):
+        self._postings = {}
+        self._preferences = {}
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._refresher = Refresher(self._rebuild, 'RANKING_REFRESH_SECONDS')
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def rank(self, preference_ids, city, neighborhood, limit):
+        """
+        Returns the ids of the best `limit` hairdressers sharing at least one of
+        the preferences, best first.
+        """
+        self._refresher.ensure_fresh()
+        city, neighborhood = fold_text(city), fold_text(neighborhood)
+
+        with self._lock:
+            total = len(self._profiles)
+            weights = {
+                preference_id: 1 + math.log(total / len(self._postings[preference_id]))
+                for preference_id in set(preference_ids) if self._postings.get(preference_id)
+            }
+            if not weights:
+                return []
+            total_weight = sum(weights.values())
+
+            overlap = {}
+            for preference_id, weight in weights.items():
+                for hairdresser_id in self._postings[preference_id]:
+                    overlap[hairdresser_id] = overlap.get(hairdresser_id, 0) + weight
+
+            scored = []
+            for hairdresser_id, shared_weight in overlap.items():
+                rating, hairdresser_city, hairdresser_neighborhood = self._profiles[hairdresser_id]
+                if hairdresser_city == city:
+                    locality = 1 if hairdresser_neighborhood == neighborhood else 0.5
+                else:
+                    locality = 0
+                score = (
+                    OVERLAP_WEIGHT * shared_weight / total_weight
+                    + RATING_WEIGHT * min(rating or 0, MAX_RATING) / MAX_RATING
+                    + LOCALITY_WEIGHT * locality
+                )
+                # Ties go to the oldest hairdresser
+                scored.append((score, -hairdresser_id))
+
+        return [-negated_id for _, negated_id in heapq.nlargest(limit, scored)]
+
+    def build(self):
+        """
+        Reads every hairdresser and preference assignment from the database.
+        """
+        self._refresher.refresh()
+
+    def _rebuild(self):
+        from .models import Hairdresser
+
+        ranking = PreferenceRanking()
+        ranking._load(Hairdresser.objects.all())
+        with self._lock:
+            self._postings, self._preferences, self._profiles = (
+                ranking._postings, ranking._preferences, ranking._profiles
+            )
+
+    def refresh_users(self, user_ids):
+        """
+        Re-reads the hairdressers of the given users, dropping those that are gone.
+        """
+        from .models import Hairdresser
+
+        if not self._refresher.built or not user_ids:
+            return
+        user_ids = set(user_ids)
+        fresh = PreferenceRanking()
+        fresh._load(Hairdresser.objects.filter(user_id__in=user_ids))
+
+        with self._lock:
+            stale_ids = [
+                hairdresser_id for hairdresser_id, (user_id, _) in self._preferences.items()
+                if user_id in user_ids
+            ]
+            for hairdresser_id in stale_ids:
+                self._remove(hairdresser_id)
+            for hairdresser_id, profile in fresh._profiles.items():
+                self._profiles[hairdresser_id] = profile
+                user_id, preference_ids = fresh._preferences[hairdresser_id]
+                self._preferences[hairdresser_id] = (user_id, preference_ids)
+                for preference_id in preference_ids:
+                    self._postings.setdefault(preference_id, set()).add(hairdresser_id)
+
+    def remove_hairdresser(self, hairdresser_id):
+        with self._lock:
+            self._remove(hairdresser_id)
+
+    def reset(self):
+        with self._lock:
+            self._postings, self._preferences, self._profiles = {}, {}, {}
+        self._refresher.reset()
+
+    def _load(self, hairdressers):
+        # Fills this (private, unshared) instance from a Hairdresser queryset
+        from preferences.models import Preferences
+
+        rows = hairdressers.values_list(
+            'id', 'user_id', 'rating_mean', 'user__rating', 'user__city', 'user__neighborhood'
+        )
+        user_hairdresser = {}
+        for hairdresser_id, user_id, rating_mean, user_rating, city, neighborhood in rows.iterator():
+            rating = user_rating if rating_mean is None else rating_mean
+            self._profiles[hairdresser_id] = (rating, fold_text(city), fold_text(neighborhood))
+            self._preferences[hairdresser_id] = (user_id, set())
+            user_hairdresser[user_id] = hairdresser_id
+
+        assignments = Preferences.users.through.objects.filter(user_id__in=hairdressers.values('user_id'))
+        for user_id, preference_id in assignments.values_list('user_id', 'preferences_id').iterator():
+            hairdresser_id = user_hairdresser.get(user_id)
+            if hairdresser_id is not None:
+                self._preferences[hairdresser_id][1].add(preference_id)
+                self._postings.setdefault(preference_id, set()).add(hairdresser_id)
+
+    def _remove(self, hairdresser_id):
+        # Caller must hold the lock
+        self._profiles.pop(hairdresser_id, None)
+        _, preference_ids = self._preferences.pop(hairdresser_id, (None, ()))
+        for preference_id in preference_ids:
+            postings = self._postings.get(preference_id)
+            if postings is not None:
+                postings.discard(hairdresser_id)
+                if not postings:
+                    del self._postings[preference_id]
+
+
+preference_ranking = PreferenceRanking()
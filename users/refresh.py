@@ -0,0 +1,90 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+# When the per-process structures (search_index, autocomplete, home_feed,
+# ranking) are rebuilt from the database.
+#
+# The first request of a process builds inline; concurrent first requests wait
+# for that one build instead of each running their own. Afterwards a structure
+# that is dirty (a committed write called invalidate()) or older than its
+# *_REFRESH_SECONDS setting is rebuilt by a single background thread, while
+# readers keep using the current data.
+
+
+class Refresher:
+    def __init__(self, rebuild, max_age_setting):
+        # rebuild() reads the database and swaps the owner's data in
+        self._rebuild = rebuild
+        self._max_age_setting = max_age_setting
+        self._lock = threading.Lock()
+        self._first_build_lock = threading.Lock()
+        self._refreshing = False
+        self._generation = 0
+        self._built_generation = 0
+        self.built_at = None
+
+    @property
+    def built(self):
+        return self.built_at is not None
+
+    @property
+    def dirty(self):
+        return self._built_generation != self._generation
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def ensure_fresh(self):
+        """
+        Builds inline if nothing was built yet; otherwise starts a background
+        rebuild when the data is dirty or stale, and returns at once.
+        """
+        with self._lock:
+            if self.built_at is not None:
+                max_age = getattr(settings, self._max_age_setting)
+                stale = self.dirty or time.monotonic() - self.built_at > max_age
+                if not stale or self._refreshing:
+                    return
+                self._refreshing = True
+                first_build = False
+            else:
+                first_build = True
+
+        if not first_build:
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+            return
+        with self._first_build_lock:
+            # Another request may have finished the first build while this one waited
+            if self.built_at is None:
+                self.refresh()
+
+    def refresh(self):
+        """
+        Rebuilds now, in the calling thread.
+        """
+        with self._lock:
+            generation = self._generation
+        self._rebuild()
+        with self._lock:
+            self.built_at = time.monotonic()
+            # A write committed while rebuilding leaves the data dirty
+            self._built_generation = generation
+
+    def reset(self):
+        with self._lock:
+            self.built_at = None
+            self._generation = self._built_generation = 0
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+            # This thread opened its own connection; don't leave it behind
+            close_old_connections()
+            connection.close()
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import Hairdresser
+
+# Hairdresser search runs against Hairdresser.search_document: the searchable
+# fields (names, city, address, neighborhood, resume and preference names)
+# accent-folded, lower-cased and joined one per line. The document is rebuilt
+# by the signal handlers in users/signals.py whenever one of its sources changes.
+#
+# On PostgreSQL, migration users/0005 adds a trigram GIN index on the document,
+# which serves the per-term substring filters, and a generated tsvector column
+# ('portuguese' config) with its own GIN index, used to rank the matches. Text is
+# folded in Python because unaccent() is not immutable and so cannot back a
+# generated column or an index. Other databases run the same filters unranked.
+
+SEARCH_VECTOR_COLUMN = 'search_vector'
+
+
+def fold_text(value):
+    """
+    Lower-cases a string and strips its accents ('Coloração' -> 'coloracao').
+    """
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def build_search_document(hairdresser, preference_names=None):
+    """
+    Returns the search document of a hairdresser. preference_names may be given
+    to avoid querying the user's preferences.
+    """
+    user = hairdresser.user
+    if preference_names is None:
+        preference_names = user.preferences.values_list('name', flat=True)
+
+    parts = [
+        user.first_name, user.last_name, user.city, user.address, user.neighborhood,
+        hairdresser.resume, *preference_names
+    ]
+    return '\n'.join(fold_text(part) for part in parts if part)
+
+
+def refresh_search_documents(hairdressers):
+    """
+    Rebuilds the search document of every hairdresser in the queryset, writing
+    only the rows whose document actually changed. Returns {id: document} for
+    those rows.
+    """
+    changed = {}
+    hairdressers = hairdressers.select_related('user').prefetch_related('user__preferences')
+    for hairdresser in hairdressers:
+        document = build_search_document(
+            hairdresser, [preference.name for preference in hairdresser.user.preferences.all()]
+        )
+        if document != hairdresser.search_document:
+            Hairdresser.objects.filter(pk=hairdresser.pk).update(search_document=document)
+            changed[hairdresser.pk] = document
+    return changed
+
+
+def search_terms(value):
+    return [fold_text(term) for term in (value or '').split()]
+
+
+def search_hairdressers(value, queryset=None):
+    """
+    Returns the hairdressers matching every term of the query somewhere in their
+    search document, best matches first on PostgreSQL.
+    """
+    queryset = Hairdresser.objects.all() if queryset is None else queryset
+    terms = search_terms(value)
+    if not terms:
+        return queryset
+
+    for term in terms:
+        queryset = queryset.filter(search_document__contains=term)
+
+    if connection.vendor != 'postgresql':
+        return queryset.order_by('id')
+
+    # Prefix-match every word of the query so partially typed terms still rank
+    words = re.findall(r'[^\W_]+', ' '.join(terms))
+    if not words:
+        return queryset.order_by('id')
+    ts_query = ' | '.join(f'{word}:*' for word in words)
+    rank = RawSQL(
+        f"ts_rank({Hairdresser._meta.db_table}.{SEARCH_VECTOR_COLUMN}, to_tsquery('portuguese', %s))",
+        (ts_query,)
+    )
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', 'id')
@@ -0,0 +1,158 @@
+from bisect import bisect_left, insort
+import re
+import threading
+
+from django.conf import settings
+
+from .refresh import Refresher
+from .search import fold_text
+
+# Optional in-memory inverted index answering GlobalSearchView without touching
+# the database until the matched page is fetched (SEARCH_INDEX_ENABLED).
+#
+# Hairdressers are indexed by the words of Hairdresser.search_document and
+# services by the words of their name, all accent-folded and lower-cased. A
+# query term matches any indexed word it is a prefix of, and a document must
+# match every term. Matches are ranked by how many terms hit a whole word.
+#
+# The index is built on the first search after startup and kept current by the
+# signal handlers in users/signals.py once each write commits. Writes made by
+# other worker processes are picked up by a background rebuild every
+# SEARCH_INDEX_REFRESH_SECONDS (users/refresh.py).
+
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def index_words(text):
+    return set(WORD_PATTERN.findall(fold_text(text)))
+
+
+class InvertedIndex:
+    """
+    Word -> document id postings with a sorted vocabulary for prefix lookups.
+    Not thread-safe on its own; SearchIndex serialises access.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._words_by_document = {}
+        self._vocabulary = []
+
+    def __len__(self):
+        return len(self._words_by_document)
+
+    def update(self, document_id, text):
+        self.remove(document_id)
+        words = index_words(text)
+        self._words_by_document[document_id] = words
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = set()
+                insort(self._vocabulary, word)
+            postings.add(document_id)
+
+    def remove(self, document_id):
+        for word in self._words_by_document.pop(document_id, ()):
+            postings = self._postings[word]
+            postings.discard(document_id)
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+
+    def search(self, terms):
+        """
+        Returns the ids of the documents matching every term, best first.
+        """
+        scores = None
+        for term in terms:
+            exact = self._postings.get(term, set())
+            matches = set(exact)
+            position = bisect_left(self._vocabulary, term)
+            while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+                matches |= self._postings[self._vocabulary[position]]
+                position += 1
+
+            if scores is None:
+                scores = {document_id: 0 for document_id in matches}
+            else:
+                scores = {document_id: score for document_id, score in scores.items() if document_id in matches}
+            for document_id in exact:
+                if document_id in scores:
+                    scores[document_id] += 1
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda document_id: (-scores[document_id], document_id))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.hairdressers = InvertedIndex()
+        self.services = InvertedIndex()
+        self._lock = threading.Lock()
+        self._refresher = Refresher(self._rebuild, 'SEARCH_INDEX_REFRESH_SECONDS')
+
+    @property
+    def enabled(self):
+        return settings.SEARCH_INDEX_ENABLED
+
+    def search(self, value):
+        """
+        Returns (hairdresser_ids, service_ids) ranked for the query.
+        """
+        terms = [word for term in (value or '').split() for word in WORD_PATTERN.findall(fold_text(term))]
+        if not terms:
+            return [], []
+
+        self._refresher.ensure_fresh()
+        with self._lock:
+            return self.hairdressers.search(terms), self.services.search(terms)
+
+    def build(self):
+        """
+        Rebuilds both indexes from the database and swaps them in.
+        """
+        self._refresher.refresh()
+
+    def _rebuild(self):
+        from service.models import Service
+        from .models import Hairdresser
+
+        hairdressers = InvertedIndex()
+        for hairdresser_id, document in Hairdresser.objects.values_list('id', 'search_document').iterator():
+            hairdressers.update(hairdresser_id, document)
+        services = InvertedIndex()
+        for service_id, name in Service.objects.values_list('id', 'name').iterator():
+            services.update(service_id, name)
+
+        with self._lock:
+            self.hairdressers, self.services = hairdressers, services
+
+    def update_hairdresser(self, hairdresser_id, document):
+        self._apply(self.hairdressers.update, hairdresser_id, document)
+
+    def remove_hairdresser(self, hairdresser_id):
+        self._apply(self.hairdressers.remove, hairdresser_id)
+
+    def update_service(self, service_id, name):
+        self._apply(self.services.update, service_id, name)
+
+    def remove_service(self, service_id):
+        self._apply(self.services.remove, service_id)
+
+    def reset(self):
+        with self._lock:
+            self.hairdressers = InvertedIndex()
+            self.services = InvertedIndex()
+        self._refresher.reset()
+
+    def _apply(self, operation, *args):
+        # Until the first build there is nothing to keep current: the build reads
+        # the committed rows anyway.
+        with self._lock:
+            if self._refresher.built:
+                operation(*args)
+
+
+search_index = SearchIndex()
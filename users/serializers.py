@@ -1,13 +1,16 @@
 from rest_framework import serializers
+from hairmatch.images import ImageVariantsField
 from .models import User, Hairdresser, Customer
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
     class Meta:
         model = User
         fields = [
             'id', 'first_name', 'last_name', 'email', 'phone', 
             'address', 'number', 'postal_code', 'rating', 'role',
-            'complement', 'neighborhood', 'city', 'state', 'profile_picture'
+            'complement', 'neighborhood', 'city', 'state', 'profile_picture',
+            'profile_picture_variants'
         ]
 
 class UserNameSerializer(serializers.ModelSerializer):
@@ -23,13 +26,13 @@ class HairdresserSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     class Meta:
         model = Hairdresser
-        exclude = ('experience_time', 'products', 'experiences', 'experience_years') 
+        exclude = ('experience_time', 'products', 'experiences', 'experience_years', 'search_document') 
 
 class HairdresserFullInfoSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     class Meta:
         model = Hairdresser
-        exclude = ['cnpj']
+        exclude = ['cnpj', 'search_document']
 
 class HairdresserNameSerializer(serializers.ModelSerializer):
     user = UserNameSerializer(read_only=True)
@@ -0,0 +1,217 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from hairmatch.images import IMAGE_FIELDS, schedule_variants
+from preferences.models import Preferences
+from service.models import Service
+from .autocomplete import autocomplete_index
+from .home_feed import home_feed
+from .ranking import preference_ranking
+from .identity_cache import identity_cache
+from .models import User, Customer, Hairdresser
+from .search import build_search_document, refresh_search_documents
+from .search_index import search_index
+
+# Keeps users.identity_cache in sync with the user row and its role profile.
+# Each invalidation runs again once the transaction commits, dropping anything
+# another request loaded from the rows as they were before the commit.
+
+
+def invalidate_identity(user_id):
+    identity_cache.invalidate_user(user_id)
+    transaction.on_commit(lambda: identity_cache.invalidate_user(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.id)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Hairdresser)
+@receiver(post_delete, sender=Hairdresser)
+def invalidate_profile_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.user_id)
+
+
+# Keeps Hairdresser.search_document (see users/search.py) in sync with the user
+# fields, resume and preference names it is built from.
+
+@receiver(pre_save, sender=Hairdresser)
+def build_hairdresser_search_document(sender, instance, **kwargs):
+    instance.search_document = build_search_document(instance)
+
+
+@receiver(post_save, sender=User)
+def refresh_user_search_document(sender, instance, **kwargs):
+    refresh_hairdresser_documents(Hairdresser.objects.filter(user=instance))
+
+
+@receiver(m2m_changed, sender=Preferences.users.through)
+def refresh_preference_search_documents(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=True: user.preferences.<action>() on a User; otherwise
+    # preference.users.<action>() on a Preferences, with pk_set holding user ids
+    if action == 'pre_clear' and not reverse:
+        instance._search_user_ids = list(instance.users.values_list('id', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        user_ids = [instance.pk]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_search_user_ids', [])
+    else:
+        user_ids = pk_set or []
+    refresh_hairdresser_documents(Hairdresser.objects.filter(user_id__in=user_ids))
+    refresh_ranking(user_ids)
+
+
+@receiver(pre_save, sender=Preferences)
+def remember_preference_name(sender, instance, **kwargs):
+    instance._previous_search_name = (
+        Preferences.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Preferences)
+def refresh_renamed_preference_search_documents(sender, instance, created, **kwargs):
+    if not created and instance._previous_search_name != instance.name:
+        refresh_hairdresser_documents(Hairdresser.objects.filter(user__preferences=instance))
+
+
+@receiver(pre_delete, sender=Preferences)
+def remember_preference_users(sender, instance, **kwargs):
+    instance._search_user_ids = list(instance.users.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Preferences)
+def refresh_deleted_preference_search_documents(sender, instance, **kwargs):
+    refresh_hairdresser_documents(Hairdresser.objects.filter(user_id__in=instance._search_user_ids))
+    refresh_ranking(instance._search_user_ids)
+
+
+# Keeps the in-memory search index (users/search_index.py) in step with the
+# search documents and service names. Changes are applied once they commit, so
+# a rolled back write never shows up in search results.
+
+def refresh_hairdresser_documents(hairdressers):
+    changed = refresh_search_documents(hairdressers)
+    if changed and search_index.enabled:
+        transaction.on_commit(lambda: [
+            search_index.update_hairdresser(hairdresser_id, document)
+            for hairdresser_id, document in changed.items()
+        ])
+
+
+@receiver(post_save, sender=Hairdresser)
+def index_hairdresser(sender, instance, **kwargs):
+    if search_index.enabled:
+        hairdresser_id, document = instance.pk, instance.search_document
+        transaction.on_commit(lambda: search_index.update_hairdresser(hairdresser_id, document))
+
+
+@receiver(post_delete, sender=Hairdresser)
+def unindex_hairdresser(sender, instance, **kwargs):
+    if search_index.enabled:
+        hairdresser_id = instance.pk
+        transaction.on_commit(lambda: search_index.remove_hairdresser(hairdresser_id))
+
+
+@receiver(post_save, sender=Service)
+def index_service(sender, instance, **kwargs):
+    if search_index.enabled:
+        service_id, name = instance.pk, instance.name
+        transaction.on_commit(lambda: search_index.update_service(service_id, name))
+
+
+@receiver(post_delete, sender=Service)
+def unindex_service(sender, instance, **kwargs):
+    if search_index.enabled:
+        service_id = instance.pk
+        transaction.on_commit(lambda: search_index.remove_service(service_id))
+
+
+# Marks the autocomplete array (users/autocomplete.py) for a rebuild whenever one
+# of the labels it holds may have changed.
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Hairdresser)
+@receiver(post_delete, sender=Hairdresser)
+@receiver(post_save, sender=Preferences)
+@receiver(post_delete, sender=Preferences)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_autocomplete(sender, **kwargs):
+    transaction.on_commit(autocomplete_index.invalidate)
+
+
+# Marks the home page category rails (users/home_feed.py) for a rebuild when a
+# hairdresser, its user or preferences, or a preference itself changes.
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Hairdresser)
+@receiver(post_delete, sender=Hairdresser)
+@receiver(post_save, sender=Preferences)
+@receiver(post_delete, sender=Preferences)
+@receiver(m2m_changed, sender=Preferences.users.through)
+def invalidate_home_feed(sender, **kwargs):
+    transaction.on_commit(home_feed.invalidate)
+
+
+# Keeps the "for_you" ranking (users/ranking.py) in step with hairdresser
+# profiles and preference assignments once they commit. Assignment changes are
+# hooked into the search document handlers above, which already work out the
+# affected users.
+
+def refresh_ranking(user_ids):
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: preference_ranking.refresh_users(user_ids))
+
+
+@receiver(post_save, sender=User)
+def refresh_user_ranking(sender, instance, **kwargs):
+    refresh_ranking([instance.id])
+
+
+@receiver(post_save, sender=Hairdresser)
+def refresh_hairdresser_ranking(sender, instance, **kwargs):
+    refresh_ranking([instance.user_id])
+
+
+@receiver(post_delete, sender=Hairdresser)
+def remove_hairdresser_ranking(sender, instance, **kwargs):
+    hairdresser_id = instance.pk
+    transaction.on_commit(lambda: preference_ranking.remove_hairdresser(hairdresser_id))
+
+
+# Generates the variants of newly uploaded pictures (hairmatch/images.py) once
+# their row commits. pre_save spots the upload: an assigned file that has not
+# been written to storage yet.
+
+def remember_new_picture(sender, instance, **kwargs):
+    field_name = IMAGE_FIELD_NAMES[sender]
+    field_file = getattr(instance, field_name)
+    instance._new_picture = bool(field_file) and not field_file._committed
+
+
+def generate_picture_variants(sender, instance, **kwargs):
+    if getattr(instance, '_new_picture', False):
+        instance._new_picture = False
+        schedule_variants(instance, IMAGE_FIELD_NAMES[sender])
+
+
+IMAGE_FIELD_NAMES = {}
+for app_label, model_name, field_name in IMAGE_FIELDS:
+    model = apps.get_model(app_label, model_name)
+    IMAGE_FIELD_NAMES[model] = field_name
+    pre_save.connect(remember_new_picture, sender=model, dispatch_uid=f'remember_new_picture_{model_name}')
+    post_save.connect(generate_picture_variants, sender=model, dispatch_uid=f'generate_picture_variants_{model_name}')
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -7,6 +7,23 @@ import jwt
 import datetime
 import bcrypt
 from .models import User, Customer, Hairdresser
+from .identity_cache import identity_cache
+from .passwords import PasswordHasherBusy, check_password, hash_password, hash_rounds
+from .throttling import TokenBucketStore, login_throttle
+from .search import fold_text, search_hairdressers
+from .serializers import HairdresserFullInfoSerializer, HairdresserSerializer
+from .search_index import InvertedIndex, search_index
+from .autocomplete import autocomplete_index
+from .home_feed import home_feed
+from .ranking import preference_ranking
+from .refresh import Refresher
+from django.conf import settings
+import threading
+import time
+from .authentication import (
+    JWTAuthenticationMiddleware, TOKEN_EXPIRED, TOKEN_INVALID, TOKEN_MISSING,
+    get_authenticated_user, get_customer, get_hairdresser
+)
 from preferences.models import Preferences
 from service.models import Service
 from unittest.mock import patch
@@ -208,6 +225,7 @@ class LoginViewTest(TestCase):
         self.client = APIClient()
         self.register_url = reverse('register')
         self.login_url = reverse('login')
+        login_throttle.clear()
         self.user_data = {
             'first_name': 'Test',
             'last_name': 'User',
@@ -306,6 +324,148 @@ class LoginViewTest(TestCase):
         self.assertFalse(response.json()['authenticated'])
 
 
+class PasswordHashingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = reverse('login')
+        self.user = User.objects.create(
+            email='hash@example.com',
+            password=bcrypt.hashpw(b'hash_password', bcrypt.gensalt(5)).decode('utf-8'),
+            phone='5592999991111',
+            role='customer'
+        )
+        login_throttle.clear()
+
+    def _login(self, password='hash_password'):
+        return self.client.post(
+            self.login_url,
+            data=json.dumps({'email': 'hash@example.com', 'password': password}),
+            content_type='application/json'
+        )
+
+    @override_settings(BCRYPT_ROUNDS=4)
+    def test_hash_and_check(self):
+        hashed = hash_password('secret_password')
+
+        self.assertEqual(hash_rounds(hashed), 4)
+        self.assertTrue(check_password('secret_password', hashed))
+        self.assertFalse(check_password('wrong_password', hashed))
+        self.assertFalse(check_password('secret_password', 'not-a-bcrypt-hash'))
+
+    @override_settings(BCRYPT_ROUNDS=4)
+    def test_login_rehashes_on_cost_change(self):
+        response = self._login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(hash_rounds(self.user.password), 4)
+        self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+
+    @override_settings(BCRYPT_ROUNDS=4)
+    def test_rehash_leaves_in_memory_structures_clean(self):
+        autocomplete_index.build()
+        home_feed.build()
+        self.addCleanup(autocomplete_index.reset)
+        self.addCleanup(home_feed.reset)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._login()
+
+        self.user.refresh_from_db()
+        self.assertEqual(hash_rounds(self.user.password), 4)
+        self.assertFalse(autocomplete_index.dirty)
+        self.assertFalse(home_feed.dirty)
+
+    @override_settings(BCRYPT_ROUNDS=5)
+    def test_login_keeps_hash_with_current_cost(self):
+        original_hash = self.user.password
+        self._login()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, original_hash)
+
+    @override_settings(BCRYPT_ROUNDS=4)
+    def test_wrong_password_is_not_rehashed(self):
+        original_hash = self.user.password
+        response = self._login('wrong_password')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, original_hash)
+
+    def test_busy_hasher_returns_503(self):
+        with patch('users.views.verify_and_upgrade', side_effect=PasswordHasherBusy):
+            response = self._login()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class LoginThrottleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.login_url = reverse('login')
+        self.user = User.objects.create(
+            email='throttle@example.com',
+            password=bcrypt.hashpw(b'throttle_password', bcrypt.gensalt(4)).decode('utf-8'),
+            phone='5592999992222',
+            role='customer'
+        )
+        login_throttle.clear()
+
+    def _login(self, email='throttle@example.com', password='wrong_password', ip='10.0.0.1'):
+        return self.client.post(
+            self.login_url,
+            data=json.dumps({'email': email, 'password': password}),
+            content_type='application/json',
+            REMOTE_ADDR=ip
+        )
+
+    def test_email_bucket_blocks_before_database(self):
+        for _ in range(settings.LOGIN_THROTTLE_EMAIL_BURST):
+            self.assertEqual(self._login().status_code, status.HTTP_403_FORBIDDEN)
+
+        with self.assertNumQueries(0):
+            response = self._login(email='THROTTLE@example.com ', ip='10.0.0.2')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(login_throttle.stats()['throttled_email'], 1)
+
+    def test_ip_bucket_blocks_many_accounts(self):
+        for attempt in range(settings.LOGIN_THROTTLE_IP_BURST):
+            self._login(email=f'user{attempt}@example.com')
+
+        response = self._login(email='another@example.com')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(login_throttle.stats()['throttled_ip'], 1)
+
+        # Other clients are unaffected
+        self.assertEqual(self._login(email='another@example.com', ip='10.0.0.3').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_successful_login_refunds_tokens(self):
+        for _ in range(settings.LOGIN_THROTTLE_EMAIL_BURST * 2):
+            self.assertEqual(self._login(password='throttle_password').status_code, status.HTTP_200_OK)
+
+        self.assertEqual(login_throttle.stats()['refunded'], settings.LOGIN_THROTTLE_EMAIL_BURST * 2)
+
+    def test_token_bucket_refill(self):
+        bucket = TokenBucketStore(burst=2, rate=1, max_keys=10)
+
+        self.assertEqual(bucket.consume('key'), 0)
+        self.assertEqual(bucket.consume('key'), 0)
+        self.assertGreater(bucket.consume('key'), 0)
+        with patch('users.throttling.time.monotonic', return_value=time.monotonic() + 1.5):
+            self.assertEqual(bucket.consume('key'), 0)
+
+    def test_stats_endpoint(self):
+        self._login()
+        response = self.client.get(reverse('login_throttle_stats'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data']['allowed'], 1)
+
+
 class LogoutViewTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -652,6 +812,124 @@ class UserInfoCookieViewTest(TestCase):
         self.assertIn('error', response.json())
 
 
+class JWTAuthenticationTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = JWTAuthenticationMiddleware(lambda request: None)
+        self.user = User.objects.create(
+            email='auth@example.com',
+            password='auth_password',
+            first_name='Auth',
+            last_name='Test',
+            phone='5592999990000',
+            role='customer'
+        )
+        self.customer = Customer.objects.create(user=self.user, cpf='12345678911')
+        identity_cache.clear()
+
+    def _request_with_token(self, token):
+        request = self.factory.get('/')
+        if token:
+            request.COOKIES['jwt'] = token
+        self.middleware(request)
+        return request
+
+    def _token(self, **overrides):
+        payload = {
+            'id': self.user.id,
+            'exp': datetime.datetime.now() + datetime.timedelta(minutes=60),
+            'iat': datetime.datetime.now()
+        }
+        payload.update(overrides)
+        return jwt.encode(payload, 'secret', algorithm='HS256')
+
+    def test_user_and_profile_loaded_in_one_query(self):
+        request = self._request_with_token(self._token())
+
+        with self.assertNumQueries(1):
+            user = get_authenticated_user(request)
+            self.assertEqual(get_customer(user), self.customer)
+            self.assertIsNone(get_hairdresser(user))
+            # Memoized on the request
+            self.assertIs(get_authenticated_user(request), user)
+
+    def test_token_errors(self):
+        self.assertEqual(self._request_with_token(None).jwt_error, TOKEN_MISSING)
+        self.assertEqual(self._request_with_token('not-a-token').jwt_error, TOKEN_INVALID)
+        expired = self._token(exp=datetime.datetime.now() - datetime.timedelta(minutes=5))
+        self.assertEqual(self._request_with_token(expired).jwt_error, TOKEN_EXPIRED)
+
+        request = self._request_with_token('not-a-token')
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_authenticated_user(request))
+
+    def test_identity_is_cached_per_token(self):
+        token = self._token()
+        get_authenticated_user(self._request_with_token(token))
+
+        with self.assertNumQueries(0):
+            user = get_authenticated_user(self._request_with_token(token))
+        self.assertEqual(get_customer(user), self.customer)
+
+        # A different token for the same user resolves on its own
+        other_token = self._token(iat=datetime.datetime.now() - datetime.timedelta(minutes=1))
+        with self.assertNumQueries(1):
+            get_authenticated_user(self._request_with_token(other_token))
+
+    def test_cached_copy_is_not_shared(self):
+        token = self._token()
+        user = get_authenticated_user(self._request_with_token(token))
+        user.first_name = 'Changed'
+
+        self.assertEqual(get_authenticated_user(self._request_with_token(token)).first_name, 'Auth')
+
+    def test_profile_change_invalidates_identity(self):
+        token = self._token()
+        get_authenticated_user(self._request_with_token(token))
+
+        self.customer.delete()
+        self.user.role = 'hairdresser'
+        self.user.save()
+        hairdresser = Hairdresser.objects.create(user=self.user, cnpj='12345678000111', experience_years=1)
+
+        user = get_authenticated_user(self._request_with_token(token))
+        self.assertEqual(user.role, 'hairdresser')
+        self.assertIsNone(get_customer(user))
+        self.assertEqual(get_hairdresser(user), hairdresser)
+
+    def test_user_update_view_invalidates_identity(self):
+        client = APIClient()
+        client.cookies['jwt'] = self._token()
+        client.get(reverse('user_info_auth'))
+
+        client.put(reverse('user_info_auth'), data=json.dumps({'email': 'auth@example.com', 'first_name': 'Renamed'}), content_type='application/json')
+        response = client.get(reverse('user_info_auth'))
+
+        self.assertEqual(response.json()['customer']['user']['first_name'], 'Renamed')
+
+    def test_user_update_view_keeps_changes_missing_from_the_cache(self):
+        client = APIClient()
+        client.cookies['jwt'] = self._token()
+        client.get(reverse('user_info_auth'))
+        # Written without signals, like the sanitized picture swap in hairmatch/images.py
+        User.objects.filter(pk=self.user.pk).update(profile_picture='profile_pics/sanitized.jpg', last_name='Elsewhere')
+
+        client.put(reverse('user_info_auth'), data=json.dumps({'email': 'auth@example.com', 'first_name': 'Renamed'}), content_type='application/json')
+        self.user.refresh_from_db()
+        self.assertEqual(
+            (self.user.first_name, self.user.last_name, self.user.profile_picture.name),
+            ('Renamed', 'Elsewhere', 'profile_pics/sanitized.jpg')
+        )
+
+    def test_invalid_token_is_rejected_by_views(self):
+        client = APIClient()
+        client.cookies['jwt'] = jwt.encode({'id': self.user.id}, 'wrong-secret', algorithm='HS256')
+
+        response = client.get(reverse('user_info_auth'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.json()['error'], 'Invalid token')
+
+
 class UserInfoViewTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -759,6 +1037,8 @@ class UserInfoViewTest(TestCase):
         
 class CustomerHomeViewTest(TestCase):
     def setUp(self):
+        home_feed.reset()
+        preference_ranking.reset()
         self.client = APIClient()
         self.register_url = reverse('register')
         
@@ -922,6 +1202,31 @@ class CustomerHomeViewTest(TestCase):
         trancas_emails = [h['user']['email'] for h in trancas_hairdressers]
         self.assertIn('hairdresser2@example.com', trancas_emails)
 
+    def test_category_rails_are_served_from_snapshot(self):
+        """Test that the category rails cost no queries once the snapshot exists"""
+        url = reverse('customer_home_info')
+        first = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['X-Home-Feed-Version'], first['X-Home-Feed-Version'])
+
+    def test_committed_changes_invalidate_snapshot(self):
+        """Test that a committed preference change makes the next build pick it up"""
+        version, rails = home_feed.rails()
+        self.assertNotIn('hairdresser1@example.com', [h['user']['email'] for h in rails['trancas']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trancas_pref.users.add(self.hairdresser_user_1)
+
+        self.assertTrue(home_feed.dirty)
+        # Rebuilt inline here; views leave that to a background thread
+        new_version, rails = home_feed.build()
+        self.assertEqual(new_version, version + 1)
+        self.assertIn('hairdresser1@example.com', [h['user']['email'] for h in rails['trancas']])
+
     def test_customer_home_nonexistent_customer(self):
         """Test customer home view with nonexistent customer email"""
         url = reverse('customer_home_info', kwargs={'email': 'nonexistent@example.com'})
@@ -1429,6 +1734,303 @@ class GlobalSearchViewTest(TestCase):
         response_time = end_time - start_time
         self.assertLess(response_time, 1.0)
 
+class HairdresserSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            first_name='João',
+            last_name='Araújo',
+            email='joao@example.com',
+            phone='5592999993333',
+            neighborhood='Adrianópolis',
+            city='Manaus',
+            address='Rua das Flores',
+            role='hairdresser'
+        )
+        self.hairdresser = Hairdresser.objects.create(user=self.user, cnpj='12345678000122', resume='Especialista em cachos')
+        self.preference = Preferences.objects.create(name='Coloração')
+
+    def _search(self, value):
+        return list(search_hairdressers(value))
+
+    def test_search_document_is_folded(self):
+        self.hairdresser.refresh_from_db()
+        self.assertIn('joao', self.hairdresser.search_document)
+        self.assertIn('adrianopolis', self.hairdresser.search_document)
+        self.assertEqual(fold_text('Coloração'), 'coloracao')
+
+    def test_search_document_is_not_serialized(self):
+        self.assertNotIn('search_document', HairdresserSerializer(self.hairdresser).data)
+        self.assertNotIn('search_document', HairdresserFullInfoSerializer(self.hairdresser).data)
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self._search('JOAO manaus'), [self.hairdresser])
+        self.assertEqual(self._search('Araujo cachos'), [self.hairdresser])
+        self.assertEqual(self._search('joão belém'), [])
+
+    def test_preference_changes_update_document(self):
+        self.assertEqual(self._search('coloracao'), [])
+
+        self.user.preferences.add(self.preference)
+        self.assertEqual(self._search('coloracao'), [self.hairdresser])
+
+        self.preference.name = 'Mechas'
+        self.preference.save()
+        self.assertEqual(self._search('coloracao'), [])
+        self.assertEqual(self._search('mechas'), [self.hairdresser])
+
+        self.preference.users.clear()
+        self.assertEqual(self._search('mechas'), [])
+
+    def test_user_changes_update_document(self):
+        self.user.city = 'Belém'
+        self.user.save()
+
+        self.assertEqual(self._search('belem'), [self.hairdresser])
+        self.assertEqual(self._search('manaus'), [])
+
+    def test_global_search_pages_across_sections(self):
+        service = Service.objects.create(name='Corte Joao', price=50, duration=60, hairdresser=self.hairdresser)
+        url = reverse('global_search')
+
+        response = self.client.get(url, {'search': 'joao', 'page_size': 1})
+        self.assertEqual([result['result_type'] for result in response.json()['data']], ['hairdresser'])
+
+        response = self.client.get(url, {'search': 'joao', 'page_size': 1, 'cursor': response['X-Next-Cursor']})
+        results = response.json()['data']
+        self.assertEqual([(result['result_type'], result['id']) for result in results], [('service', service.id)])
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_global_search_folds_accents(self):
+        response = self.client.get(reverse('global_search'), {'search': 'adrianopolis'})
+
+        results = response.json()['data']
+        self.assertEqual([result['id'] for result in results if result['result_type'] == 'hairdresser'], [self.hairdresser.id])
+
+
+@override_settings(SEARCH_INDEX_ENABLED=True)
+class SearchIndexTest(TestCase):
+    def setUp(self):
+        search_index.reset()
+        self.user = User.objects.create(
+            first_name='Márcia',
+            last_name='Lima',
+            email='marcia@example.com',
+            phone='5592999994444',
+            neighborhood='Centro',
+            city='Manaus',
+            address='Rua Sete',
+            role='hairdresser'
+        )
+        self.hairdresser = Hairdresser.objects.create(user=self.user, cnpj='12345678000133', resume='Tranças e coloração')
+        self.service = Service.objects.create(name='Corte Feminino', price=50, duration=60, hairdresser=self.hairdresser)
+
+    def tearDown(self):
+        search_index.reset()
+
+    def test_inverted_index_prefix_and_ranking(self):
+        index = InvertedIndex()
+        index.update(1, 'corte masculino')
+        index.update(2, 'cortes e tranças')
+
+        self.assertEqual(index.search(['corte']), [1, 2])
+        self.assertEqual(index.search(['cortes']), [2])
+        self.assertEqual(index.search(['corte', 'trancas']), [2])
+        self.assertEqual(index.search(['corte', 'barba']), [])
+
+        index.remove(2)
+        self.assertEqual(index.search(['tranca']), [])
+        self.assertEqual(len(index), 1)
+
+    def test_search_builds_from_database(self):
+        self.assertEqual(search_index.search('marcia trancas'), ([self.hairdresser.id], []))
+        self.assertEqual(search_index.search('CORTE fem'), ([], [self.service.id]))
+
+    def test_committed_changes_update_the_index(self):
+        search_index.search('marcia')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.city = 'Belém'
+            self.user.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Escova'
+            self.service.save()
+
+        self.assertEqual(search_index.search('belem'), ([self.hairdresser.id], []))
+        self.assertEqual(search_index.search('manaus'), ([], []))
+        self.assertEqual(search_index.search('escova'), ([], [self.service.id]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.delete()
+        self.assertEqual(search_index.search('escova'), ([], []))
+
+    def test_uncommitted_changes_are_not_indexed(self):
+        search_index.search('marcia')
+
+        self.user.city = 'Belém'
+        self.user.save()
+
+        self.assertEqual(search_index.search('belem'), ([], []))
+
+    def test_global_search_uses_index(self):
+        search_index.search('marcia')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('global_search'), {'search': 'corte'})
+
+        results = response.json()['data']
+        self.assertEqual([(result['result_type'], result['id']) for result in results], [('service', self.service.id)])
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        autocomplete_index.reset()
+        self.user = User.objects.create(
+            first_name='Maria',
+            last_name='da Silva',
+            email='maria@example.com',
+            phone='5592999995555',
+            neighborhood='Ponta Negra',
+            city='Manaus',
+            address='Rua Dez',
+            role='hairdresser'
+        )
+        self.hairdresser = Hairdresser.objects.create(user=self.user, cnpj='12345678000144')
+        self.preference = Preferences.objects.create(name='Coloração')
+        Service.objects.create(name='Corte Feminino', price=50, duration=60, hairdresser=self.hairdresser)
+        Service.objects.create(name='Corte Feminino', price=60, duration=60, hairdresser=self.hairdresser)
+
+    def tearDown(self):
+        autocomplete_index.reset()
+
+    def _suggest(self, prefix, **params):
+        response = self.client.get(reverse('autocomplete'), {'q': prefix, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['data']
+
+    def test_suggests_by_any_word_prefix(self):
+        expected = [{'id': self.hairdresser.id, 'label': 'Maria da Silva', 'type': 'hairdresser'}]
+        self.assertEqual(self._suggest('mar'), expected)
+        self.assertEqual(self._suggest('Silv'), expected)
+        self.assertEqual(self._suggest('maria  da s'), expected)
+
+    def test_folds_accents_and_covers_every_type(self):
+        self.assertEqual(self._suggest('colo'), [{'id': self.preference.id, 'label': 'Coloração', 'type': 'preference'}])
+        self.assertEqual(self._suggest('negra'), [{'id': None, 'label': 'Ponta Negra', 'type': 'neighborhood'}])
+        # The two services share a name and are suggested once
+        self.assertEqual(self._suggest('corte'), [{'id': None, 'label': 'Corte Feminino', 'type': 'service'}])
+
+    def test_limit(self):
+        self.assertEqual(len(self._suggest('', limit=5)), 0)
+        Preferences.objects.create(name='Cortes curtos')
+        autocomplete_index.reset()
+
+        self.assertEqual(len(self._suggest('c', limit=1)), 1)
+        self.assertEqual(len(self._suggest('c')), 3)
+        response = self.client.get(reverse('autocomplete'), {'q': 'c', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_committed_writes_mark_index_dirty(self):
+        self._suggest('mar')
+        self.assertFalse(autocomplete_index.dirty)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Preferences.objects.create(name='Mechas')
+        self.assertTrue(autocomplete_index.dirty)
+
+        autocomplete_index.build()
+        self.assertFalse(autocomplete_index.dirty)
+        self.assertEqual(autocomplete_index.suggest('mech', 5)[0]['label'], 'Mechas')
+
+
+class PreferenceRankingTest(TestCase):
+    def setUp(self):
+        preference_ranking.reset()
+        self.cachos = Preferences.objects.create(name='Cachos')
+        self.barbearia = Preferences.objects.create(name='Barbearia')
+        self.hairdressers = []
+        for index, (neighborhood, rating, preferences) in enumerate([
+            ('Centro', 3, [self.cachos]),
+            ('Centro', 5, [self.barbearia]),
+            ('Flores', 5, [self.cachos, self.barbearia]),
+            ('Flores', 5, []),
+        ]):
+            user = User.objects.create(
+                first_name=f'Hairdresser {index}',
+                email=f'ranking{index}@example.com',
+                phone=f'559299999700{index}',
+                neighborhood=neighborhood,
+                city='Manaus',
+                rating=rating,
+                role='hairdresser'
+            )
+            user.preferences.add(*preferences)
+            self.hairdressers.append(Hairdresser.objects.create(user=user, cnpj=f'1234567800015{index}'))
+
+    def tearDown(self):
+        preference_ranking.reset()
+
+    def _rank(self, preferences, neighborhood='Centro', limit=10):
+        ids = preference_ranking.rank([preference.id for preference in preferences], 'Manaus', neighborhood, limit)
+        return [self.hairdressers.index(Hairdresser.objects.get(id=hairdresser_id)) for hairdresser_id in ids]
+
+    def test_overlap_outweighs_rating_and_locality(self):
+        self.assertEqual(self._rank([self.cachos, self.barbearia]), [2, 1, 0])
+
+    def test_locality_and_rating_break_equal_overlap(self):
+        self.assertEqual(self._rank([self.cachos], neighborhood='Centro'), [2, 0])
+        self.assertEqual(self._rank([self.barbearia], neighborhood='Centro'), [1, 2])
+        self.assertEqual(self._rank([self.barbearia], neighborhood='Flores'), [2, 1])
+
+    def test_top_k_and_no_overlap(self):
+        self.assertEqual(self._rank([self.cachos, self.barbearia], limit=1), [2])
+        self.assertEqual(self._rank([]), [])
+
+    def test_committed_assignments_update_ranking(self):
+        self._rank([self.cachos])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdressers[3].user.preferences.add(self.cachos)
+        self.assertIn(3, self._rank([self.cachos]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cachos.users.clear()
+        self.assertEqual(self._rank([self.cachos]), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hairdressers[1].delete()
+        self.assertEqual(self._rank([self.barbearia]), [2])
+
+
+class RefresherTest(TestCase):
+    def setUp(self):
+        self.builds = 0
+        self.refresher = Refresher(self._rebuild, 'HOME_FEED_REFRESH_SECONDS')
+
+    def _rebuild(self):
+        self.builds += 1
+        time.sleep(0.05)
+
+    def test_concurrent_first_requests_build_once(self):
+        threads = [threading.Thread(target=self.refresher.ensure_fresh) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, 1)
+        self.assertTrue(self.refresher.built)
+
+    def test_fresh_data_is_not_rebuilt(self):
+        self.refresher.ensure_fresh()
+        self.refresher.ensure_fresh()
+        self.assertEqual(self.builds, 1)
+
+    def test_invalidate_marks_dirty_until_rebuilt(self):
+        self.refresher.refresh()
+        self.refresher.invalidate()
+        self.assertTrue(self.refresher.dirty)
+        self.refresher.refresh()
+        self.assertFalse(self.refresher.dirty)
+
+
 class HairdresserInfoViewTest(TestCase):
     def setUp(self):
         """Set up test data before each test method."""
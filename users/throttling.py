@@ -0,0 +1,149 @@
+from collections import OrderedDict
+import math
+import threading
+import time
+
+from django.conf import settings
+
+# Login attempts are metered by two token buckets: one per client IP and one per
+# email. LoginView checks them before it touches the database or bcrypt, so a
+# credential-stuffing burst is rejected for the price of a dict lookup. Successful
+# logins hand their tokens back, so users who get their password right are never
+# slowed down by their own attempts. Buckets live in process memory: each worker
+# meters on its own, and the least recently used buckets are dropped once
+# LOGIN_THROTTLE_MAX_KEYS is reached.
+
+
+class TokenBucketStore:
+    """
+    Bounded set of token buckets refilled at `rate` tokens per second up to `burst`.
+    """
+
+    def __init__(self, burst, rate, max_keys):
+        self.burst = burst
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """
+        Takes one token from the key's bucket. Returns 0 when the call is allowed,
+        otherwise the seconds until a token will be available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            if tokens >= 1:
+                self._store(key, tokens - 1, now)
+                return 0
+            self._store(key, tokens, now)
+            return (1 - tokens) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated_at = self._buckets[key]
+                tokens = min(self.burst, tokens + (now - updated_at) * self.rate + 1)
+                self._store(key, tokens, now)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _store(self, key, tokens, now):
+        # Caller must hold the lock
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class LoginThrottle:
+    def __init__(self):
+        self.by_ip = TokenBucketStore(
+            settings.LOGIN_THROTTLE_IP_BURST,
+            settings.LOGIN_THROTTLE_IP_PER_MINUTE / 60,
+            settings.LOGIN_THROTTLE_MAX_KEYS
+        )
+        self.by_email = TokenBucketStore(
+            settings.LOGIN_THROTTLE_EMAIL_BURST,
+            settings.LOGIN_THROTTLE_EMAIL_PER_MINUTE / 60,
+            settings.LOGIN_THROTTLE_MAX_KEYS
+        )
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled_ip = 0
+        self.throttled_email = 0
+        self.refunded = 0
+
+    def check(self, ip, email):
+        """
+        Returns 0 when the attempt may proceed, otherwise the number of seconds
+        the client should wait (for a Retry-After header).
+        """
+        wait = self.by_ip.consume(ip)
+        if wait:
+            self._count('throttled_ip')
+            return math.ceil(wait)
+
+        wait = self.by_email.consume(normalize_email(email))
+        if wait:
+            self._count('throttled_email')
+            return math.ceil(wait)
+
+        self._count('allowed')
+        return 0
+
+    def succeeded(self, ip, email):
+        """
+        Gives back the tokens of an attempt that turned out to be a valid login.
+        """
+        self.by_ip.refund(ip)
+        self.by_email.refund(normalize_email(email))
+        self._count('refunded')
+
+    def clear(self):
+        self.by_ip.clear()
+        self.by_email.clear()
+        with self._lock:
+            self.allowed = self.throttled_ip = self.throttled_email = self.refunded = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'allowed': self.allowed,
+                'throttled_ip': self.throttled_ip,
+                'throttled_email': self.throttled_email,
+                'refunded': self.refunded,
+                'tracked_ips': len(self.by_ip),
+                'tracked_emails': len(self.by_email),
+            }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def client_ip(request):
+    """
+    Returns the client address, read from X-Forwarded-For when the app runs
+    behind TRUSTED_PROXY_COUNT reverse proxies.
+    """
+    if settings.TRUSTED_PROXY_COUNT:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= settings.TRUSTED_PROXY_COUNT:
+            return forwarded[-settings.TRUSTED_PROXY_COUNT]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+login_throttle = LoginThrottle()
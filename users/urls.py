@@ -2,8 +2,10 @@ from django.urls import path
 from .views import (
     RegisterView, 
     LoginView, 
+    LoginThrottleStats,
     LogoutView, 
     GlobalSearchView,
+    AutocompleteView,
     UserInfoCookieView, 
     UserInfoView, 
     ChangePasswordView, 
@@ -17,9 +19,11 @@ urlpatterns = [
     path('auth/register', RegisterView.as_view(), name='register'),
     path('auth/login', LoginView.as_view(), name='login'),
     path('auth/user', LoginView.as_view(), name='user_auth'),
+    path('auth/login/throttle', LoginThrottleStats.as_view(), name='login_throttle_stats'),
     path('auth/change-password', ChangePasswordView.as_view(), name='password_change'),
     path('auth/logout', LogoutView.as_view(), name='logout'),
     path('user/search', GlobalSearchView.as_view(), name='global_search'), 
+    path('user/autocomplete', AutocompleteView.as_view(), name='autocomplete'),
     path('user/authenticated', UserInfoCookieView.as_view(), name='user_info_auth'),
     path('user/<str:email>', UserInfoView.as_view(), name='user_info'),
     path('customer/home', CustomerHomeView.as_view(), name='customer_home_info'),
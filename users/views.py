@@ -4,14 +4,26 @@ from rest_framework.response import Response
 from .models import User, Customer, Hairdresser
 from preferences.models import Preferences
 import json
-import bcrypt
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q, Count
 import jwt, datetime
 from .serializers import UserSerializer, CustomerSerializer, HairdresserSerializer, HairdresserFullInfoSerializer
 from hairmatch.ai_clients.gemini_client import hairdresser_profile_ai_completion
 from .filters import HairdresserFilter
+from .search import search_hairdressers
+from .search_index import search_index
+from .autocomplete import autocomplete_index
+from .home_feed import home_feed
+from .ranking import preference_ranking
+from hairmatch.pagination import InvalidCursor, keyset_page, page_params, set_next_cursor
+from .identity_cache import identity_cache
+from .passwords import PasswordHasherBusy, hash_password, verify_and_upgrade
+from .throttling import client_ip, login_throttle
+from .authentication import (
+    JWT_ALGORITHM, JWT_SECRET, get_authenticated_user, get_customer, get_hairdresser, token_error_response
+)
 from .serializers import SearchResultSerializer # Import our new serializer
 from .filters import HairdresserFilter
 from service.models import Service
@@ -50,7 +62,10 @@ class RegisterView(APIView):
             return JsonResponse({'error': 'Phone number is too short'}, status=400)
 
         raw_password = password.replace(' ', '')
-        hashed_password = bcrypt.hashpw(raw_password.encode('utf-8'), bcrypt.gensalt())
+        try:
+            hashed_password = hash_password(raw_password)
+        except PasswordHasherBusy:
+            return password_hasher_busy_response()
 
         try:
             user = User.objects.create(
@@ -65,14 +80,16 @@ class RegisterView(APIView):
             number=request.data.get('number'),
             postal_code=request.data.get('postal_code'),
             email=request.data.get('email'),
-            password=hashed_password.decode('utf-8'),
+            password=hashed_password,
             role=request.data.get('role'),
             rating=request.data.get('rating'),
             )
         
             if 'profile_picture' in request.FILES:
-                user.profile_picture = request.FILES['profile_picture']
-                user.save() 
+                # One transaction, so the stored picture can't be deleted before the row refers to it
+                with transaction.atomic():
+                    user.profile_picture = request.FILES['profile_picture']
+                    user.save() 
 
             preferences_str = request.data.get('preferences', '[]')
             try:
@@ -110,12 +127,23 @@ class LoginView(APIView):
         data = json.loads(request.body)
         email = data.get('email')
         password = data.get('password')
+
+        ip = client_ip(request)
+        retry_after = login_throttle.check(ip, email)
+        if retry_after:
+            response = JsonResponse({'error': 'Muitas tentativas de login, tente novamente em instantes'}, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
         
         user = User.objects.filter(email=email).first()
         if user:
-            stored_password = user.password.encode('utf-8')
+            try:
+                password_matches = verify_and_upgrade(user, password)
+            except PasswordHasherBusy:
+                return password_hasher_busy_response()
 
-            if bcrypt.checkpw(password.encode('utf-8'), stored_password):
+            if password_matches:
+                login_throttle.succeeded(ip, email)
 
                 payload = {
                     'id': user.id,
@@ -123,7 +151,7 @@ class LoginView(APIView):
                     'iat': datetime.datetime.now()
                 }
 
-                token = jwt.encode(payload, 'secret', algorithm='HS256')
+                token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
                 response = JsonResponse({'message': 'Login successful'}, status=200)
                 response.set_cookie(
@@ -142,20 +170,15 @@ class LoginView(APIView):
         return JsonResponse({'error': 'Usuário não cadastrado na base de dados'}, status=400)
     
     def get(self, request):
-        token = request.COOKIES.get('jwt')
-
-        if not token: 
+        if request.jwt_error:
             return JsonResponse({'authenticated': False}, status=200)
 
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'authenticated': False}, status=200)
-        
-        user = User.objects.filter(id=payload['id']).first()
-        
         return JsonResponse({"authenticated":True}, status=200)
 
+class LoginThrottleStats(APIView):
+    def get(self, request):
+        return JsonResponse({'data': login_throttle.stats()}, status=200)
+
 class LogoutView(APIView):
     def post(self, request):
         response = Response()
@@ -167,22 +190,20 @@ class LogoutView(APIView):
 class ChangePasswordView(APIView):
     
     def put(self, request):
-        token = request.COOKIES.get('jwt')
-
-        if not token: 
+        if request.jwt_error:
             return JsonResponse({'authenticated': False}, status=200)
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'authenticated': False}, status=200)
-        
-        user = User.objects.filter(id=payload['id']).first()
+
+        user = get_authenticated_user(request)
         if user:
             data = json.loads(request.body)
             raw_password = data['password'].replace(' ', '')
-            hashed_password = bcrypt.hashpw(raw_password.encode('utf-8'), bcrypt.gensalt())
-            user.password = hashed_password.decode('utf-8')
-            user.save()
+            try:
+                password = hash_password(raw_password)
+            except PasswordHasherBusy:
+                return password_hasher_busy_response()
+            # Only the password column: the user may come from the identity cache
+            User.objects.filter(pk=user.pk).update(password=password)
+            identity_cache.invalidate_user(user.id)
             return JsonResponse({'message': 'Password updated successfully'}, status=200)
 
         return JsonResponse({'error': 'User not found'}, status=404)
@@ -193,68 +214,50 @@ class ChangePasswordView(APIView):
 
 class UserInfoCookieView(APIView):
     def get(self, request):
-        token = request.COOKIES.get('jwt')
+        error = token_error_response(request)
+        if error:
+            return error
 
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
-
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
-        
-        try:
-            user = User.objects.filter(id=payload['id']).filter(is_active=True).first()
-        except User.DoesNotExist:
+        user = get_authenticated_user(request)
+        if not user or not user.is_active:
             return JsonResponse({'error': 'user not found'}, status=400)
 
         if user.role == 'customer':
-            customer = Customer.objects.filter(user=user).first()
+            customer = get_customer(user)
             customer_data = CustomerSerializer(customer).data
             return JsonResponse({'customer': customer_data}, status=200)
         elif user.role == 'hairdresser':
-            hairdresser = Hairdresser.objects.filter(user=user).first()
+            hairdresser = get_hairdresser(user)
             hairdresser_data = HairdresserSerializer(hairdresser).data
             return JsonResponse({'hairdresser': hairdresser_data}, status=200)    
         else: 
             return JsonResponse({'error': 'error retrieving user with role'}, status=500)
 
     def delete(self, request):
-        token = request.COOKIES.get('jwt')
+        error = token_error_response(request)
+        if error:
+            return error
 
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
-
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
-        
-        try:
-            user = User.objects.filter(id=payload['id']).filter(is_active=True).first()  
-            user.delete()
-            response = JsonResponse({'message': 'user deleted'}, status=200)
-            response.delete_cookie('jwt')
-            return response
-        except User.DoesNotExist:
+        user = get_authenticated_user(request)
+        if not user or not user.is_active:
             return JsonResponse({'error': 'User not found'}, status=400)
 
+        identity_cache.invalidate_user(user.id)
+        user.delete()
+        response = JsonResponse({'message': 'user deleted'}, status=200)
+        response.delete_cookie('jwt')
+        return response
+
     #This function does not handle password update procedure
     def put(self, request):
         data = json.loads(request.body)
-        token = request.COOKIES.get('jwt')
 
-        if not token:
-            return JsonResponse({'error': 'Invalid token'}, status=403)
+        error = token_error_response(request)
+        if error:
+            return error
 
-        try:
-            payload = jwt.decode(token, 'secret', algorithms=['HS256'])
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({'error': 'Token expired'}, status=403)
-
-        user = User.objects.filter(id=payload['id'], is_active=True).first()
-
-        if not user:
+        user = get_authenticated_user(request)
+        if not user or not user.is_active:
             return JsonResponse({'error': 'User not found'}, status=404)
 
         
@@ -270,28 +273,34 @@ class UserInfoCookieView(APIView):
             'complement', 'neighborhood', 'city', 'state'
         ]
 
-        for field in allowed_fields:
-            if field in data:
-                setattr(user, field, data[field])
+        with transaction.atomic():
+            # The authenticated user may come from the identity cache, which can
+            # lag behind the rows; change the rows as they are now
+            user = User.objects.select_for_update().get(pk=user.pk)
+            for field in allowed_fields:
+                if field in data:
+                    setattr(user, field, data[field])
 
-        user.save()
-
-        if user.role == 'customer':
-            customer = Customer.objects.filter(user=user).first()
-            if customer and 'cpf' in data:
-                customer.cpf = data['cpf']
-                customer.save()
-        elif user.role == 'hairdresser':
-            hairdresser = Hairdresser.objects.filter(user=user).first()
-            if hairdresser:
-                if 'experience_years' in data:
-                    hairdresser.experience_years = data['experience_years']
-                if 'resume' in data:
-                    hairdresser.resume = data['resume']
-                if 'cnpj' in data:
-                    hairdresser.cnpj = data['cnpj']
-                hairdresser.save()
+            user.save()
 
+            if user.role == 'customer':
+                customer = Customer.objects.select_for_update().filter(user=user).first()
+                if customer and 'cpf' in data:
+                    customer.cpf = data['cpf']
+                    customer.save()
+            elif user.role == 'hairdresser':
+                hairdresser = Hairdresser.objects.select_for_update().filter(user=user).first()
+                if hairdresser:
+                    hairdresser.user = user
+                    if 'experience_years' in data:
+                        hairdresser.experience_years = data['experience_years']
+                    if 'resume' in data:
+                        hairdresser.resume = data['resume']
+                    if 'cnpj' in data:
+                        hairdresser.cnpj = data['cnpj']
+                    hairdresser.save()
+
+        identity_cache.invalidate_user(user.id)
         return JsonResponse({'message': 'User updated successfully'}, status=200)
 
 # 3 - The following views are related to the User Info
@@ -305,17 +314,30 @@ class GlobalSearchView(APIView):
         if not query:
             return Response([], status=200)
 
-        hairdresser_queryset = Hairdresser.objects.all()
-        hairdresser_filter = HairdresserFilter({'search': query}, queryset=hairdresser_queryset)
-        hairdresser_results = hairdresser_filter.qs
+        try:
+            after, page_size = page_params(request)
+            if search_index.enabled:
+                hairdresser_results, service_results, next_cursor = indexed_search_page(query, after, page_size)
+            else:
+                hairdresser_results, service_results, next_cursor = search_page(query, after, page_size)
+        except InvalidCursor as error:
+            return JsonResponse({'error': str(error)}, status=400)
 
-        service_results = Service.objects.filter(
-            Q(name__icontains=query)
-        ) 
         combined_results = list(chain(hairdresser_results, service_results))
         serializer = SearchResultSerializer(combined_results, many=True, context={'request': request})
 
-        return JsonResponse({'data':serializer.data}, status=200)
+        return set_next_cursor(JsonResponse({'data':serializer.data}, status=200), request, next_cursor)
+
+class AutocompleteView(APIView):
+    def get(self, request):
+        prefix = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', settings.AUTOCOMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            return JsonResponse({'error': "'limit' must be an integer"}, status=400)
+        limit = max(1, min(limit, settings.AUTOCOMPLETE_MAX_LIMIT))
+
+        return JsonResponse({'data': autocomplete_index.suggest(prefix, limit)}, status=200)
 
 class UserInfoView(APIView):
     def get(self,request,email=None):
@@ -372,45 +394,28 @@ class CustomerHomeView(APIView):
                 customer_user = User.objects.get(email=email, role='customer')
             except User.DoesNotExist:
                 return JsonResponse({'error': 'User not found'}, status=404)
-            customer_preferences = customer_user.preferences.all()
+            customer_preferences = customer_user.preferences.values_list('id', flat=True)
             
-            # Get hairdressers matching customer preferences
-            hairdressers_users = User.objects.filter(
-                role='hairdresser',
-                preferences__in=customer_preferences
-            ).distinct()
-
-            hairdressers_for_you = Hairdresser.objects.filter(user__in=hairdressers_users)
+            # Best hairdressers sharing the customer's preferences (users/ranking.py)
+            hairdresser_ids = preference_ranking.rank(
+                customer_preferences, customer_user.city, customer_user.neighborhood, settings.FOR_YOU_LIMIT
+            )
+            hairdressers_for_you = fetch_in_order(Hairdresser.objects.select_related('user'), hairdresser_ids)
             
             # Prepare data for for_you response
             for_you_data = HairdresserSerializer(hairdressers_for_you, many=True).data
         
-        # Get hairdressers for specific preferences
-        specific_preferences = ["Coloração", "Cachos", "Barbearia", "Tranças"]
-        formated_preferences_name=["coloracao", "cachos", "barbearia", "trancas"]
-        preference_hairdressers = {}
-        
-        for i in range(len(specific_preferences)):
-            try:
-                preference = Preferences.objects.get(name=specific_preferences[i])
-                hairdressers_users = User.objects.filter(
-                    role='hairdresser',
-                    preferences=preference
-                ).distinct()[:10]
-                
-                hairdressers_per_preference = Hairdresser.objects.filter(user__in=hairdressers_users)
-                hairdressers_data = HairdresserSerializer(hairdressers_per_preference, many=True).data
-                
-                preference_hairdressers[formated_preferences_name[i]] = hairdressers_data
-            except Preferences.DoesNotExist:
-                preference_hairdressers[formated_preferences_name[i]] = []
+        # Hairdressers for specific preferences, from the shared snapshot (users/home_feed.py)
+        feed_version, preference_hairdressers = home_feed.rails()
         
         # Prepare the final response
         response_data = {
             'for_you': for_you_data,
             'hairdressers_by_preferences': preference_hairdressers
         }     
-        return JsonResponse(response_data, status=200)
+        response = JsonResponse(response_data, status=200)
+        response['X-Home-Feed-Version'] = str(feed_version)
+        return response
     
 class GeminiChatView(APIView):
     def post(self, request):
@@ -464,4 +469,70 @@ def debug_media_settings(request):
         'media_url': media_url,
         'media_root_exists': path_exists,
         'media_root_contents': dir_contents
-    })
\ No newline at end of file
+    })
+
+
+def password_hasher_busy_response():
+    response = JsonResponse({'error': 'Servidor ocupado no momento, tente novamente em instantes'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+
+def search_page(query, after, page_size):
+    """
+    Reads one page of global search results: hairdressers first, then services.
+    The cursor is the section being read followed by the key of its last row.
+    """
+    section, key = (after[0], after[1:]) if after else ('hairdresser', None)
+    if section not in ('hairdresser', 'service'):
+        raise InvalidCursor('Invalid cursor')
+
+    hairdressers, services = [], []
+    if section == 'hairdresser':
+        hairdressers, last = keyset_page(
+            search_hairdressers(query, Hairdresser.objects.select_related('user')), key, page_size
+        )
+        if last is not None:
+            return hairdressers, services, ['hairdresser', *last]
+        key = None
+        if len(hairdressers) == page_size:
+            # Page filled exactly; whether services follow is for the next page to find out
+            return hairdressers, services, ['service']
+
+    services, last = keyset_page(
+        Service.objects.filter(Q(name__icontains=query)).select_related('hairdresser__user').order_by('id'),
+        key, page_size - len(hairdressers)
+    )
+    return hairdressers, services, (['service', *last] if last is not None else None)
+
+
+def indexed_search_page(query, after, page_size):
+    """
+    search_page() for the in-memory index: the cursor is a position in the
+    ranked hits, so only the rows of the page are read from the database.
+    """
+    position = after[0] if after else 0
+    if not isinstance(position, int) or position < 0:
+        raise InvalidCursor('Invalid cursor')
+
+    hairdresser_ids, service_ids = search_index.search(query)
+    hits = [('hairdresser', hit) for hit in hairdresser_ids] + [('service', hit) for hit in service_ids]
+    page = hits[position:position + page_size]
+    next_cursor = [position + page_size] if position + page_size < len(hits) else None
+
+    hairdressers = fetch_in_order(
+        Hairdresser.objects.select_related('user'), [hit for kind, hit in page if kind == 'hairdresser']
+    )
+    services = fetch_in_order(
+        Service.objects.select_related('hairdresser__user'), [hit for kind, hit in page if kind == 'service']
+    )
+    return hairdressers, services, next_cursor
+
+
+def fetch_in_order(queryset, ids):
+    """
+    Loads the rows with the given ids, in the order of the ids. Rows deleted
+    since the ids were read are skipped.
+    """
+    rows = queryset.in_bulk(ids)
+    return [rows[row_id] for row_id in ids if row_id in rows]